@@ -3,27 +3,64 @@ Enhanced AImakerspace library with metadata filtering and multiple distance metr
 
 This enhanced version adds:
 - Metadata support for document categorization
-- Multiple distance metrics (cosine, euclidean, dot product)
-- Improved filtering capabilities
+- Multiple distance metrics (cosine, euclidean, dot product) with batch kernels
+- Improved filtering capabilities ($in, $ne, ranges, $or) via compiled filter plans
+- Contiguous matrix-backed vector storage
+- Exact (flat) and approximate (IVF, HNSW) search indexes
+- Scalar-quantized (int8) vector codes with exact re-scoring
+- Product-quantized codes searched with asymmetric distance tables (PQ, IVF-PQ)
+- Multi-process sharded exact search over a shared memory-mapped matrix
+- Maximal Marginal Relevance (MMR) re-ranking for diverse results
+- BM25 keyword index with hybrid BM25 + dense search (RRF or weighted fusion)
+- Async search API and thread-safe concurrent reads during inserts
+- Constant-time statistics from running per-field counters and histograms
+- Persistent SQLite embedding cache keyed by model, dimensions and text hash
+- Rate-limited embedding requests with bounded concurrency and retries
+- Token-aware request packing with truncate/split handling of long inputs
+- Streaming builds with backpressure and resumable checkpoints
+- Single-flight coalescing of identical in-flight embedding requests
 """
 
 __version__ = "2.0.0"
 
 from aimakerspace.text_utils import TextFileLoader, CharacterTextSplitter
 from aimakerspace.vectordatabase import VectorDatabase
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.filters import FilterPlan, compile_filter
+from aimakerspace.mmr import maximal_marginal_relevance
+from aimakerspace.bm25 import BM25Index
+from aimakerspace.fusion import reciprocal_rank_fusion, weighted_score_fusion
+from aimakerspace.indexes import FlatIndex, IVFIndex, HNSWIndex, ScalarQuantizedIndex, PQIndex, ShardedIndex
 from aimakerspace.distance_metrics import (
     cosine_similarity,
     euclidean_distance,
     dot_product_similarity,
-    AVAILABLE_METRICS
+    AVAILABLE_METRICS,
+    BATCH_METRICS,
+    get_metric,
 )
 
 __all__ = [
     "TextFileLoader",
     "CharacterTextSplitter",
     "VectorDatabase",
+    "VectorStore",
+    "FilterPlan",
+    "compile_filter",
+    "FlatIndex",
+    "IVFIndex",
+    "HNSWIndex",
+    "ScalarQuantizedIndex",
+    "PQIndex",
+    "ShardedIndex",
+    "maximal_marginal_relevance",
+    "BM25Index",
+    "reciprocal_rank_fusion",
+    "weighted_score_fusion",
     "cosine_similarity",
     "euclidean_distance",
     "dot_product_similarity",
-    "AVAILABLE_METRICS"
+    "AVAILABLE_METRICS",
+    "BATCH_METRICS",
+    "get_metric",
 ]
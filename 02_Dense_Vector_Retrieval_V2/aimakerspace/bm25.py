@@ -0,0 +1,239 @@
+"""
+Sparse BM25 keyword index over the chunks of a vector store.
+
+The index uses the same integer row ids as the vector store, so keyword hits
+and dense hits can be fused directly (see aimakerspace.fusion). Posting lists
+are kept in CSR form: ``indptr[t]:indptr[t + 1]`` slices the ``post_rows``
+(int32) and ``post_tfs`` (uint16) arrays for term ``t``, which makes scoring
+a query a handful of vectorized slice operations instead of a Python loop
+over documents.
+
+New and overwritten rows are buffered and merged into the arrays on the next
+search. Tombstoned rows keep their postings (and still count towards document
+frequencies, as in Lucene) until the store is compacted; they are excluded
+from results through the candidate rows the caller passes in.
+"""
+
+import re
+import numpy as np
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from aimakerspace.indexes.flat import SearchResult
+from aimakerspace.topk import top_k_indices
+from aimakerspace.vector_store import VectorStore
+
+DEFAULT_TOKEN_PATTERN = r"\w+"
+# Term frequencies saturate long before this, so uint16 postings lose nothing
+_MAX_TF = np.iinfo(np.uint16).max
+
+
+class BM25Index:
+    """
+    Okapi BM25 scorer backed by array posting lists, keyed by store row.
+
+    Text is lower-cased and split with ``token_pattern``. Scores use the
+    non-negative Lucene idf, ``log(1 + (N - df + 0.5) / (df + 0.5))``.
+    """
+
+    name = 'bm25'
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, token_pattern: str = DEFAULT_TOKEN_PATTERN):
+        """
+        Args:
+            k1: Term-frequency saturation (higher lets repeated terms count more)
+            b: Document-length normalization, 0.0 (none) to 1.0 (full)
+            token_pattern: Regular expression matching one token
+        """
+        self.k1 = k1
+        self.b = b
+        self.token_pattern = token_pattern
+        self._token_re = re.compile(token_pattern)
+        self._vocab: Dict[str, int] = {}
+        self._terms: List[str] = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._post_rows = np.empty(0, dtype=np.int32)
+        self._post_tfs = np.empty(0, dtype=np.uint16)
+        # Token count per row; -1 for rows that were never indexed
+        self._doc_lengths = np.empty(0, dtype=np.int32)
+        self._pending: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Optional[np.ndarray] = None
+        self._length_norm: Optional[np.ndarray] = None
+
+    def tokenize(self, text: str) -> List[str]:
+        """Lower-case a text and split it into tokens."""
+        return self._token_re.findall(text.lower())
+
+    @property
+    def vocabulary_size(self) -> int:
+        """Number of distinct terms seen so far."""
+        return len(self._terms)
+
+    def add(self, store: VectorStore, rows: np.ndarray) -> None:
+        """
+        Index (or re-index) the text of some store rows.
+
+        Args:
+            store: The vector store whose keys are the chunk texts
+            rows: Row ids to index; rows indexed before are replaced
+        """
+        if len(rows) == 0:
+            return
+        if len(self._doc_lengths) < len(store):
+            grown = np.full(len(store), -1, dtype=np.int32)
+            grown[: len(self._doc_lengths)] = self._doc_lengths
+            self._doc_lengths = grown
+        vocab = self._vocab
+        for row in np.asarray(rows).tolist():
+            counts = Counter(self.tokenize(store.keys[row]))
+            # New terms get the next id; dict order keeps ids aligned with _terms
+            term_ids = np.array([vocab.setdefault(term, len(vocab)) for term in counts], dtype=np.int32)
+            tfs = np.minimum(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)), _MAX_TF)
+            self._pending[row] = (term_ids, tfs.astype(np.uint16))
+            self._doc_lengths[row] = sum(counts.values())
+        self._terms.extend(islice(vocab, len(self._terms), None))
+        self._idf = None
+
+    def _merge(self) -> None:
+        """Fold buffered rows into the posting arrays and refresh the scoring statistics."""
+        if self._pending:
+            pending_rows = np.fromiter(self._pending.keys(), dtype=np.int32, count=len(self._pending))
+            buffered = list(self._pending.values())
+            new_terms = np.concatenate([term_ids for term_ids, _ in buffered])
+            new_rows = np.repeat(pending_rows, [len(term_ids) for term_ids, _ in buffered])
+            new_tfs = np.concatenate([tfs for _, tfs in buffered])
+            order = np.lexsort((new_rows, new_terms))
+            new_terms, new_rows, new_tfs = new_terms[order], new_rows[order], new_tfs[order]
+
+            old_terms = self._posting_terms()
+            # Postings of re-indexed rows are replaced by their buffered ones
+            keep = ~np.isin(self._post_rows, pending_rows)
+            old_terms, old_rows, old_tfs = old_terms[keep], self._post_rows[keep], self._post_tfs[keep]
+
+            # Both sides are sorted by (term, row): splice the new postings in
+            # instead of re-sorting everything
+            stride = np.int64(len(self._doc_lengths))
+            at = np.searchsorted(old_terms * stride + old_rows, new_terms * stride + new_rows)
+            terms = np.insert(old_terms, at, new_terms)
+            self._post_rows = np.insert(old_rows, at, new_rows)
+            self._post_tfs = np.insert(old_tfs, at, new_tfs)
+            self._set_indptr(terms)
+            self._pending = {}
+
+        if self._idf is None:
+            indexed = self._doc_lengths >= 0
+            n_docs = int(indexed.sum())
+            avg_length = float(self._doc_lengths[indexed].sum()) / max(1, n_docs)
+            df = np.diff(self._indptr).astype(np.float32)
+            self._idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+            lengths = np.maximum(self._doc_lengths, 0).astype(np.float32)
+            self._length_norm = self.k1 * (1 - self.b + self.b * lengths / max(avg_length, 1e-9))
+
+    def _posting_terms(self) -> np.ndarray:
+        """Term id of every posting (the CSR row index, expanded)."""
+        return np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int64), np.diff(self._indptr))
+
+    def _set_indptr(self, terms: np.ndarray) -> None:
+        """Rebuild ``indptr`` from the term id of every (sorted) posting."""
+        self._indptr = np.zeros(len(self._terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self._terms)), out=self._indptr[1:])
+
+    def score(self, query_text: str, n_rows: int) -> np.ndarray:
+        """
+        BM25 score of every row for one query.
+
+        Args:
+            query_text: The query text
+            n_rows: Length of the returned array (the store size)
+
+        Returns:
+            np.ndarray: float32 scores of shape (n_rows,); 0 for rows without a query term
+        """
+        self._merge()
+        scores = np.zeros(n_rows, dtype=np.float32)
+        counts = Counter(self.tokenize(query_text))
+        for term, query_tf in counts.items():
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                continue
+            start, stop = self._indptr[term_id], self._indptr[term_id + 1]
+            if start == stop:
+                continue
+            rows = self._post_rows[start:stop]
+            tfs = self._post_tfs[start:stop].astype(np.float32)
+            # Rows are unique within one posting list, so fancy-index += is safe
+            scores[rows] += (query_tf * self._idf[term_id]) * tfs * (self.k1 + 1) / (tfs + self._length_norm[rows])
+        return scores
+
+    def search(
+        self,
+        store: VectorStore,
+        query_texts: Sequence[str],
+        k: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """
+        Top-k rows by BM25 for each query; rows matching no query term are left out.
+
+        Args:
+            store: The vector store the index was built over
+            query_texts: The query texts
+            k: Number of results per query
+            rows: Optional sorted candidate row ids (all rows if None)
+
+        Returns:
+            One (row ids, scores) pair per query, best first
+        """
+        results: List[SearchResult] = []
+        for query_text in query_texts:
+            scores = self.score(query_text, len(store))
+            candidates = np.flatnonzero(scores) if rows is None else rows[scores[rows] > 0]
+            candidate_scores = scores[candidates]
+            top = top_k_indices(candidate_scores, k)
+            results.append((candidates[top], candidate_scores[top]))
+        return results
+
+    def prepare(self, store: VectorStore) -> None:
+        """Merge buffered rows and refresh the statistics, so that ``search`` only reads."""
+        self._merge()
+
+    def compact(self, store: VectorStore, keep: np.ndarray) -> None:
+        """Drop postings of reclaimed rows and renumber the rest (new row i was old row keep[i])."""
+        self._merge()
+        new_row = np.full(len(self._doc_lengths), -1, dtype=np.int32)
+        keep = keep[keep < len(self._doc_lengths)]
+        new_row[keep] = np.arange(len(keep), dtype=np.int32)
+        remapped = new_row[self._post_rows]
+        survives = remapped >= 0
+        # Renumbering preserves row order, so postings stay sorted by (term, row)
+        self._set_indptr(self._posting_terms()[survives])
+        self._post_rows = remapped[survives]
+        self._post_tfs = self._post_tfs[survives]
+        self._doc_lengths = self._doc_lengths[keep]
+        self._idf = None
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, used to persist the index configuration."""
+        return {'k1': self.k1, 'b': self.b, 'token_pattern': self.token_pattern}
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Vocabulary and posting arrays to persist with ``np.savez``."""
+        self._merge()
+        return {
+            'terms': np.array(self._terms, dtype=str),
+            'indptr': self._indptr,
+            'post_rows': self._post_rows,
+            'post_tfs': self._post_tfs,
+            'doc_lengths': self._doc_lengths,
+        }
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays produced by ``get_state``."""
+        self._terms = state['terms'].tolist()
+        self._vocab = {term: term_id for term_id, term in enumerate(self._terms)}
+        self._indptr = state['indptr'].astype(np.int64)
+        self._post_rows = state['post_rows'].astype(np.int32)
+        self._post_tfs = state['post_tfs'].astype(np.uint16)
+        self._doc_lengths = state['doc_lengths'].astype(np.int32)
+        self._pending = {}
+        self._idf = None
@@ -0,0 +1,188 @@
+"""
+Append-only checkpoint log for streaming database builds.
+
+A checkpoint directory holds an optional database snapshot plus a list of
+segments, each recording the rows inserted after it in order: raw float32
+vectors (``segment-N.f32``) and one JSON line per row with its text,
+metadata and id (``segment-N.jsonl``). ``checkpoint.json`` names the
+snapshot and the committed segments, and the number of stream items they
+cover.
+
+Rows are appended to the open segment as they are inserted and the segment
+is sealed at each checkpoint, so checkpointing costs I/O proportional to the
+new rows only; the full database is written once, when the build finishes
+and the segments are consolidated into a snapshot. ``checkpoint.json`` is
+replaced atomically after the files it names are complete, so an
+interrupted build always finds a consistent checkpoint, and files left over
+from an interrupted segment are removed on the next open.
+"""
+
+import json
+import os
+import shutil
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from aimakerspace.vector_store import atomic_write
+
+CHECKPOINT_FILE = "checkpoint.json"
+_PARTIAL_SUFFIX = ".partial"
+
+# Texts, vectors, metadata and ids of a block of logged rows
+LoggedRows = Tuple[List[str], np.ndarray, List[Optional[Dict[str, Any]]], List[Any]]
+
+
+class SegmentLog:
+    """Snapshot plus append-only segments of a resumable streaming build."""
+
+    def __init__(self, directory: str):
+        """
+        Open (or create) the checkpoint log in a directory.
+
+        Args:
+            directory: Checkpoint directory (created if missing)
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        checkpoint_path = os.path.join(directory, CHECKPOINT_FILE)
+        checkpoint: Dict[str, Any] = {}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        # Stream items covered by the snapshot and the committed segments
+        self.offset: int = checkpoint.get('offset', 0)
+        self.snapshot: Optional[str] = checkpoint.get('snapshot')
+        self.segments: List[Dict[str, Any]] = checkpoint.get('segments', [])
+        self.dimension: Optional[int] = checkpoint.get('dimension')
+        self._vectors_file = None
+        self._rows_file = None
+        self._pending_rows = 0
+        self._remove_unreferenced()
+
+    @property
+    def empty(self) -> bool:
+        """Whether nothing has been checkpointed yet."""
+        return self.snapshot is None and not self.segments
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remove_unreferenced(self) -> None:
+        """Delete snapshots and segment files that checkpoint.json does not name."""
+        keep = {segment['name'] + suffix for segment in self.segments for suffix in (".f32", ".jsonl")}
+        if self.snapshot is not None:
+            keep.add(self.snapshot)
+        for name in os.listdir(self.directory):
+            if name in keep or not name.startswith(("snapshot-", "segment-")):
+                continue
+            path = self._path(name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def _write_checkpoint(self) -> None:
+        with atomic_write(self._path(CHECKPOINT_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                'offset': self.offset,
+                'snapshot': self.snapshot,
+                'segments': self.segments,
+                'dimension': self.dimension,
+            }, f)
+
+    def _segment_name(self) -> str:
+        return f"segment-{len(self.segments):06d}"
+
+    def append(
+        self,
+        texts: Sequence[str],
+        vectors: Any,
+        metadata_list: Sequence[Optional[Dict[str, Any]]],
+        ids: Sequence[Any],
+    ) -> None:
+        """
+        Log rows to the open segment (durable at the next ``commit``).
+
+        Every row is serialized before anything is written, so rows that
+        cannot be encoded raise without leaving part of the batch behind.
+        """
+        block = np.ascontiguousarray(vectors, dtype=np.float32)
+        lines = [
+            json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for row in zip(texts, metadata_list, ids)
+        ]
+        if self.dimension is None:
+            self.dimension = block.shape[1]
+        if self._vectors_file is None:
+            name = self._segment_name()
+            self._vectors_file = open(self._path(name + ".f32" + _PARTIAL_SUFFIX), "wb")
+            self._rows_file = open(self._path(name + ".jsonl" + _PARTIAL_SUFFIX), "w", encoding="utf-8")
+        self._vectors_file.write(block.tobytes())
+        self._rows_file.writelines(lines)
+        self._pending_rows += len(texts)
+
+    def commit(self, offset: int) -> None:
+        """Seal the open segment and record that the first ``offset`` stream items are covered."""
+        if self._vectors_file is not None:
+            name = self._segment_name()
+            for handle in (self._vectors_file, self._rows_file):
+                handle.flush()
+                os.fsync(handle.fileno())
+                handle.close()
+            for suffix in (".f32", ".jsonl"):
+                os.replace(self._path(name + suffix + _PARTIAL_SUFFIX), self._path(name + suffix))
+            self.segments.append({'name': name, 'rows': self._pending_rows})
+            self._vectors_file = self._rows_file = None
+            self._pending_rows = 0
+        self.offset = offset
+        self._write_checkpoint()
+
+    def set_snapshot(self, snapshot: str, offset: int) -> None:
+        """
+        Replace the previous snapshot and every segment by a complete database snapshot.
+
+        Args:
+            snapshot: Name of a subdirectory already written with ``VectorDatabase.save``
+            offset: Stream items the snapshot covers
+        """
+        self.close()
+        self.snapshot = snapshot
+        self.segments = []
+        self.offset = offset
+        self._write_checkpoint()
+        self._remove_unreferenced()
+
+    def read_segments(self, block_rows: int = 8192) -> Iterator[LoggedRows]:
+        """
+        Replay the committed rows in insertion order, ``block_rows`` at a time.
+
+        Vectors are memory-mapped, so replaying needs memory for one block only.
+        """
+        for segment in self.segments:
+            if not segment['rows']:
+                continue
+            vectors = np.memmap(
+                self._path(segment['name'] + ".f32"), dtype=np.float32, mode="r",
+                shape=(segment['rows'], self.dimension),
+            )
+            with open(self._path(segment['name'] + ".jsonl"), "r", encoding="utf-8") as f:
+                start = 0
+                while start < segment['rows']:
+                    rows = [json.loads(f.readline()) for _ in range(min(block_rows, segment['rows'] - start))]
+                    texts, metadata_list, ids = (list(column) for column in zip(*rows))
+                    yield texts, np.array(vectors[start:start + len(rows)]), metadata_list, ids
+                    start += len(rows)
+            del vectors
+
+    def close(self) -> None:
+        """Discard the open (uncommitted) segment."""
+        if self._vectors_file is None:
+            return
+        for handle in (self._vectors_file, self._rows_file):
+            handle.close()
+        name = self._segment_name()
+        for suffix in (".f32", ".jsonl"):
+            path = self._path(name + suffix + _PARTIAL_SUFFIX)
+            if os.path.exists(path):
+                os.remove(path)
+        self._vectors_file = self._rows_file = None
+        self._pending_rows = 0
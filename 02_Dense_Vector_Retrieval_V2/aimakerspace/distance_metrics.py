@@ -3,10 +3,15 @@ Distance metrics for vector similarity search.
 
 This module provides multiple distance/similarity metrics that can be used
 for comparing embeddings in the vector database.
+
+Each pairwise metric has a batch counterpart that scores one query (shape
+``(d,)``) or a block of queries (shape ``(Q, d)``) against an ``(N, d)``
+matrix in a single vectorized call, returning scores of shape ``(N,)`` or
+``(Q, N)``.
 """
 
 import numpy as np
-from typing import Callable, Dict
+from typing import Callable, Dict, Optional, Union
 
 
 def cosine_similarity(vector_a: np.ndarray, vector_b: np.ndarray) -> float:
@@ -87,6 +92,91 @@ def manhattan_distance(vector_a: np.ndarray, vector_b: np.ndarray) -> float:
     return -distance  # Negative so higher is better
 
 
+def batch_dot_product_similarity(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Computes the dot product between queries and every row of a matrix.
+    
+    Args:
+        queries: Query vector (d,) or block of queries (Q, d)
+        matrix: Stored vectors (N, d)
+    
+    Returns:
+        np.ndarray: Scores of shape (N,) or (Q, N) (higher is more similar)
+    """
+    return np.asarray(queries, dtype=matrix.dtype) @ matrix.T
+
+
+def batch_cosine_similarity(
+    queries: np.ndarray,
+    matrix: np.ndarray,
+    matrix_norms: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Computes the cosine similarity between queries and every row of a matrix.
+    
+    Rows or queries with zero norm score 0.0, matching cosine_similarity.
+    
+    Args:
+        queries: Query vector (d,) or block of queries (Q, d)
+        matrix: Stored vectors (N, d)
+        matrix_norms: Optional precomputed L2 norms of the rows of ``matrix``
+                      (skips recomputing them on every call)
+    
+    Returns:
+        np.ndarray: Scores of shape (N,) or (Q, N) (higher is more similar)
+    """
+    queries = np.asarray(queries, dtype=matrix.dtype)
+    dots = queries @ matrix.T
+    if matrix_norms is None:
+        matrix_norms = np.linalg.norm(matrix, axis=1)
+    query_norms = np.linalg.norm(queries, axis=-1)
+    norms = np.multiply.outer(query_norms, matrix_norms)
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms != 0)
+
+
+def batch_euclidean_distance(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Computes the negative Euclidean distance between queries and every row of a matrix.
+    
+    Uses the expansion ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b so the heavy
+    lifting is a single matrix product.
+    
+    Args:
+        queries: Query vector (d,) or block of queries (Q, d)
+        matrix: Stored vectors (N, d)
+    
+    Returns:
+        np.ndarray: Scores of shape (N,) or (Q, N) (higher/less negative is more similar)
+    """
+    queries = np.asarray(queries, dtype=matrix.dtype)
+    squared = (
+        np.einsum("ij,ij->i", matrix, matrix)
+        - 2 * (queries @ matrix.T)
+        + np.einsum("...j,...j->...", queries, queries)[..., None]
+    )
+    return -np.sqrt(np.maximum(squared, 0))
+
+
+def batch_manhattan_distance(queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Computes the negative Manhattan (L1) distance between queries and every row of a matrix.
+    
+    L1 has no matrix-product form, so queries are processed one at a time to
+    keep the temporary (N, d) difference array bounded.
+    
+    Args:
+        queries: Query vector (d,) or block of queries (Q, d)
+        matrix: Stored vectors (N, d)
+    
+    Returns:
+        np.ndarray: Scores of shape (N,) or (Q, N) (higher/less negative is more similar)
+    """
+    queries = np.asarray(queries, dtype=matrix.dtype)
+    if queries.ndim == 1:
+        return -np.abs(matrix - queries).sum(axis=1)
+    return np.stack([-np.abs(matrix - query).sum(axis=1) for query in queries])
+
+
 # Dictionary of available metrics for easy access
 AVAILABLE_METRICS: Dict[str, Callable[[np.ndarray, np.ndarray], float]] = {
     'cosine': cosine_similarity,
@@ -95,13 +185,22 @@ AVAILABLE_METRICS: Dict[str, Callable[[np.ndarray, np.ndarray], float]] = {
     'manhattan': manhattan_distance,
 }
 
+# Batch (one-or-many queries vs. matrix) variants, keyed by the same names
+BATCH_METRICS: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    'cosine': batch_cosine_similarity,
+    'euclidean': batch_euclidean_distance,
+    'dot': batch_dot_product_similarity,
+    'manhattan': batch_manhattan_distance,
+}
+
 
-def get_metric(metric_name: str) -> Callable[[np.ndarray, np.ndarray], float]:
+def get_metric(metric_name: str, batch: bool = False) -> Callable:
     """
     Get a distance metric function by name.
     
     Args:
         metric_name: Name of the metric ('cosine', 'euclidean', 'dot', 'manhattan')
+        batch: If True, return the batch kernel instead of the pairwise function
     
     Returns:
         Callable: The metric function
@@ -114,7 +213,29 @@ def get_metric(metric_name: str) -> Callable[[np.ndarray, np.ndarray], float]:
             f"Unknown metric '{metric_name}'. "
             f"Available metrics: {list(AVAILABLE_METRICS.keys())}"
         )
-    return AVAILABLE_METRICS[metric_name]
+    return BATCH_METRICS[metric_name] if batch else AVAILABLE_METRICS[metric_name]
+
+
+def get_metric_name(distance_measure: Union[str, Callable]) -> Optional[str]:
+    """
+    Resolve a metric name or a built-in metric function to its name.
+    
+    Args:
+        distance_measure: Metric name, pairwise function or batch kernel
+    
+    Returns:
+        The metric name, or None for custom callables
+    
+    Raises:
+        ValueError: If distance_measure is a string that is not a known metric
+    """
+    if isinstance(distance_measure, str):
+        get_metric(distance_measure)
+        return distance_measure
+    for name in AVAILABLE_METRICS:
+        if distance_measure is AVAILABLE_METRICS[name] or distance_measure is BATCH_METRICS[name]:
+            return name
+    return None
 
 
 if __name__ == "__main__":
@@ -132,3 +253,8 @@ if __name__ == "__main__":
     for name, metric in AVAILABLE_METRICS.items():
         score = metric(v1, v3)
         print(f"  {name:12s}: {score:.4f}")
+    
+    print("\nBatch scoring v1 against [v2, v3]:")
+    matrix = np.array([v2, v3], dtype=np.float64)
+    for name, kernel in BATCH_METRICS.items():
+        print(f"  {name:12s}: {kernel(v1, matrix)}")
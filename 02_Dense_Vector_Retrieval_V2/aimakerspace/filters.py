@@ -0,0 +1,303 @@
+"""
+Metadata filter expressions compiled to index lookups.
+
+Filters use a small MongoDB-style language. A plain dict of
+``field: value`` pairs is the simple case (exact equality, AND'ed together)
+and keeps working unchanged:
+
+    {'category': 'Sleep'}
+    {'category': {'$in': ['Sleep', 'Stress']}}
+    {'category': {'$ne': 'General'}, 'page': {'$gte': 10, '$lt': 20}}
+    {'$or': [{'category': 'Sleep'}, {'source': 'faq.txt'}]}
+
+Supported operators: ``$eq``, ``$ne``, ``$in``, ``$nin``, ``$gt``, ``$gte``,
+``$lt``, ``$lte`` on fields and ``$and`` / ``$or`` groups. ``compile_filter``
+turns an expression into a FilterPlan once; evaluating the plan resolves it to
+candidate row ids with set operations over the MetadataIndex posting lists,
+never with a per-row Python predicate (except for equality against None or
+unhashable values, which cannot be indexed).
+"""
+
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Union
+from aimakerspace.metadata_index import MetadataIndex, value_kind
+
+
+_RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte'}
+_FIELD_OPERATORS = {'$eq', '$ne', '$in', '$nin'} | _RANGE_OPERATORS
+
+
+def _hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class _Context:
+    """Everything a plan node needs to resolve itself to row ids."""
+
+    def __init__(self, index: MetadataIndex, metadata: Sequence[Dict[str, Any]], universe: np.ndarray):
+        self.index = index
+        self.metadata = metadata
+        self.universe = universe
+
+    def restrict(self, rows: np.ndarray, universe: np.ndarray) -> np.ndarray:
+        """Intersect sorted ``rows`` with ``universe`` (free when universe is everything)."""
+        if universe is self.universe:
+            return rows
+        return np.intersect1d(rows, universe, assume_unique=True)
+
+    def scan(self, node: "_Node", universe: np.ndarray) -> np.ndarray:
+        """Fallback for predicates the index cannot answer."""
+        return np.fromiter(
+            (row for row in universe if node.matches(self.metadata[row])),
+            dtype=np.intp,
+        )
+
+
+class _Node:
+    # Lower ranks are evaluated first inside an AND so later children see a
+    # smaller universe
+    rank = 0
+
+    def evaluate(self, context: _Context, universe: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+
+class _Equals(_Node):
+    def __init__(self, field: str, value: Any):
+        self.field = field
+        self.value = value
+
+    def evaluate(self, context, universe):
+        # None also matches rows missing the field, which the index cannot see
+        if self.value is None or not _hashable(self.value):
+            return context.scan(self, universe)
+        return context.restrict(context.index.lookup(self.field, self.value), universe)
+
+    def matches(self, metadata):
+        return metadata.get(self.field) == self.value
+
+
+class _In(_Node):
+    def __init__(self, field: str, values: List[Any]):
+        self.field = field
+        self.values = values
+
+    def evaluate(self, context, universe):
+        if any(value is None or not _hashable(value) for value in self.values):
+            return context.scan(self, universe)
+        postings = [context.index.lookup(self.field, value) for value in self.values]
+        rows = np.unique(np.concatenate(postings)) if postings else np.empty(0, dtype=np.intp)
+        return context.restrict(rows, universe)
+
+    def matches(self, metadata):
+        return any(metadata.get(self.field) == value for value in self.values)
+
+
+class _Range(_Node):
+    def __init__(self, field: str, lower: Any, upper: Any, include_lower: bool, include_upper: bool):
+        self.field = field
+        self.lower = lower
+        self.upper = upper
+        self.include_lower = include_lower
+        self.include_upper = include_upper
+        self.kind = value_kind(lower if lower is not None else upper)
+
+    def evaluate(self, context, universe):
+        rows = context.index.range_lookup(
+            self.field, self.lower, self.upper, self.include_lower, self.include_upper
+        )
+        return context.restrict(rows, universe)
+
+    def matches(self, metadata):
+        value = metadata.get(self.field)
+        if value_kind(value) != self.kind:
+            return False
+        if self.lower is not None and (value < self.lower or (value == self.lower and not self.include_lower)):
+            return False
+        if self.upper is not None and (value > self.upper or (value == self.upper and not self.include_upper)):
+            return False
+        return True
+
+
+class _Not(_Node):
+    rank = 1
+
+    def __init__(self, child: _Node):
+        self.child = child
+
+    def evaluate(self, context, universe):
+        return np.setdiff1d(universe, self.child.evaluate(context, universe), assume_unique=True)
+
+    def matches(self, metadata):
+        return not self.child.matches(metadata)
+
+
+class _And(_Node):
+    rank = 1
+
+    def __init__(self, children: List[_Node]):
+        self.children = sorted(children, key=lambda child: child.rank)
+
+    def evaluate(self, context, universe):
+        rows = universe
+        for child in self.children:
+            if len(rows) == 0:
+                break
+            rows = child.evaluate(context, rows)
+        return rows
+
+    def matches(self, metadata):
+        return all(child.matches(metadata) for child in self.children)
+
+
+class _Or(_Node):
+    rank = 1
+
+    def __init__(self, children: List[_Node]):
+        self.children = children
+
+    def evaluate(self, context, universe):
+        results = [child.evaluate(context, universe) for child in self.children]
+        if not results:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(results))
+
+    def matches(self, metadata):
+        return any(child.matches(metadata) for child in self.children)
+
+
+class FilterPlan:
+    """
+    A compiled metadata filter.
+
+    Build one with ``compile_filter`` and reuse it across queries; a plan can
+    be passed anywhere a ``metadata_filter`` dict is accepted.
+    """
+
+    def __init__(self, root: _Node, expression: Any = None):
+        self.root = root
+        self.expression = expression
+
+    def evaluate(
+        self,
+        index: MetadataIndex,
+        metadata: Sequence[Dict[str, Any]],
+        universe: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Resolve the plan to the rows that match it.
+
+        Args:
+            index: The metadata index to resolve lookups against
+            metadata: Row id -> metadata side table (used only for unindexable values)
+            universe: Sorted row ids eligible for matching
+
+        Returns:
+            np.ndarray: Sorted matching row ids
+        """
+        return self.root.evaluate(_Context(index, metadata, universe), universe)
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Evaluate the filter against a single metadata dict."""
+        return self.root.matches(metadata)
+
+    def __repr__(self) -> str:
+        return f"FilterPlan({self.expression!r})"
+
+
+def _compile_field(field: str, condition: Any) -> _Node:
+    if not (isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition)):
+        return _Equals(field, condition)
+
+    unknown = set(condition) - _FIELD_OPERATORS
+    if unknown:
+        raise ValueError(
+            f"Unknown operator(s) {sorted(unknown)} for field '{field}'. "
+            f"Supported: {sorted(_FIELD_OPERATORS)}"
+        )
+
+    nodes: List[_Node] = []
+    if '$eq' in condition:
+        nodes.append(_Equals(field, condition['$eq']))
+    if '$ne' in condition:
+        nodes.append(_Not(_Equals(field, condition['$ne'])))
+    if '$in' in condition:
+        nodes.append(_In(field, list(condition['$in'])))
+    if '$nin' in condition:
+        nodes.append(_Not(_In(field, list(condition['$nin']))))
+
+    if _RANGE_OPERATORS & set(condition):
+        lower = condition.get('$gte', condition.get('$gt'))
+        upper = condition.get('$lte', condition.get('$lt'))
+        if '$gt' in condition and '$gte' in condition:
+            raise ValueError(f"Field '{field}' cannot combine '$gt' and '$gte'.")
+        if '$lt' in condition and '$lte' in condition:
+            raise ValueError(f"Field '{field}' cannot combine '$lt' and '$lte'.")
+        kinds = {value_kind(bound) for bound in (lower, upper) if bound is not None}
+        if len(kinds) != 1 or None in kinds:
+            raise ValueError(
+                f"Range bounds for field '{field}' must both be numbers or both be strings."
+            )
+        nodes.append(_Range(field, lower, upper, '$gte' in condition, '$lte' in condition))
+
+    return nodes[0] if len(nodes) == 1 else _And(nodes)
+
+
+def _compile(expression: Any) -> _Node:
+    if isinstance(expression, FilterPlan):
+        return expression.root
+    if not isinstance(expression, dict):
+        raise ValueError(f"Filter must be a dict, got {type(expression).__name__}.")
+
+    nodes: List[_Node] = []
+    for key, condition in expression.items():
+        if key in ('$and', '$or'):
+            if not isinstance(condition, (list, tuple)):
+                raise ValueError(f"'{key}' expects a list of filters.")
+            children = [_compile(child) for child in condition]
+            nodes.append(_And(children) if key == '$and' else _Or(children))
+        elif key.startswith('$'):
+            raise ValueError(f"Unknown top-level operator '{key}'. Supported: ['$and', '$or']")
+        else:
+            nodes.append(_compile_field(key, condition))
+    return nodes[0] if len(nodes) == 1 else _And(nodes)
+
+
+def compile_filter(metadata_filter: Union[Dict[str, Any], FilterPlan]) -> FilterPlan:
+    """
+    Compile a metadata filter expression into a reusable plan.
+
+    Args:
+        metadata_filter: Filter dict (see module docstring) or an existing plan
+
+    Returns:
+        FilterPlan: The compiled plan
+
+    Raises:
+        ValueError: If the expression uses an unknown operator or invalid bounds
+    """
+    if isinstance(metadata_filter, FilterPlan):
+        return metadata_filter
+    return FilterPlan(_compile(metadata_filter), metadata_filter)
+
+
+def combine_filters(*filters: Optional[Union[Dict[str, Any], FilterPlan]]) -> Optional[FilterPlan]:
+    """
+    AND together any number of filters, ignoring empty ones.
+
+    Returns:
+        FilterPlan, or None if every filter was empty
+    """
+    plans = [compile_filter(f) for f in filters if f]
+    if not plans:
+        return None
+    if len(plans) == 1:
+        return plans[0]
+    return FilterPlan(_And([plan.root for plan in plans]), {'$and': [plan.expression for plan in plans]})
@@ -0,0 +1,102 @@
+"""
+Fusion of ranked result lists from different retrievers (e.g. BM25 + dense).
+
+Both methods take one ``(row ids, scores)`` pair per retriever, best first,
+and return a single fused pair:
+
+- Reciprocal Rank Fusion (RRF) uses only ranks: a row scores
+  ``sum_i weight_i / (rrf_k + rank_i)``. It needs no score calibration, so
+  it is the robust default for mixing BM25 scores with cosine similarities.
+- Weighted score fusion min-max normalizes each list's scores to [0, 1]
+  and adds them with the given weights. It keeps score gaps that RRF
+  discards, at the price of depending on each list's score range.
+
+A row missing from one list simply gets no contribution from it.
+"""
+
+import numpy as np
+from typing import List, Optional, Sequence
+from aimakerspace.indexes.flat import SearchResult
+from aimakerspace.topk import top_k_indices
+
+RRF_K = 60
+FUSION_METHODS = ('rrf', 'weighted')
+
+
+def _fuse(
+    results: Sequence[SearchResult],
+    contributions: List[np.ndarray],
+    k: int,
+) -> SearchResult:
+    """Sum per-row contributions across lists and keep the k best rows."""
+    rows = np.concatenate([np.asarray(result_rows, dtype=np.intp) for result_rows, _ in results])
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    unique_rows, inverse = np.unique(rows, return_inverse=True)
+    fused = np.bincount(inverse, weights=np.concatenate(contributions)).astype(np.float32)
+    top = top_k_indices(fused, k)
+    return unique_rows[top], fused[top]
+
+
+def _weights(results: Sequence[SearchResult], weights: Optional[Sequence[float]]) -> Sequence[float]:
+    if weights is None:
+        return [1.0] * len(results)
+    if len(weights) != len(results):
+        raise ValueError(f"Got {len(results)} result lists but {len(weights)} weights.")
+    return weights
+
+
+def reciprocal_rank_fusion(
+    results: Sequence[SearchResult],
+    k: int,
+    weights: Optional[Sequence[float]] = None,
+    rrf_k: int = RRF_K,
+) -> SearchResult:
+    """
+    Fuse ranked lists by (weighted) Reciprocal Rank Fusion.
+
+    Args:
+        results: One (row ids, scores) pair per retriever, best first
+        k: Number of fused results to return
+        weights: Optional weight per retriever (default 1.0 each)
+        rrf_k: Rank offset; larger values flatten the gap between top ranks
+
+    Returns:
+        Fused (row ids, RRF scores), best first
+    """
+    weights = _weights(results, weights)
+    contributions = [
+        weight / (rrf_k + np.arange(1, len(result_rows) + 1, dtype=np.float64))
+        for (result_rows, _), weight in zip(results, weights)
+    ]
+    return _fuse(results, contributions, k)
+
+
+def weighted_score_fusion(
+    results: Sequence[SearchResult],
+    k: int,
+    weights: Optional[Sequence[float]] = None,
+) -> SearchResult:
+    """
+    Fuse lists by a weighted sum of min-max normalized scores.
+
+    Args:
+        results: One (row ids, scores) pair per retriever, best first
+        k: Number of fused results to return
+        weights: Optional weight per retriever (default 1.0 each)
+
+    Returns:
+        Fused (row ids, fused scores), best first
+    """
+    weights = _weights(results, weights)
+    contributions = []
+    for (_, scores), weight in zip(results, weights):
+        scores = np.asarray(scores, dtype=np.float64)
+        if len(scores) == 0:
+            contributions.append(scores)
+            continue
+        spread = scores.max() - scores.min()
+        # A list whose scores are all equal counts as fully relevant
+        normalized = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+        contributions.append(weight * normalized)
+    return _fuse(results, contributions, k)
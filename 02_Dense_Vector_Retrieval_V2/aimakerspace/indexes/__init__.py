@@ -0,0 +1,68 @@
+"""
+Search indexes for VectorDatabase.
+
+An index decides which rows of the VectorStore get scored for a query:
+FlatIndex scores every candidate exactly, IVFIndex only the rows in the
+k-means cells closest to the query, HNSWIndex only the rows reached by a
+beam search over a proximity graph, ScalarQuantizedIndex scores compact
+int8 codes before re-scoring the best candidates exactly, and PQIndex
+scores product-quantized codes through per-query lookup tables (optionally
+behind a coarse IVF partition). ShardedIndex runs exact search across worker
+processes that share a memory-mapped matrix.
+"""
+
+from typing import Any, Dict, Optional, Union
+from aimakerspace.indexes.flat import FlatIndex
+from aimakerspace.indexes.hnsw import HNSWIndex
+from aimakerspace.indexes.ivf import IVFIndex
+from aimakerspace.indexes.pq import PQIndex, ProductQuantizer
+from aimakerspace.indexes.quantized import ScalarQuantizedIndex, ScalarQuantizer
+from aimakerspace.indexes.sharded import ShardedIndex
+
+INDEX_TYPES = {
+    FlatIndex.name: FlatIndex,
+    IVFIndex.name: IVFIndex,
+    HNSWIndex.name: HNSWIndex,
+    ScalarQuantizedIndex.name: ScalarQuantizedIndex,
+    PQIndex.name: PQIndex,
+    ShardedIndex.name: ShardedIndex,
+}
+
+
+def create_index(index: Union[str, Any, None] = None, params: Optional[Dict[str, Any]] = None):
+    """
+    Build an index from a name, or pass an existing index instance through.
+
+    Args:
+        index: Index name ('flat', 'ivf', 'hnsw', 'sq', 'pq', 'sharded'), an index instance, or None for 'flat'
+        params: Constructor keyword arguments when ``index`` is a name
+
+    Returns:
+        The index instance
+
+    Raises:
+        ValueError: If the index name is not recognized
+    """
+    if index is None:
+        index = FlatIndex.name
+    if not isinstance(index, str):
+        return index
+    if index not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown index '{index}'. Available indexes: {list(INDEX_TYPES.keys())}"
+        )
+    return INDEX_TYPES[index](**(params or {}))
+
+
+__all__ = [
+    "FlatIndex",
+    "IVFIndex",
+    "HNSWIndex",
+    "ScalarQuantizedIndex",
+    "ScalarQuantizer",
+    "PQIndex",
+    "ProductQuantizer",
+    "ShardedIndex",
+    "INDEX_TYPES",
+    "create_index",
+]
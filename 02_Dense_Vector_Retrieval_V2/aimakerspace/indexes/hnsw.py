@@ -0,0 +1,443 @@
+"""
+HNSW (hierarchical navigable small world) graph index.
+
+Every row is a node in a layered proximity graph. Upper layers are sparse
+long-range shortcuts; layer 0 links every node to its ``2 * M`` best
+neighbours. A query greedily descends the layers from a fixed entry point
+and then runs a best-first beam search of width ``ef_search`` on layer 0,
+so it touches a few hundred rows instead of all N. Per-query bookkeeping is
+sized to the nodes touched as well: visited nodes are stamped in a reusable
+per-thread array, and filters are checked against the sorted candidate rows.
+
+Implemented for the 'cosine' and 'dot' metrics (Malkov & Yashunin, 2016,
+with the neighbour-diversity heuristic). Any other metric, or a custom
+callable, falls back to exact search.
+"""
+
+import heapq
+import math
+import threading
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from aimakerspace.distance_metrics import get_metric_name
+from aimakerspace.indexes.flat import SearchResult, exact_top_k
+from aimakerspace.topk import top_k_indices
+from aimakerspace.vector_store import VectorStore
+
+_SUPPORTED_METRICS = ('cosine', 'dot')
+
+# Visit stamps wrap around before overflowing uint32
+_MAX_EPOCH = np.iinfo(np.uint32).max
+
+
+def _contains(sorted_rows: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """Membership of each node in a sorted array of row ids."""
+    if len(sorted_rows) == 0:
+        return np.zeros(len(nodes), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_rows, nodes), len(sorted_rows) - 1)
+    return sorted_rows[positions] == nodes
+
+
+class HNSWIndex:
+    """
+    Navigable small-world graph index over the rows of a VectorStore.
+
+    Rows are linked into the graph as they are inserted (``add``), so the
+    index is always up to date; re-inserting an existing key re-links its
+    node. The graph holds row ids only; vectors stay in the store.
+    """
+
+    name = 'hnsw'
+
+    def __init__(
+        self,
+        M: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 50,
+        metric: str = 'cosine',
+        filter_exact_ratio: float = 0.05,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            M: Links per node on upper layers (2 * M on layer 0)
+            ef_construction: Beam width while linking new nodes (build quality)
+            ef_search: Beam width at query time (recall vs. latency)
+            metric: 'cosine' or 'dot'
+            filter_exact_ratio: Filters matching at most this fraction of the
+                                rows are scored exactly instead of walking the graph
+            seed: Random seed for layer assignment
+        """
+        if metric not in _SUPPORTED_METRICS:
+            raise ValueError(
+                f"HNSWIndex supports metrics {list(_SUPPORTED_METRICS)}, got '{metric}'."
+            )
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.metric = metric
+        self.filter_exact_ratio = filter_exact_ratio
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self._level_mult = 1 / math.log(max(M, 2))
+        self._max_links0 = 2 * M
+
+        self._levels = np.full(0, -1, dtype=np.int8)
+        self._links0 = np.full((0, self._max_links0), -1, dtype=np.int32)
+        self._counts0 = np.zeros(0, dtype=np.int32)
+        self._scale = np.zeros(0, dtype=np.float32)
+        self._upper: List[Dict[int, np.ndarray]] = []
+        self.entry_point = -1
+        self.max_level = -1
+        # Per-thread visit stamps, reused across searches (concurrent readers
+        # each get their own)
+        self._visits = threading.local()
+
+    def __len__(self) -> int:
+        return int((self._levels >= 0).sum())
+
+    # ------------------------------------------------------------------ #
+    # Graph storage
+    # ------------------------------------------------------------------ #
+    def _reserve(self, n_rows: int) -> None:
+        capacity = len(self._levels)
+        if n_rows <= capacity:
+            return
+        capacity = max(n_rows, 2 * capacity, 1024)
+        levels = np.full(capacity, -1, dtype=np.int8)
+        levels[: len(self._levels)] = self._levels
+        links0 = np.full((capacity, self._max_links0), -1, dtype=np.int32)
+        links0[: len(self._links0)] = self._links0
+        counts0 = np.zeros(capacity, dtype=np.int32)
+        counts0[: len(self._counts0)] = self._counts0
+        scale = np.zeros(capacity, dtype=np.float32)
+        scale[: len(self._scale)] = self._scale
+        self._levels, self._links0, self._counts0, self._scale = levels, links0, counts0, scale
+
+    def _links(self, level: int, node: int) -> np.ndarray:
+        if level == 0:
+            return self._links0[node, : self._counts0[node]]
+        return self._upper[level - 1].get(node, np.empty(0, dtype=np.int32))
+
+    def _set_links(self, level: int, node: int, links: np.ndarray) -> None:
+        if level == 0:
+            self._links0[node, : len(links)] = links
+            self._links0[node, len(links):] = -1
+            self._counts0[node] = len(links)
+        else:
+            self._upper[level - 1][node] = np.asarray(links, dtype=np.int32)
+
+    # ------------------------------------------------------------------ #
+    # Similarity
+    # ------------------------------------------------------------------ #
+    def _prepare_query(self, query: np.ndarray) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32)
+        if self.metric == 'cosine':
+            norm = np.linalg.norm(query)
+            if norm > 0:
+                query = query / norm
+        return query
+
+    def _update_scale(self, store: VectorStore, rows: np.ndarray) -> None:
+        # Cosine against a unit query is dot * (1 / ||row||); caching the
+        # reciprocal norms keeps every graph step a single matvec + multiply
+        if self.metric == 'cosine' and not store.normalize:
+            norms = store.norms[rows]
+            self._scale[rows] = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        else:
+            self._scale[rows] = 1.0
+
+    def _similarity(self, store: VectorStore, query: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        return (store.matrix[nodes] @ query) * self._scale[nodes]
+
+    def _unit_vectors(self, store: VectorStore, nodes: np.ndarray) -> np.ndarray:
+        return store.matrix[nodes] * self._scale[nodes][:, None]
+
+    # ------------------------------------------------------------------ #
+    # Core graph routines
+    # ------------------------------------------------------------------ #
+    def _visit_marks(self) -> Tuple[np.ndarray, int]:
+        """
+        This thread's visit stamps and a fresh epoch.
+
+        A node counts as visited when its stamp equals the epoch, so starting
+        a new search costs one increment instead of zeroing an N-sized array.
+        """
+        visits = self._visits
+        marks = getattr(visits, 'marks', None)
+        if marks is None or len(marks) < len(self._levels):
+            visits.marks = marks = np.zeros(len(self._levels), dtype=np.uint32)
+            visits.epoch = 0
+        if visits.epoch == _MAX_EPOCH:
+            marks[:] = 0
+            visits.epoch = 0
+        visits.epoch += 1
+        return marks, visits.epoch
+
+    def _search_layer(
+        self,
+        store: VectorStore,
+        query: np.ndarray,
+        entry_points: List[int],
+        ef: int,
+        level: int,
+        allowed: Optional[np.ndarray] = None,
+    ) -> List[Tuple[float, int]]:
+        """
+        Best-first beam search on one layer.
+
+        Args:
+            allowed: Optional sorted row ids that may be returned (all others
+                     are still walked through)
+
+        Returns:
+            Up to ``ef`` (similarity, node) pairs, as an unordered min-heap
+        """
+        marks, epoch = self._visit_marks()
+        entry = np.asarray(entry_points, dtype=np.intp)
+        marks[entry] = epoch
+        entry_scores = self._similarity(store, query, entry).tolist()
+
+        candidates = [(-score, node) for score, node in zip(entry_scores, entry.tolist())]
+        heapq.heapify(candidates)
+        entry_allowed = [True] * len(entry) if allowed is None else _contains(allowed, entry).tolist()
+        results = [
+            (score, node)
+            for score, node, ok in zip(entry_scores, entry.tolist(), entry_allowed)
+            if ok
+        ]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_score, node = heapq.heappop(candidates)
+            if len(results) >= ef and -negative_score < results[0][0]:
+                break
+            neighbours = self._links(level, node)
+            neighbours = neighbours[marks[neighbours] != epoch]
+            if len(neighbours) == 0:
+                continue
+            marks[neighbours] = epoch
+            scores = self._similarity(store, query, neighbours)
+            neighbours_allowed = (
+                [True] * len(neighbours) if allowed is None else _contains(allowed, neighbours).tolist()
+            )
+            for score, neighbour, ok in zip(scores.tolist(), neighbours.tolist(), neighbours_allowed):
+                if len(results) < ef or score > results[0][0]:
+                    heapq.heappush(candidates, (-score, neighbour))
+                    if ok:
+                        heapq.heappush(results, (score, neighbour))
+                        if len(results) > ef:
+                            heapq.heappop(results)
+        return results
+
+    def _select_neighbours(
+        self,
+        store: VectorStore,
+        nodes: np.ndarray,
+        scores: np.ndarray,
+        max_links: int,
+    ) -> np.ndarray:
+        """
+        Diversity heuristic: keep a candidate only if it is closer to the base
+        node than to every neighbour already kept, then top up with the best
+        of the pruned ones.
+        """
+        order = np.argsort(-scores, kind="stable")
+        nodes, scores = nodes[order], scores[order]
+        if len(nodes) <= max_links:
+            return nodes.astype(np.int32)
+        vectors = self._unit_vectors(store, nodes)
+        pairwise = vectors @ vectors.T
+        # Best similarity of each candidate to any neighbour kept so far
+        closest = np.full(len(nodes), -np.inf, dtype=np.float32)
+        kept: List[int] = []
+        pruned: List[int] = []
+        for i, score in enumerate(scores.tolist()):
+            if len(kept) >= max_links:
+                break
+            if score > closest[i]:
+                kept.append(i)
+                np.maximum(closest, pairwise[i], out=closest)
+            else:
+                pruned.append(i)
+        kept.extend(pruned[: max_links - len(kept)])
+        return nodes[kept].astype(np.int32)
+
+    def _insert(self, store: VectorStore, node: int) -> None:
+        query = self._unit_vectors(store, np.array([node]))[0]
+        # An overwritten node keeps its layer; its links are replaced below
+        level = int(self._levels[node])
+        if level < 0:
+            level = int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+            self._levels[node] = level
+        while len(self._upper) < level:
+            self._upper.append({})
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            return
+
+        entry = [self.entry_point]
+        for layer in range(self.max_level, level, -1):
+            nearest = self._search_layer(store, query, entry, 1, layer)
+            entry = [max(nearest)[1]]
+
+        for layer in range(min(level, self.max_level), -1, -1):
+            found = [(score, other) for score, other in self._search_layer(
+                store, query, entry, self.ef_construction, layer
+            ) if other != node]
+            if not found:
+                continue
+            max_links = self._max_links0 if layer == 0 else self.M
+            candidate_nodes = np.array([other for _, other in found], dtype=np.intp)
+            candidate_scores = np.array([score for score, _ in found], dtype=np.float32)
+            neighbours = self._select_neighbours(store, candidate_nodes, candidate_scores, self.M)
+            self._set_links(layer, node, neighbours)
+
+            for neighbour in neighbours.tolist():
+                links = self._links(layer, neighbour)
+                if node in links:
+                    continue
+                if len(links) < max_links:
+                    self._set_links(layer, neighbour, np.append(links, node).astype(np.int32))
+                    continue
+                # Neighbour is full: re-select its links including the new node
+                pool = np.append(links, node).astype(np.intp)
+                base = self._unit_vectors(store, np.array([neighbour]))[0]
+                pool_scores = self._unit_vectors(store, pool) @ base
+                self._set_links(layer, neighbour, self._select_neighbours(store, pool, pool_scores, max_links))
+            entry = [other for _, other in found]
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    # ------------------------------------------------------------------ #
+    # Index interface
+    # ------------------------------------------------------------------ #
+    def add(self, store: VectorStore, rows: np.ndarray) -> None:
+        """
+        Link (new or overwritten) rows into the graph.
+
+        Args:
+            store: The vector store the rows live in
+            rows: Row ids to insert
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        self._reserve(len(store))
+        self._update_scale(store, rows)
+        for row in rows.tolist():
+            self._insert(store, row)
+
+    def search(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        k: int,
+        distance_measure: Union[str, Callable],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """
+        Approximate search by walking the graph.
+
+        Args:
+            store: The vector store to search
+            queries: Query block of shape (Q, d)
+            k: Number of results per query
+            distance_measure: Metric function or name, or a custom pairwise callable
+            rows: Optional sorted candidate row ids from a metadata filter
+
+        Returns:
+            One (row ids, scores) pair per query, best first
+        """
+        metric_name = get_metric_name(distance_measure)
+        if metric_name != self.metric or self.entry_point < 0:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+        if rows is not None and len(rows) <= self.filter_exact_ratio * len(store):
+            return exact_top_k(store, queries, k, distance_measure, rows)
+
+        ef = max(self.ef_search, k)
+        results: List[SearchResult] = []
+        for query in np.asarray(queries, dtype=np.float32):
+            unit_query = self._prepare_query(query)
+            entry = [self.entry_point]
+            for layer in range(self.max_level, 0, -1):
+                entry = [max(self._search_layer(store, unit_query, entry, 1, layer))[1]]
+            found = self._search_layer(store, unit_query, entry, ef, 0, rows)
+            nodes = np.array([node for _, node in found], dtype=np.intp)
+            if len(nodes) == 0:
+                results.append((nodes, np.empty(0, dtype=np.float32)))
+                continue
+            # Report scores on the query's own scale (dot uses the raw query)
+            scores = self._similarity(store, unit_query if self.metric == 'cosine' else query, nodes)
+            top = top_k_indices(scores, k)
+            results.append((nodes[top], scores[top]))
+        return results
+
+    def prepare(self, store: VectorStore) -> None:
+        """Nothing is built lazily: the graph is linked on ``add`` and ``search`` only reads."""
+
+    def compact(self, store: VectorStore, keep: np.ndarray) -> None:
+        """
+        Rebuild the graph over the compacted store.
+
+        Tombstoned nodes stay in the graph (as routing-only nodes) until
+        compaction; removing them in place would leave holes in the
+        neighbourhoods, so the graph is relinked from scratch instead. That
+        is a full rebuild, O(N log N) graph searches in Python, and it runs
+        under the database's write lock: compact in a maintenance window,
+        not after every delete.
+
+        Args:
+            store: The compacted store
+            keep: Old row id of each surviving row (new row ``i`` was ``keep[i]``)
+        """
+        self.__init__(**self.get_params())
+        self.add(store, store.all_rows)
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, used to persist the index configuration."""
+        return {
+            'M': self.M,
+            'ef_construction': self.ef_construction,
+            'ef_search': self.ef_search,
+            'metric': self.metric,
+            'filter_exact_ratio': self.filter_exact_ratio,
+            'seed': self.seed,
+        }
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Graph arrays: layer 0 as a dense link matrix, upper layers flattened (CSR)."""
+        upper_nodes, upper_layers, upper_offsets, upper_links = [], [], [0], []
+        for layer, links in enumerate(self._upper, start=1):
+            for node, neighbours in links.items():
+                upper_nodes.append(node)
+                upper_layers.append(layer)
+                upper_links.append(neighbours)
+                upper_offsets.append(upper_offsets[-1] + len(neighbours))
+        return {
+            'levels': self._levels,
+            'links0': self._links0,
+            'counts0': self._counts0,
+            'scale': self._scale,
+            'upper_nodes': np.array(upper_nodes, dtype=np.int32),
+            'upper_layers': np.array(upper_layers, dtype=np.int32),
+            'upper_offsets': np.array(upper_offsets, dtype=np.int64),
+            'upper_links': np.concatenate(upper_links) if upper_links else np.empty(0, dtype=np.int32),
+            'entry': np.array([self.entry_point, self.max_level], dtype=np.int64),
+        }
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays produced by ``get_state``."""
+        if 'levels' not in state:
+            return
+        self._levels = np.array(state['levels'], dtype=np.int8)
+        self._links0 = np.array(state['links0'], dtype=np.int32)
+        self._counts0 = np.array(state['counts0'], dtype=np.int32)
+        self._scale = np.array(state['scale'], dtype=np.float32)
+        self.entry_point, self.max_level = (int(value) for value in state['entry'])
+        self._upper = [{} for _ in range(max(self.max_level, 0))]
+        offsets = state['upper_offsets']
+        for i, (node, layer) in enumerate(zip(state['upper_nodes'].tolist(), state['upper_layers'].tolist())):
+            self._upper[layer - 1][node] = np.array(state['upper_links'][offsets[i]:offsets[i + 1]], dtype=np.int32)
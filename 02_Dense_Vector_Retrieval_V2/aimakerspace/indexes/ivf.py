@@ -0,0 +1,336 @@
+"""
+IVF (inverted file) approximate search index.
+
+The corpus is partitioned with k-means into ``n_lists`` coarse cells. A query
+is compared with the cell centroids first and only the rows of the ``nprobe``
+closest cells are scored exactly, so per-query work drops from N rows to
+roughly ``N * nprobe / n_lists``. Raising ``nprobe`` trades latency for recall.
+"""
+
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Union
+from aimakerspace.distance_metrics import get_metric, get_metric_name
+from aimakerspace.indexes.flat import SearchResult, exact_top_k, score_rows
+from aimakerspace.topk import top_k_indices
+from aimakerspace.vector_store import VectorStore
+
+# Rows processed per chunk when assigning vectors to cells; the (chunk, C)
+# score block stays cache-resident, which matters for low-dimensional PQ subspaces
+_ASSIGN_CHUNK = 1024
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, spherical: bool) -> np.ndarray:
+    """
+    Assign each vector to its nearest centroid.
+
+    Args:
+        vectors: Vectors of shape (N, d)
+        centroids: Centroids of shape (C, d)
+        spherical: If True, compare by cosine (centroids must be unit length);
+                   otherwise by Euclidean distance
+
+    Returns:
+        np.ndarray: Centroid id of each vector, shape (N,)
+    """
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    centroid_sq = np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(vectors), _ASSIGN_CHUNK):
+        chunk = vectors[start:start + _ASSIGN_CHUNK]
+        if spherical:
+            scores = chunk @ centroids.T
+        else:
+            # argmin ||x - c||^2 == argmax 2 x.c - ||c||^2
+            scores = chunk @ centroids.T
+            scores *= 2
+            scores -= centroid_sq
+        assignments[start:start + len(chunk)] = np.argmax(scores, axis=1)
+    return assignments
+
+
+def kmeans(
+    data: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    spherical: bool = False,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Lloyd's k-means in pure NumPy.
+
+    Args:
+        data: Training vectors of shape (N, d), N >= n_clusters
+        n_clusters: Number of centroids
+        n_iter: Number of Lloyd iterations
+        spherical: If True, cluster unit vectors by cosine (spherical k-means)
+        seed: Random seed for initialization and empty-cell reseeding
+
+    Returns:
+        np.ndarray: Centroids of shape (n_clusters, d), float32
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    if spherical:
+        data = _unit_rows(data)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = nearest_centroids(data, centroids, spherical)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Per-cell sums via one sort + segmented reduction
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        empty = counts == 0
+        sums = np.zeros_like(centroids)
+        sums[~empty] = np.add.reduceat(data[order], starts[~empty], axis=0)
+        centroids = sums / np.maximum(counts, 1)[:, None]
+        if empty.any():
+            # Reseed empty cells with random training points
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        if spherical:
+            centroids = _unit_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index with k-means coarse centroids and per-cell row arrays.
+
+    The index holds row ids only; vectors stay in the VectorStore. It trains
+    itself lazily on the first search once the store has at least
+    ``n_lists`` rows (or explicitly via ``train``); until then search is exact.
+    Rows inserted after training are assigned to their nearest cell. Centroids
+    fitted on a small store describe later rows poorly, so the index retrains
+    once the store has grown ``retrain_growth`` times past the rows it was
+    trained on, until a training run could sample ``n_lists *
+    train_size_per_list`` rows.
+
+    Any built-in metric can be searched: ``metric`` only decides the geometry
+    used for clustering and probing (cosine/dot cluster unit vectors,
+    euclidean/manhattan cluster raw vectors). Custom callables fall back to
+    exact search.
+    """
+
+    name = 'ivf'
+
+    def __init__(
+        self,
+        n_lists: int = 256,
+        nprobe: int = 8,
+        metric: str = 'cosine',
+        n_iter: int = 20,
+        train_size_per_list: int = 256,
+        retrain_growth: Optional[float] = 2.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            n_lists: Number of k-means cells
+            nprobe: Number of closest cells scored per query
+            metric: Metric name from AVAILABLE_METRICS that the index is tuned for
+            n_iter: k-means iterations during training
+            train_size_per_list: Training sample size per cell
+            retrain_growth: Retrain once the store holds this many times the rows
+                            seen by the last training (None never retrains)
+            seed: Random seed for training
+        """
+        get_metric(metric)
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.metric = metric
+        self.n_iter = n_iter
+        self.train_size_per_list = train_size_per_list
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        # Store rows when the centroids were last trained
+        self._trained_rows = 0
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._list_rows: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+
+    @property
+    def spherical(self) -> bool:
+        return self.metric in ('cosine', 'dot')
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _needs_training(self, store: VectorStore) -> bool:
+        """Whether the centroids are missing (and trainable) or stale."""
+        if not self.is_trained:
+            return len(store) >= self.n_lists
+        return (
+            self.retrain_growth is not None
+            and self._trained_rows < self.n_lists * self.train_size_per_list
+            and len(store) >= self.retrain_growth * self._trained_rows
+        )
+
+    def train(self, store: VectorStore) -> None:
+        """
+        Train the coarse centroids on a sample of the store and assign every row.
+
+        Args:
+            store: The vector store to index
+        """
+        n_rows = len(store)
+        if n_rows < self.n_lists:
+            raise ValueError(
+                f"IVF training needs at least n_lists={self.n_lists} vectors, got {n_rows}."
+            )
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n_rows, self.n_lists * self.train_size_per_list)
+        sample = np.sort(rng.choice(n_rows, sample_size, replace=False))
+        self.centroids = kmeans(
+            store.matrix[sample], self.n_lists, self.n_iter, self.spherical, self.seed
+        )
+        self._trained_rows = n_rows
+        self._assignments = np.full(n_rows, -1, dtype=np.int32)
+        self.add(store, store.all_rows)
+
+    def add(self, store: VectorStore, rows: np.ndarray) -> None:
+        """
+        Assign (new or overwritten) rows to their nearest cell.
+
+        Args:
+            store: The vector store the rows live in
+            rows: Row ids to (re)assign
+        """
+        if not self.is_trained or len(rows) == 0:
+            return
+        if len(self._assignments) < len(store):
+            grown = np.full(max(len(store), 2 * len(self._assignments)), -1, dtype=np.int32)
+            grown[: len(self._assignments)] = self._assignments
+            self._assignments = grown
+        vectors = store.matrix[rows]
+        if self.spherical:
+            vectors = _unit_rows(vectors)
+        self._assignments[rows] = nearest_centroids(vectors, self.centroids, self.spherical)
+        self._list_rows = None
+
+    def _lists(self, n_rows: int):
+        """Per-cell row arrays in CSR form (rows grouped by cell + offsets), rebuilt when stale."""
+        if self._list_rows is None:
+            assignments = self._assignments[:n_rows]
+            assigned = np.flatnonzero(assignments >= 0)
+            order = np.argsort(assignments[assigned], kind="stable")
+            self._list_rows = assigned[order]
+            counts = np.bincount(assignments[assigned], minlength=self.n_lists)
+            self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+        return self._list_rows, self._list_offsets
+
+    def search(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        k: int,
+        distance_measure: Union[str, Callable],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """
+        Approximate search: probe the ``nprobe`` closest cells per query.
+
+        Args:
+            store: The vector store to search
+            queries: Query block of shape (Q, d)
+            k: Number of results per query
+            distance_measure: Metric function or name, or a custom pairwise callable
+            rows: Optional sorted candidate row ids from a metadata filter
+
+        Returns:
+            One (row ids, scores) pair per query, best first
+        """
+        metric_name = get_metric_name(distance_measure)
+        if metric_name is None:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+        if self._needs_training(store):
+            self.train(store)
+        elif not self.is_trained:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+
+        n_rows = len(store)
+        nprobe = min(self.nprobe, self.n_lists)
+        # A selective filter leaves fewer candidates than the probed cells
+        # would hold on average: scoring them exactly is cheaper and exact
+        if rows is not None and len(rows) <= n_rows * nprobe / self.n_lists:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(n_rows, dtype=bool)
+            allowed[rows] = True
+
+        queries = np.asarray(queries, dtype=np.float32)
+        probe_queries = _unit_rows(queries) if self.spherical else queries
+        probe_metric = 'dot' if self.spherical else 'euclidean'
+        centroid_scores = get_metric(probe_metric, batch=True)(probe_queries, self.centroids)
+        probes = top_k_indices(centroid_scores, nprobe)
+
+        list_rows, offsets = self._lists(n_rows)
+        results: List[SearchResult] = []
+        for query, cells in zip(queries, probes):
+            candidates = np.concatenate([list_rows[offsets[cell]:offsets[cell + 1]] for cell in cells])
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            if len(candidates) == 0:
+                results.append((np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)))
+                continue
+            scores = score_rows(store, query[None, :], candidates, metric_name)[0]
+            top = top_k_indices(scores, k)
+            results.append((candidates[top], scores[top]))
+        return results
+
+    def prepare(self, store: VectorStore) -> None:
+        """Train once there are enough vectors and group cells, as ``search`` would, so that it only reads."""
+        if self._needs_training(store):
+            self.train(store)
+        if self.is_trained:
+            self._lists(len(store))
+
+    def compact(self, store: VectorStore, keep: np.ndarray) -> None:
+        """
+        Remap cell assignments after the store dropped its tombstoned rows.
+
+        Args:
+            store: The compacted store
+            keep: Old row id of each surviving row (new row ``i`` was ``keep[i]``)
+        """
+        if self.is_trained:
+            self._assignments = self._assignments[keep]
+            self._list_rows = None
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, used to persist the index configuration."""
+        return {
+            'n_lists': self.n_lists,
+            'nprobe': self.nprobe,
+            'metric': self.metric,
+            'n_iter': self.n_iter,
+            'train_size_per_list': self.train_size_per_list,
+            'retrain_growth': self.retrain_growth,
+            'seed': self.seed,
+        }
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to restore the index without retraining it."""
+        if not self.is_trained:
+            return {}
+        return {
+            'centroids': self.centroids,
+            'assignments': self._assignments,
+            'trained_rows': np.asarray(self._trained_rows),
+        }
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays produced by ``get_state``."""
+        if 'centroids' in state:
+            self.centroids = np.asarray(state['centroids'], dtype=np.float32)
+            self._assignments = np.array(state['assignments'], dtype=np.int32)
+            self._list_rows = None
+            # Saves without the count were trained on at most the rows they hold
+            self._trained_rows = int(state.get('trained_rows', len(self._assignments)))
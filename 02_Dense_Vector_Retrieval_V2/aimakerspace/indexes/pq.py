@@ -0,0 +1,500 @@
+"""
+Product-quantization (PQ) search index.
+
+Each vector is split into ``n_subvectors`` equal sub-vectors and every
+sub-vector is replaced by the id of its nearest centroid in a per-subspace
+codebook of ``n_centroids`` entries (k-means on a sample of the store). With
+256 centroids a vector costs one byte per sub-vector, e.g. 32 bytes for a
+1536-d float32 embedding (6 KB) at ``n_subvectors=32``.
+
+Search uses asymmetric distance computation (ADC): the query stays exact and
+is compared with every codebook entry once, giving a per-query lookup table
+of shape (n_subvectors, n_centroids). The approximate inner product with a
+stored vector is then a sum of ``n_subvectors`` table lookups.
+
+With ``n_lists > 0`` the index is an IVF-PQ: a coarse k-means quantizer
+partitions the corpus (as in IVFIndex), PQ encodes each vector's residual
+from its cell centroid, and only the ``nprobe`` closest cells are scanned.
+"""
+
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from aimakerspace.distance_metrics import get_metric, get_metric_name
+from aimakerspace.indexes.flat import SearchResult, exact_top_k, score_block, score_rows
+from aimakerspace.indexes.ivf import _unit_rows, kmeans, nearest_centroids
+from aimakerspace.indexes.quantized import chunked_top_k, inner_product_scores
+from aimakerspace.topk import top_k_indices
+from aimakerspace.vector_store import VectorStore
+
+# Rows processed per chunk when encoding vectors
+_ENCODE_CHUNK = 16384
+
+
+class ProductQuantizer:
+    """
+    Splits vectors into sub-vectors and encodes each with its own k-means codebook.
+
+    Codes are uint8 (so ``n_centroids <= 256``) and kept subvector-major,
+    shape (n_subvectors, N): each ADC lookup then reads one contiguous column.
+    """
+
+    def __init__(self, n_subvectors: int = 32, n_centroids: int = 256):
+        """
+        Args:
+            n_subvectors: Number of sub-vectors (bytes per encoded vector)
+            n_centroids: Codebook size per sub-vector, at most 256
+        """
+        if not 1 <= n_centroids <= 256:
+            raise ValueError(f"n_centroids must be between 1 and 256, got {n_centroids}.")
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def _subvectors(self, vectors: np.ndarray) -> np.ndarray:
+        """View vectors of shape (N, d) as (N, n_subvectors, d / n_subvectors)."""
+        n_rows, dimension = vectors.shape
+        if dimension % self.n_subvectors:
+            raise ValueError(
+                f"Dimension {dimension} is not divisible by n_subvectors={self.n_subvectors}."
+            )
+        return vectors.reshape(n_rows, self.n_subvectors, dimension // self.n_subvectors)
+
+    def train(self, vectors: np.ndarray, n_iter: int = 20, seed: int = 0) -> None:
+        """
+        Learn one codebook per subspace.
+
+        Args:
+            vectors: Training vectors of shape (N, d), N >= n_centroids
+            n_iter: k-means iterations per codebook
+            seed: Random seed for training
+        """
+        subvectors = self._subvectors(np.asarray(vectors, dtype=np.float32))
+        self.codebooks = np.stack([
+            kmeans(
+                np.ascontiguousarray(subvectors[:, j]),
+                self.n_centroids,
+                n_iter,
+                spherical=False,
+                seed=seed + j,
+            )
+            for j in range(self.n_subvectors)
+        ])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Encode vectors of shape (N, d) to codes of shape (n_subvectors, N)."""
+        subvectors = self._subvectors(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((self.n_subvectors, len(subvectors)), dtype=np.uint8)
+        for j in range(self.n_subvectors):
+            codes[j] = nearest_centroids(subvectors[:, j], self.codebooks[j], spherical=False)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Reconstruct approximate vectors of shape (N, d) from codes of shape (n_subvectors, N)."""
+        parts = [self.codebooks[j][codes[j]] for j in range(self.n_subvectors)]
+        return np.concatenate(parts, axis=1)
+
+    def inner_product_tables(self, queries: np.ndarray) -> np.ndarray:
+        """Per-query ADC tables of shape (Q, n_subvectors, n_centroids)."""
+        return np.einsum("qmd,mkd->qmk", self._subvectors(queries), self.codebooks)
+
+    def lookup(self, table: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """
+        Approximate inner products of one query with encoded vectors.
+
+        Args:
+            table: ADC table of one query, shape (n_subvectors, n_centroids)
+            codes: Codes of shape (n_subvectors, N)
+
+        Returns:
+            np.ndarray: Inner products of shape (N,)
+        """
+        inner = np.zeros(codes.shape[1], dtype=np.float32)
+        for j in range(self.n_subvectors):
+            inner += table[j].take(codes[j])
+        return inner
+
+
+class PQIndex:
+    """
+    Scores candidate rows by asymmetric distance against product-quantized codes.
+
+    Cosine, dot and Euclidean are computed from ADC inner products plus the
+    exact row norms cached by the store; Manhattan decodes the candidates.
+    The index trains itself on the first search once the store has enough
+    rows (or explicitly via ``train``); until then search is exact. Custom
+    callables fall back to exact search. Codebooks and cells fitted on a
+    small store describe later rows poorly, so the index retrains once the
+    store has grown ``retrain_growth`` times past the rows it was trained
+    on, until a training run could sample the full ``train_size``.
+
+    Optionally the best ``k * rescore_factor`` candidates are re-scored with
+    the float32 store; leave ``rescore`` off when the float32 matrix should
+    stay cold (e.g. memory-mapped on an archive disk).
+    """
+
+    name = 'pq'
+
+    def __init__(
+        self,
+        n_subvectors: int = 32,
+        n_centroids: int = 256,
+        n_lists: int = 0,
+        nprobe: int = 8,
+        metric: str = 'cosine',
+        rescore: bool = False,
+        rescore_factor: int = 4,
+        n_iter: int = 20,
+        train_size: int = 65536,
+        retrain_growth: Optional[float] = 2.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            n_subvectors: Number of sub-vectors, i.e. bytes per encoded vector
+            n_centroids: Codebook size per sub-vector, at most 256
+            n_lists: Number of coarse k-means cells (0 scans every row, no coarse index)
+            nprobe: Number of closest coarse cells scanned per query
+            metric: Metric name the coarse cells are tuned for (as in IVFIndex)
+            rescore: If True, re-score the best candidates with the exact float32 vectors
+            rescore_factor: Candidates re-scored per result (k * rescore_factor)
+            n_iter: k-means iterations during training
+            train_size: Maximum number of rows sampled for training
+            retrain_growth: Retrain once the store holds this many times the rows
+                            seen by the last training (None never retrains)
+            seed: Random seed for training
+        """
+        get_metric(metric)
+        self.quantizer = ProductQuantizer(n_subvectors, n_centroids)
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.metric = metric
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.n_iter = n_iter
+        self.train_size = train_size
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        # Store rows when the codebooks were last trained
+        self._trained_rows = 0
+        self._codes: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._list_rows: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+
+    @property
+    def spherical(self) -> bool:
+        return self.metric in ('cosine', 'dot')
+
+    @property
+    def is_trained(self) -> bool:
+        return self.quantizer.is_trained
+
+    @property
+    def min_train_size(self) -> int:
+        return max(self.n_centroids, self.n_lists)
+
+    @property
+    def codes(self) -> Optional[np.ndarray]:
+        """Codes of the populated rows, shape (n_subvectors, N) (no copy)."""
+        return None if self._codes is None else self._codes[:, : self._size]
+
+    def _needs_training(self, store: VectorStore) -> bool:
+        """Whether the codebooks are missing (and trainable) or stale."""
+        if len(store) < self.min_train_size:
+            return False
+        if not self.is_trained:
+            return True
+        return (
+            self.retrain_growth is not None
+            and self._trained_rows < max(self.train_size, self.min_train_size)
+            and len(store) >= self.retrain_growth * self._trained_rows
+        )
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        """Coarse cell of each vector."""
+        return nearest_centroids(
+            _unit_rows(vectors) if self.spherical else vectors, self.centroids, self.spherical
+        )
+
+    def train(self, store: VectorStore) -> None:
+        """
+        Train the coarse cells (if any) and codebooks on a sample, then encode every row.
+
+        Args:
+            store: The vector store to index
+        """
+        n_rows = len(store)
+        if n_rows < self.min_train_size:
+            raise ValueError(
+                f"PQ training needs at least {self.min_train_size} vectors, got {n_rows}."
+            )
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(n_rows, max(self.train_size, self.min_train_size))
+        sample = store.matrix[np.sort(rng.choice(n_rows, sample_size, replace=False))]
+        if self.n_lists:
+            self.centroids = kmeans(sample, self.n_lists, self.n_iter, self.spherical, self.seed)
+            sample = sample - self.centroids[self._assign(sample)]
+        self.quantizer.train(sample, self.n_iter, self.seed)
+        self._trained_rows = n_rows
+        self._codes = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self.add(store, store.all_rows)
+
+    def add(self, store: VectorStore, rows: np.ndarray) -> None:
+        """
+        Encode (new or overwritten) rows, assigning them to a coarse cell first.
+
+        Args:
+            store: The vector store the rows live in
+            rows: Row ids to (re)encode
+        """
+        if not self.is_trained or len(rows) == 0:
+            return
+        n_rows = len(store)
+        if self._codes is None or self._codes.shape[1] < n_rows:
+            capacity = max(n_rows, 2 * (0 if self._codes is None else self._codes.shape[1]))
+            grown = np.zeros((self.n_subvectors, capacity), dtype=np.uint8)
+            grown_assignments = np.full(capacity, -1, dtype=np.int32)
+            if self._codes is not None:
+                grown[:, : self._size] = self._codes[:, : self._size]
+                grown_assignments[: self._size] = self._assignments[: self._size]
+            self._codes = grown
+            self._assignments = grown_assignments
+        for start in range(0, len(rows), _ENCODE_CHUNK):
+            chunk = rows[start:start + _ENCODE_CHUNK]
+            vectors = store.matrix[chunk]
+            if self.n_lists:
+                cells = self._assign(vectors)
+                self._assignments[chunk] = cells
+                vectors = vectors - self.centroids[cells]
+            self._codes[:, chunk] = self.quantizer.encode(vectors)
+        self._size = max(self._size, n_rows)
+        self._list_rows = None
+
+    def _lists(self, n_rows: int):
+        """Per-cell row arrays in CSR form (rows grouped by cell + offsets), rebuilt when stale."""
+        if self._list_rows is None:
+            assignments = self._assignments[:n_rows]
+            assigned = np.flatnonzero(assignments >= 0)
+            order = np.argsort(assignments[assigned], kind="stable")
+            self._list_rows = assigned[order]
+            counts = np.bincount(assignments[assigned], minlength=self.n_lists)
+            self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+        return self._list_rows, self._list_offsets
+
+    def _code_scores(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        rows: np.ndarray,
+        codes: np.ndarray,
+        metric_name: str,
+        base: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Score a (Q, d) query block against the codes of some rows.
+
+        ``base`` holds the exact inner products of the queries with the
+        coarse centroid of each row (IVF-PQ), shape (Q, len(rows)).
+        """
+        if metric_name == 'manhattan':
+            decoded = self.quantizer.decode(codes)
+            if self.n_lists:
+                decoded += self.centroids[self._assignments[rows]]
+            return score_block(queries, decoded, metric_name)
+        tables = self.quantizer.inner_product_tables(queries)
+        inner = np.stack([self.quantizer.lookup(table, codes) for table in tables])
+        if base is not None:
+            inner += base
+        return inner_product_scores(inner, queries, metric_name, store.norms[rows], store.normalize)
+
+    def _scan_all(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        fetch: int,
+        metric_name: str,
+        rows: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top ``fetch`` rows per query by ADC over every candidate (no coarse index)."""
+        # Unfiltered search reads the codes as contiguous slices, not gathers
+        contiguous = rows is store.all_rows
+
+        def score_chunk(query_block: np.ndarray, offset: int, selected: np.ndarray) -> np.ndarray:
+            codes = self._codes[:, offset:offset + len(selected)] if contiguous else self._codes[:, selected]
+            return self._code_scores(store, query_block, selected, codes, metric_name)
+
+        return chunked_top_k(queries, rows, fetch, score_chunk)
+
+    def _scan_cells(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        fetch: int,
+        metric_name: str,
+        rows: Optional[np.ndarray],
+    ) -> List[SearchResult]:
+        """Top ``fetch`` rows per query by ADC over the ``nprobe`` closest coarse cells."""
+        n_rows = len(store)
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(n_rows, dtype=bool)
+            allowed[rows] = True
+
+        nprobe = min(self.nprobe, self.n_lists)
+        probe_queries = _unit_rows(queries) if self.spherical else queries
+        probe_metric = 'dot' if self.spherical else 'euclidean'
+        probes = top_k_indices(get_metric(probe_metric, batch=True)(probe_queries, self.centroids), nprobe)
+        # Residual codes: q.x = q.centroid + q.residual
+        centroid_inner = queries @ self.centroids.T
+
+        list_rows, offsets = self._lists(n_rows)
+        results: List[SearchResult] = []
+        for i, cells in enumerate(probes):
+            candidates = np.concatenate([list_rows[offsets[cell]:offsets[cell + 1]] for cell in cells])
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            if len(candidates) == 0:
+                results.append((np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)))
+                continue
+            base = centroid_inner[i, self._assignments[candidates]][None, :]
+            scores = self._code_scores(
+                store, queries[i:i + 1], candidates, self._codes[:, candidates], metric_name, base
+            )[0]
+            top = top_k_indices(scores, fetch)
+            results.append((candidates[top], scores[top]))
+        return results
+
+    def search(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        k: int,
+        distance_measure: Union[str, Callable],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """
+        Approximate search by ADC, optionally re-scoring the best candidates exactly.
+
+        Args:
+            store: The vector store to search
+            queries: Query block of shape (Q, d)
+            k: Number of results per query
+            distance_measure: Metric function or name, or a custom pairwise callable
+            rows: Optional sorted candidate row ids from a metadata filter
+
+        Returns:
+            One (row ids, scores) pair per query, best first
+        """
+        metric_name = get_metric_name(distance_measure)
+        if metric_name is None:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+        if self._needs_training(store):
+            self.train(store)
+        elif not self.is_trained:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+        elif self._size < len(store):
+            self.add(store, np.arange(self._size, len(store), dtype=np.intp))
+
+        n_rows = len(store)
+        fetch = k * self.rescore_factor if self.rescore else k
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.n_lists:
+            # A selective filter leaves fewer candidates than the probed cells
+            # would hold on average: scoring them exactly is cheaper and exact
+            if rows is not None and len(rows) <= n_rows * min(self.nprobe, self.n_lists) / self.n_lists:
+                return exact_top_k(store, queries, k, distance_measure, rows)
+            candidates = self._scan_cells(store, queries, fetch, metric_name, rows)
+        else:
+            if rows is None:
+                rows = store.all_rows
+            if len(rows) == 0:
+                return [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)) for _ in queries]
+            candidates = list(zip(*self._scan_all(store, queries, fetch, metric_name, rows)))
+        if not self.rescore:
+            return candidates
+
+        results: List[SearchResult] = []
+        for query, (candidate_rows, _) in zip(queries, candidates):
+            scores = score_rows(store, query[None, :], candidate_rows, metric_name)[0]
+            top = top_k_indices(scores, k)
+            results.append((candidate_rows[top], scores[top]))
+        return results
+
+    def prepare(self, store: VectorStore) -> None:
+        """Train or encode pending rows, and group cells, as ``search`` would, so that it only reads."""
+        if self._needs_training(store):
+            self.train(store)
+        elif self.is_trained and self._size < len(store):
+            self.add(store, np.arange(self._size, len(store), dtype=np.intp))
+        if self.is_trained and self.n_lists:
+            self._lists(len(store))
+
+    def compact(self, store: VectorStore, keep: np.ndarray) -> None:
+        """
+        Drop the codes and cells of tombstoned rows after the store compacted.
+
+        Args:
+            store: The compacted store
+            keep: Old row id of each surviving row (new row ``i`` was ``keep[i]``)
+        """
+        if self._codes is not None:
+            self._codes = np.ascontiguousarray(self._codes[:, keep])
+            self._assignments = self._assignments[keep]
+            self._size = len(keep)
+            self._list_rows = None
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, used to persist the index configuration."""
+        return {
+            'n_subvectors': self.n_subvectors,
+            'n_centroids': self.n_centroids,
+            'n_lists': self.n_lists,
+            'nprobe': self.nprobe,
+            'metric': self.metric,
+            'rescore': self.rescore,
+            'rescore_factor': self.rescore_factor,
+            'n_iter': self.n_iter,
+            'train_size': self.train_size,
+            'retrain_growth': self.retrain_growth,
+            'seed': self.seed,
+        }
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Codebooks, codes and coarse cells, so loading does not retrain or re-encode."""
+        if not self.is_trained:
+            return {}
+        state = {
+            'codebooks': self.quantizer.codebooks,
+            'codes': self.codes,
+            'trained_rows': np.asarray(self._trained_rows),
+        }
+        if self.n_lists:
+            state['centroids'] = self.centroids
+            state['assignments'] = self._assignments[: self._size]
+        return state
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays produced by ``get_state``."""
+        if 'codebooks' not in state:
+            return
+        self.quantizer.codebooks = np.asarray(state['codebooks'], dtype=np.float32)
+        self._codes = np.array(state['codes'], dtype=np.uint8)
+        self._size = self._codes.shape[1]
+        # Saves without the count were trained on at most the rows they hold
+        self._trained_rows = int(state.get('trained_rows', self._size))
+        if 'centroids' in state:
+            self.centroids = np.asarray(state['centroids'], dtype=np.float32)
+            self._assignments = np.array(state['assignments'], dtype=np.int32)
+        else:
+            self._assignments = np.full(self._size, -1, dtype=np.int32)
+        self._list_rows = None
@@ -0,0 +1,392 @@
+"""
+Scalar-quantized search index.
+
+Each vector is stored a second time as per-dimension int8 codes (1 byte per
+dimension, 4x smaller than the float32 store). Queries are scored against
+the codes without decoding them, then the best
+``k * rescore_factor`` candidates are optionally re-scored exactly against the
+float32 store.
+
+The codes are kept in addition to the float32 store, not instead of it: an
+in-memory database holds both, so the index saves scoring bandwidth but no
+RAM. The memory saving only materializes with
+``VectorDatabase.load(..., mmap=True)``, where the float32 matrix stays on
+disk (and is paged in only for re-scoring) while the codes live in RAM.
+
+float16 codes are not offered: NumPy has no fast half-precision product, so
+every chunk would have to be cast back to float32 first, which made float16
+scoring about 7x slower than plain float32 search (see BENCHMARKS.md).
+"""
+
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from aimakerspace.distance_metrics import get_metric_name
+from aimakerspace.indexes.flat import MAX_SCORE_BLOCK, SearchResult, exact_top_k, score_block, score_rows
+from aimakerspace.topk import top_k_indices
+from aimakerspace.vector_store import VectorStore
+
+# Rows scored per chunk: small enough that the float32 cast of the codes stays
+# cache-resident instead of streaming a fresh buffer through memory
+_SCORE_CHUNK = 16384
+
+_CODE_DTYPES = {'int8': np.int8}
+
+
+def inner_product_scores(
+    inner: np.ndarray,
+    queries: np.ndarray,
+    metric_name: str,
+    norms: np.ndarray,
+    normalized: bool,
+) -> np.ndarray:
+    """
+    Turn approximate (Q, N) inner products into scores for an inner-product metric.
+
+    Cosine and Euclidean only approximate the inner product: the row norms
+    are the exact ones cached by the store.
+
+    Args:
+        inner: Approximate inner products of shape (Q, N)
+        queries: Query block of shape (Q, d)
+        metric_name: 'cosine', 'dot' or 'euclidean'
+        norms: Cached L2 norms of the N rows
+        normalized: Whether the store holds unit vectors
+
+    Returns:
+        np.ndarray: Scores of shape (Q, N), higher is more similar
+    """
+    if metric_name == 'dot':
+        return inner
+    query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+    if metric_name == 'cosine':
+        denominator = query_norms if normalized else query_norms * norms
+        return np.divide(inner, denominator, out=np.zeros_like(inner), where=denominator > 0)
+    # ||x||^2 is 1 (or 0) for every stored row in normalize mode
+    row_sq = norms if normalized else norms * norms
+    return -np.sqrt(np.maximum(row_sq - 2 * inner + query_norms * query_norms, 0))
+
+
+def chunked_top_k(
+    queries: np.ndarray,
+    rows: np.ndarray,
+    fetch: int,
+    score_chunk: Callable[[np.ndarray, int, np.ndarray], np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top ``fetch`` rows per query, scoring the candidates chunk by chunk.
+
+    Args:
+        queries: Query block of shape (Q, d)
+        rows: Candidate row ids
+        fetch: Number of rows to keep per query
+        score_chunk: ``(query_block, offset, selected_rows) -> (q, len(selected_rows))``
+                     scores, where ``selected_rows == rows[offset:offset + len(selected_rows)]``
+
+    Returns:
+        (row ids, scores) arrays of shape (Q, min(fetch, len(rows))), best first
+    """
+    step = max(1, MAX_SCORE_BLOCK // max(1, min(len(rows), _SCORE_CHUNK)))
+    all_rows, all_scores = [], []
+    for start in range(0, len(queries), step):
+        query_block = queries[start:start + step]
+        chunk_rows, chunk_scores = [], []
+        for offset in range(0, len(rows), _SCORE_CHUNK):
+            selected = rows[offset:offset + _SCORE_CHUNK]
+            block = score_chunk(query_block, offset, selected)
+            top = top_k_indices(block, fetch)
+            chunk_rows.append(selected[top])
+            chunk_scores.append(np.take_along_axis(block, top, axis=1))
+        merged_rows = np.concatenate(chunk_rows, axis=1)
+        merged_scores = np.concatenate(chunk_scores, axis=1)
+        top = top_k_indices(merged_scores, fetch)
+        all_rows.append(np.take_along_axis(merged_rows, top, axis=1))
+        all_scores.append(np.take_along_axis(merged_scores, top, axis=1))
+    return np.concatenate(all_rows), np.concatenate(all_scores)
+
+
+class ScalarQuantizer:
+    """
+    Per-dimension scalar quantizer.
+
+    Maps each dimension's [min, max] range, learned by ``train``, onto 256
+    int8 levels; values outside the trained range are clipped.
+    """
+
+    def __init__(self, dtype: str = 'int8'):
+        """
+        Args:
+            dtype: Code type (only 'int8')
+        """
+        if dtype == 'float16':
+            raise ValueError(
+                "float16 codes are no longer supported: scoring them needs a float32 cast "
+                "that is slower than exact search. Use dtype='int8'."
+            )
+        if dtype not in _CODE_DTYPES:
+            raise ValueError(
+                f"Unknown quantization dtype '{dtype}'. Available: {list(_CODE_DTYPES.keys())}"
+            )
+        self.dtype = dtype
+        self.minimum: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def code_dtype(self) -> type:
+        return _CODE_DTYPES[self.dtype]
+
+    @property
+    def is_trained(self) -> bool:
+        return self.minimum is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        """
+        Learn the per-dimension value range.
+
+        Args:
+            vectors: Training vectors of shape (N, d), N >= 1
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.minimum = vectors.min(axis=0)
+        scale = (vectors.max(axis=0) - self.minimum) / 255
+        self.scale = np.where(scale > 0, scale, 1).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantize vectors of shape (N, d) to codes."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        levels = np.rint((vectors - self.minimum) / self.scale) - 128
+        return np.clip(levels, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Reconstruct approximate float32 vectors from codes."""
+        return (codes.astype(np.float32) + 128) * self.scale + self.minimum
+
+
+class ScalarQuantizedIndex:
+    """
+    Scores every candidate row against its scalar-quantized codes.
+
+    Cosine uses the exact row norms cached by the store, so only the dot
+    product is approximated. The int8 quantizer trains itself on the first
+    search (or explicitly via ``train``). Custom callables fall back to exact
+    search.
+
+    Ranges learned on a small store clip the rows added later, so the int8
+    quantizer retrains whenever the store has grown ``retrain_growth`` times
+    past the rows it was trained on, until a training run could sample the
+    full ``train_size``. Doubling keeps the re-encoding cost amortized.
+    """
+
+    name = 'sq'
+
+    def __init__(
+        self,
+        dtype: str = 'int8',
+        rescore: bool = True,
+        rescore_factor: int = 4,
+        train_size: int = 65536,
+        retrain_growth: Optional[float] = 2.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            dtype: Code type (only 'int8')
+            rescore: If True, re-score the best candidates with the exact float32 vectors
+            rescore_factor: Candidates re-scored per result (k * rescore_factor)
+            train_size: Maximum number of rows sampled to learn the int8 ranges
+            retrain_growth: Retrain once the store holds this many times the rows
+                            seen by the last training (None never retrains)
+            seed: Random seed for the training sample
+        """
+        self.quantizer = ScalarQuantizer(dtype)
+        self.dtype = dtype
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.train_size = train_size
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self._codes: Optional[np.ndarray] = None
+        self._size = 0
+        # Store rows when the quantizer was last trained
+        self._trained_rows = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.quantizer.is_trained
+
+    @property
+    def codes(self) -> Optional[np.ndarray]:
+        """Codes of the populated rows (no copy)."""
+        return None if self._codes is None else self._codes[: self._size]
+
+    def _needs_training(self, store: VectorStore) -> bool:
+        """Whether rows are missing from the codes or the int8 ranges are stale."""
+        if len(store) == 0:
+            return False
+        if not self.is_trained or self._size < len(store):
+            return True
+        return (
+            self.retrain_growth is not None
+            and self._trained_rows < self.train_size
+            and len(store) >= self.retrain_growth * self._trained_rows
+        )
+
+    def train(self, store: VectorStore) -> None:
+        """
+        Learn the quantizer ranges on a sample of the store and encode every row.
+
+        Args:
+            store: The vector store to index
+        """
+        if len(store) == 0:
+            raise ValueError("Scalar quantizer training needs at least one vector.")
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(store), self.train_size)
+        sample = np.sort(rng.choice(len(store), sample_size, replace=False))
+        self.quantizer.train(store.matrix[sample])
+        self._trained_rows = len(store)
+        self._codes = None
+        self._size = 0
+        self.add(store, store.all_rows)
+
+    def add(self, store: VectorStore, rows: np.ndarray) -> None:
+        """
+        Encode (new or overwritten) rows.
+
+        Args:
+            store: The vector store the rows live in
+            rows: Row ids to (re)encode
+        """
+        if not self.is_trained or len(rows) == 0:
+            return
+        n_rows = len(store)
+        if self._codes is None or len(self._codes) < n_rows:
+            capacity = max(n_rows, 2 * (0 if self._codes is None else len(self._codes)))
+            grown = np.zeros((capacity, store.dimension), dtype=self.quantizer.code_dtype)
+            if self._codes is not None:
+                grown[: self._size] = self._codes[: self._size]
+            self._codes = grown
+        self._codes[rows] = self.quantizer.encode(store.matrix[rows])
+        self._size = max(self._size, n_rows)
+
+    def _code_scores(
+        self,
+        queries: np.ndarray,
+        codes: np.ndarray,
+        metric_name: str,
+        norms: np.ndarray,
+        normalized: bool,
+    ) -> np.ndarray:
+        """
+        Score a (Q, d) query block against a chunk of codes.
+
+        Inner products are taken against the codes directly: the int8 decode
+        is affine, so it is folded into the query instead of materializing
+        decoded rows.
+        """
+        if metric_name == 'manhattan':
+            return score_block(queries, self.quantizer.decode(codes), metric_name)
+        scaled = queries * self.quantizer.scale
+        offset = 128 * scaled.sum(axis=1) + queries @ self.quantizer.minimum
+        inner = codes.astype(np.float32) @ scaled.T + offset
+        return inner_product_scores(inner.T, queries, metric_name, norms, normalized)
+
+    def search(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        k: int,
+        distance_measure: Union[str, Callable],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """
+        Score candidates on the codes, then optionally re-score the best exactly.
+
+        Args:
+            store: The vector store to search
+            queries: Query block of shape (Q, d)
+            k: Number of results per query
+            distance_measure: Metric function or name, or a custom pairwise callable
+            rows: Optional sorted candidate row ids from a metadata filter
+
+        Returns:
+            One (row ids, scores) pair per query, best first
+        """
+        metric_name = get_metric_name(distance_measure)
+        if metric_name is None or len(store) == 0:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+        if self._needs_training(store):
+            self.train(store)
+        if rows is None:
+            rows = store.all_rows
+        if len(rows) == 0:
+            return [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)) for _ in queries]
+
+        queries = np.asarray(queries, dtype=np.float32)
+        fetch = k * self.rescore_factor if self.rescore else k
+        # Unfiltered search reads the codes as contiguous slices, not gathers
+        contiguous = rows is store.all_rows
+
+        def score_chunk(query_block: np.ndarray, offset: int, selected: np.ndarray) -> np.ndarray:
+            codes = self._codes[offset:offset + len(selected)] if contiguous else self._codes[selected]
+            return self._code_scores(query_block, codes, metric_name, store.norms[selected], store.normalize)
+
+        candidate_rows, candidate_scores = chunked_top_k(queries, rows, fetch, score_chunk)
+        if not self.rescore:
+            return list(zip(candidate_rows, candidate_scores))
+
+        results: List[SearchResult] = []
+        for query, candidates in zip(queries, candidate_rows):
+            scores = score_rows(store, query[None, :], candidates, metric_name)[0]
+            top = top_k_indices(scores, k)
+            results.append((candidates[top], scores[top]))
+        return results
+
+    def prepare(self, store: VectorStore) -> None:
+        """(Re)train on the current vectors if ``search`` would, so that it only reads."""
+        if self._needs_training(store):
+            self.train(store)
+
+    def compact(self, store: VectorStore, keep: np.ndarray) -> None:
+        """
+        Drop the codes of tombstoned rows after the store compacted.
+
+        Args:
+            store: The compacted store
+            keep: Old row id of each surviving row (new row ``i`` was ``keep[i]``)
+        """
+        if self._codes is not None:
+            self._codes = self._codes[keep]
+            self._size = len(keep)
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, used to persist the index configuration."""
+        return {
+            'dtype': self.dtype,
+            'rescore': self.rescore,
+            'rescore_factor': self.rescore_factor,
+            'train_size': self.train_size,
+            'retrain_growth': self.retrain_growth,
+            'seed': self.seed,
+        }
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """Codes and quantizer ranges, so loading does not re-encode the corpus."""
+        if self._codes is None:
+            return {}
+        state = {'codes': self.codes, 'trained_rows': np.asarray(self._trained_rows)}
+        if self.quantizer.minimum is not None:
+            state['minimum'] = self.quantizer.minimum
+            state['scale'] = self.quantizer.scale
+        return state
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays produced by ``get_state``."""
+        if 'codes' not in state:
+            return
+        if 'minimum' in state:
+            self.quantizer.minimum = np.asarray(state['minimum'], dtype=np.float32)
+            self.quantizer.scale = np.asarray(state['scale'], dtype=np.float32)
+        self._codes = np.array(state['codes'], dtype=self.quantizer.code_dtype)
+        self._size = len(self._codes)
+        # Saves without the count were trained on at most the rows they hold
+        self._trained_rows = int(state.get('trained_rows', self._size))
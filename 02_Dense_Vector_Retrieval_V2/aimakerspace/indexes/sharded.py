@@ -0,0 +1,311 @@
+"""
+Multi-process sharded exact search.
+
+The vector matrix is split into contiguous row ranges (shards), one per
+worker process. Workers memory-map the matrix file read-only, so all of
+them share a single page-cached copy, score only their own rows, and send
+back a per-shard top-k that the caller merges. Results are identical to
+FlatIndex; the work of one query is spread across cores.
+
+The matrix file is the store's own ``vectors.npy`` when the database was
+loaded with ``mmap=True`` and not modified since. Otherwise the index keeps
+its own raw float32 snapshot on disk: written once in full (atomically,
+under a unique name), then patched with the changed and appended rows the
+first time it searches after a write.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from aimakerspace.distance_metrics import get_metric_name
+from aimakerspace.indexes.flat import MAX_SCORE_BLOCK, SearchResult, exact_top_k, score_block
+from aimakerspace.topk import top_k_indices
+from aimakerspace.vector_store import VectorStore, atomic_write
+
+# Vector file, norm file and (rows, dimension) of a raw float32 snapshot
+# (None for the store's own .npy files)
+Snapshot = Tuple[str, str, Optional[Tuple[int, int]]]
+
+# Worker-side cache of the memory-mapped snapshot currently in use
+_mapped: Dict[Snapshot, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _open_snapshot(snapshot: Snapshot) -> Tuple[np.ndarray, np.ndarray]:
+    if snapshot not in _mapped:
+        # A new snapshot (or a longer one) replaces the previous mapping
+        _mapped.clear()
+        vectors_path, norms_path, shape = snapshot
+        if shape is None:
+            _mapped[snapshot] = (np.load(vectors_path, mmap_mode="r"), np.load(norms_path, mmap_mode="r"))
+        else:
+            # Shared mappings: rows patched in place are seen without remapping
+            _mapped[snapshot] = (
+                np.memmap(vectors_path, dtype=np.float32, mode="r", shape=shape),
+                np.memmap(norms_path, dtype=np.float32, mode="r", shape=shape[:1]),
+            )
+    return _mapped[snapshot]
+
+
+def _search_shard(task: Tuple) -> List[SearchResult]:
+    """Exact top-k of a query block over one shard (runs in a worker process)."""
+    snapshot, start, stop, queries, k, metric_name, normalized, rows = task
+    matrix, norms = _open_snapshot(snapshot)
+    if rows is None:
+        rows = np.arange(start, stop, dtype=np.intp)
+        shard, shard_norms = matrix[start:stop], norms[start:stop]
+    else:
+        shard, shard_norms = matrix[rows], norms[rows]
+
+    results: List[SearchResult] = []
+    step = max(1, MAX_SCORE_BLOCK // max(1, len(shard)))
+    for offset in range(0, len(queries), step):
+        block = score_block(queries[offset:offset + step], shard, metric_name, shard_norms, normalized)
+        top = top_k_indices(block, k)
+        results.extend(zip(rows[top], np.take_along_axis(block, top, axis=1)))
+    return results
+
+
+def _cleanup(executor: Optional[ProcessPoolExecutor], directory: Optional[str]) -> None:
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if directory is not None:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class ShardedIndex:
+    """
+    Exact search fanned out over worker processes, one contiguous shard each.
+
+    Stores smaller than ``2 * min_rows_per_shard`` rows, and custom callables,
+    are searched in-process exactly like FlatIndex. Call ``close`` to stop the
+    workers early; they are also stopped when the index is garbage collected
+    or the interpreter exits.
+    """
+
+    name = 'sharded'
+
+    def __init__(
+        self,
+        n_workers: Optional[int] = None,
+        min_rows_per_shard: int = 50_000,
+        path: Optional[str] = None,
+    ):
+        """
+        Args:
+            n_workers: Number of worker processes (and at most as many shards).
+                       Defaults to the number of CPUs.
+            min_rows_per_shard: Smallest shard worth a process round-trip
+            path: Directory for matrix snapshots. Defaults to a private temp
+                  directory that is removed on ``close``.
+        """
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.min_rows_per_shard = min_rows_per_shard
+        self.path = path
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._directory: Optional[str] = None
+        self._snapshot: Optional[Snapshot] = None
+        # (id, version) of the store the snapshot reflects, and the rows
+        # written since (one array per store version)
+        self._synced: Optional[Tuple[int, int]] = None
+        self._pending: List[np.ndarray] = []
+        # Concurrent readers may find the snapshot stale at the same time
+        self._snapshot_lock = threading.Lock()
+        self._finalizer = None
+
+    @property
+    def _private_directory(self) -> Optional[str]:
+        """The snapshot directory if the index created it (a user ``path`` is never removed)."""
+        return None if self.path else self._directory
+
+    def _track_resources(self) -> None:
+        """(Re-)register cleanup of the workers and private directory for garbage collection."""
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        self._finalizer = weakref.finalize(self, _cleanup, self._executor, self._private_directory)
+
+    def _workers(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers)
+            self._track_resources()
+        return self._executor
+
+    def _ensure_directory(self) -> str:
+        if self._directory is None:
+            self._directory = self.path or tempfile.mkdtemp(prefix="aimakerspace-shards-")
+            os.makedirs(self._directory, exist_ok=True)
+            self._track_resources()
+        return self._directory
+
+    def _remove_snapshot(self) -> None:
+        if self._snapshot is not None:
+            for stale in self._snapshot[:2]:
+                if os.path.exists(stale):
+                    os.remove(stale)
+        self._snapshot = None
+        self._synced = None
+        self._pending = []
+
+    def _write_snapshot(self, store: VectorStore) -> None:
+        """Write the whole matrix to fresh, uniquely named files."""
+        directory = self._ensure_directory()
+        # A unique name per snapshot: several stores may share ``path``, and
+        # workers may still map an older snapshot
+        token = uuid.uuid4().hex
+        vectors_path = os.path.join(directory, f"vectors-{token}.f32")
+        norms_path = os.path.join(directory, f"norms-{token}.f32")
+        with atomic_write(vectors_path) as f:
+            store.matrix.tofile(f)
+        with atomic_write(norms_path) as f:
+            store.norms.tofile(f)
+        self._remove_snapshot()
+        self._snapshot = (vectors_path, norms_path, (len(store), store.dimension))
+
+    def _patch_snapshot(self, store: VectorStore) -> None:
+        """Rewrite the rows changed since the last sync in place and append the new ones."""
+        vectors_path, norms_path, (synced_rows, dimension) = self._snapshot
+        changed = np.unique(np.concatenate(self._pending)) if self._pending else np.empty(0, dtype=np.intp)
+        changed = changed[changed < synced_rows]
+        runs = np.split(changed, np.flatnonzero(np.diff(changed) != 1) + 1) if len(changed) else []
+        row_bytes = 4 * dimension
+        with open(vectors_path, "r+b") as vectors_file, open(norms_path, "r+b") as norms_file:
+            for run in runs:
+                start, stop = int(run[0]), int(run[-1]) + 1
+                vectors_file.seek(start * row_bytes)
+                vectors_file.write(store.matrix[start:stop].tobytes())
+                norms_file.seek(start * 4)
+                norms_file.write(store.norms[start:stop].tobytes())
+            vectors_file.seek(synced_rows * row_bytes)
+            vectors_file.write(store.matrix[synced_rows:].tobytes())
+            norms_file.seek(synced_rows * 4)
+            norms_file.write(store.norms[synced_rows:].tobytes())
+        self._snapshot = (vectors_path, norms_path, (len(store), dimension))
+
+    def _snapshot_files(self, store: VectorStore) -> Snapshot:
+        """
+        Matrix and norm files reflecting the current store contents.
+
+        The first snapshot is written in full. After that, writes reported
+        through ``add`` are patched into it, so keeping it current costs I/O
+        proportional to the changed rows. Anything the index was not told
+        about (compaction, a replaced store) triggers a full rewrite: every
+        store version bump must be matched by one ``add`` call.
+        """
+        mapped = store.mapped_files
+        if mapped is not None:
+            return mapped[0], mapped[1], None
+        with self._snapshot_lock:
+            key = (id(store), store.version)
+            if self._synced != key:
+                patchable = (
+                    self._snapshot is not None
+                    and self._synced is not None
+                    and self._synced[0] == id(store)
+                    and store.version - self._synced[1] == len(self._pending)
+                    and len(store) >= self._snapshot[2][0]
+                )
+                if patchable:
+                    self._patch_snapshot(store)
+                else:
+                    self._write_snapshot(store)
+                self._synced = key
+                self._pending = []
+            return self._snapshot
+
+    def add(self, store: VectorStore, rows: np.ndarray) -> None:
+        """Remember the changed rows, to patch them into the snapshot on the next search."""
+        if self._snapshot is not None:
+            self._pending.append(np.asarray(rows, dtype=np.intp))
+
+    def search(
+        self,
+        store: VectorStore,
+        queries: np.ndarray,
+        k: int,
+        distance_measure: Union[str, Callable],
+        rows: Optional[np.ndarray] = None,
+    ) -> List[SearchResult]:
+        """
+        Search every shard in parallel and merge the per-shard top-k.
+
+        Args:
+            store: The vector store to search
+            queries: Query block of shape (Q, d)
+            k: Number of results per query
+            distance_measure: Metric function or name, or a custom pairwise callable
+            rows: Optional sorted candidate row ids (all rows if None)
+
+        Returns:
+            One (row ids, scores) pair per query, best first
+        """
+        metric_name = get_metric_name(distance_measure)
+        n_candidates = len(store) if rows is None else len(rows)
+        n_shards = min(self.n_workers, n_candidates // max(1, self.min_rows_per_shard))
+        if metric_name is None or n_shards < 2:
+            return exact_top_k(store, queries, k, distance_measure, rows)
+
+        queries = np.asarray(queries, dtype=np.float32)
+        snapshot = self._snapshot_files(store)
+        bounds = np.linspace(0, len(store), n_shards + 1).astype(np.intp)
+        tasks = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            shard_rows = None
+            if rows is not None:
+                shard_rows = rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+                if len(shard_rows) == 0:
+                    continue
+            tasks.append((
+                snapshot, int(start), int(stop),
+                queries, k, metric_name, store.normalize, shard_rows,
+            ))
+
+        if not tasks:
+            return [(np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)) for _ in queries]
+        shard_results = list(self._workers().map(_search_shard, tasks))
+        results: List[SearchResult] = []
+        for i in range(len(queries)):
+            merged_rows = np.concatenate([shard[i][0] for shard in shard_results])
+            merged_scores = np.concatenate([shard[i][1] for shard in shard_results])
+            top = top_k_indices(merged_scores, k)
+            results.append((merged_rows[top], merged_scores[top]))
+        return results
+
+    def prepare(self, store: VectorStore) -> None:
+        """Write the matrix snapshot and start the workers, if searches will be sharded."""
+        if min(self.n_workers, len(store) // max(1, self.min_rows_per_shard)) >= 2:
+            self._snapshot_files(store)
+            self._workers()
+
+    def compact(self, store: VectorStore, keep: np.ndarray) -> None:
+        """Nothing to remap: the compacted store gets a full snapshot on the next search."""
+
+    def close(self) -> None:
+        """Stop the worker processes and remove the snapshot (and the private directory)."""
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        _cleanup(self._executor, None)
+        self._remove_snapshot()
+        _cleanup(None, self._private_directory)
+        self._executor = None
+        self._directory = None
+        self._finalizer = None
+
+    def get_params(self) -> Dict[str, Any]:
+        """Constructor parameters, used to persist the index configuration."""
+        return {
+            'n_workers': self.n_workers,
+            'min_rows_per_shard': self.min_rows_per_shard,
+            'path': self.path,
+        }
+
+    def get_state(self) -> Dict[str, np.ndarray]:
+        """No arrays to persist: shards are derived from the store."""
+        return {}
+
+    def set_state(self, state: Dict[str, np.ndarray]) -> None:
+        """Restore arrays produced by ``get_state``."""
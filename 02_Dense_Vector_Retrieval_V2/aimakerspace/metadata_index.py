@@ -0,0 +1,189 @@
+"""
+Inverted metadata index for filtered vector search.
+
+For every metadata field the index keeps a ``value -> row ids`` posting list,
+so an equality filter such as ``{'category': 'Sleep'}`` resolves to its
+candidate rows with a dict lookup instead of a scan over every document.
+Range queries use a lazily built sorted view of a field's values.
+"""
+
+import numpy as np
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def value_kind(value: Any) -> Optional[str]:
+    """
+    Classify a metadata value for ordered comparisons.
+
+    Returns:
+        'number' for ints/floats (not bools), 'str' for strings, None otherwise
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return 'number'
+    if isinstance(value, str):
+        return 'str'
+    return None
+
+
+class MetadataIndex:
+    """
+    Per-field inverted index from metadata value to row ids.
+
+    Posting lists are kept as sets for cheap updates and materialized as
+    sorted ``np.intp`` arrays on first lookup; the cached array is dropped
+    whenever its posting list changes. Unhashable metadata values (lists,
+    dicts) are not indexed; such rows can never equal a hashable filter value,
+    so leaving them out does not change filter results.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[Hashable, Set[int]]] = {}
+        self._arrays: Dict[str, Dict[Hashable, np.ndarray]] = {}
+        self._sorted: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def add(self, row: int, metadata: Dict[str, Any]) -> None:
+        """
+        Index the metadata of a row.
+
+        Args:
+            row: Row id
+            metadata: The row's metadata dict
+        """
+        for field, value in metadata.items():
+            if not _is_hashable(value):
+                continue
+            self._postings.setdefault(field, {}).setdefault(value, set()).add(row)
+            self._invalidate(field, value)
+
+    def remove(self, row: int, metadata: Dict[str, Any]) -> None:
+        """
+        Remove a row's metadata from the index.
+
+        Args:
+            row: Row id
+            metadata: The metadata the row was indexed with
+        """
+        for field, value in metadata.items():
+            if not _is_hashable(value):
+                continue
+            values = self._postings.get(field)
+            if values is None or value not in values:
+                continue
+            values[value].discard(row)
+            if not values[value]:
+                del values[value]
+            self._invalidate(field, value)
+
+    def fields(self) -> List[str]:
+        """Names of the fields that currently hold at least one indexed value."""
+        return sorted(field for field, values in self._postings.items() if values)
+
+    def value_counts(self, field: str) -> Dict[Hashable, int]:
+        """
+        Number of rows holding each value of a field.
+
+        Posting lists are updated on every add/remove, so this costs
+        O(distinct values), independent of the number of rows.
+
+        Args:
+            field: Metadata field name
+
+        Returns:
+            Dict mapping each indexed value to its row count
+        """
+        return {value: len(rows) for value, rows in self._postings.get(field, {}).items()}
+
+    def _invalidate(self, field: str, value: Hashable) -> None:
+        self._arrays.get(field, {}).pop(value, None)
+        kind = value_kind(value)
+        if kind is not None:
+            self._sorted.pop((field, kind), None)
+
+    def lookup(self, field: str, value: Any) -> np.ndarray:
+        """
+        Return the sorted row ids whose ``field`` equals ``value``.
+
+        Args:
+            field: Metadata field name
+            value: Hashable value to match
+
+        Returns:
+            np.ndarray: Sorted row ids (empty if nothing matches)
+        """
+        cached = self._arrays.get(field, {}).get(value)
+        if cached is not None:
+            return cached
+        rows = self._postings.get(field, {}).get(value)
+        if not rows:
+            return np.empty(0, dtype=np.intp)
+        array = np.fromiter(rows, dtype=np.intp, count=len(rows))
+        array.sort()
+        self._arrays.setdefault(field, {})[value] = array
+        return array
+
+    def _sorted_field(self, field: str, kind: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Build (or fetch) the sorted view of a field's values of one kind.
+
+        Returns:
+            Tuple of (sorted distinct values, offsets into rows, rows grouped by value)
+        """
+        cached = self._sorted.get((field, kind))
+        if cached is not None:
+            return cached
+        values = sorted(
+            value for value in self._postings.get(field, {}) if value_kind(value) == kind
+        )
+        groups = [self.lookup(field, value) for value in values]
+        offsets = np.zeros(len(values) + 1, dtype=np.intp)
+        np.cumsum([len(group) for group in groups], out=offsets[1:])
+        rows = np.concatenate(groups) if groups else np.empty(0, dtype=np.intp)
+        entry = (np.array(values), offsets, rows)
+        self._sorted[(field, kind)] = entry
+        return entry
+
+    def range_lookup(
+        self,
+        field: str,
+        lower: Any = None,
+        upper: Any = None,
+        include_lower: bool = True,
+        include_upper: bool = True,
+    ) -> np.ndarray:
+        """
+        Return the sorted row ids whose ``field`` lies within a range.
+
+        Only values of the same kind as the bounds (numbers or strings) are
+        considered. At least one bound must be given.
+
+        Args:
+            field: Metadata field name
+            lower: Lower bound, or None for unbounded
+            upper: Upper bound, or None for unbounded
+            include_lower: Whether the lower bound is inclusive
+            include_upper: Whether the upper bound is inclusive
+
+        Returns:
+            np.ndarray: Sorted row ids
+        """
+        kind = value_kind(lower if lower is not None else upper)
+        values, offsets, rows = self._sorted_field(field, kind)
+        start = 0
+        stop = len(values)
+        if lower is not None:
+            start = np.searchsorted(values, lower, side='left' if include_lower else 'right')
+        if upper is not None:
+            stop = np.searchsorted(values, upper, side='right' if include_upper else 'left')
+        if start >= stop:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(rows[offsets[start]:offsets[stop]])
@@ -0,0 +1,71 @@
+"""
+Maximal Marginal Relevance (MMR) re-ranking.
+
+MMR picks results one at a time, trading relevance to the query against
+similarity to the results already picked:
+
+    next = argmax  lambda_mult * sim(query, c) - (1 - lambda_mult) * max_s sim(c, s)
+
+With overlapping chunks, plain similarity order tends to return several
+near-copies of the same passage; MMR spends the same k slots on more
+distinct information. All similarities are cosine similarities computed
+from the stored vectors: one (fetch_k, fetch_k) matrix product, no
+re-embedding.
+"""
+
+import numpy as np
+from typing import Optional
+from aimakerspace.distance_metrics import batch_cosine_similarity
+
+
+def maximal_marginal_relevance(
+    query: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    candidate_norms: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Select k diverse candidates by MMR.
+
+    Args:
+        query: Query vector of shape (d,)
+        candidates: Candidate vectors of shape (N, d), e.g. the top fetch_k hits
+        k: Number of candidates to select (clipped to N)
+        lambda_mult: 1.0 ranks by relevance only, 0.0 by diversity only
+        candidate_norms: Optional cached L2 norms of the candidates
+
+    Returns:
+        np.ndarray: Positions into ``candidates`` in selection order
+    """
+    if not 0.0 <= lambda_mult <= 1.0:
+        raise ValueError(f"lambda_mult must be between 0 and 1, got {lambda_mult}.")
+    candidates = np.asarray(candidates, dtype=np.float32)
+    k = min(k, len(candidates))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if candidate_norms is None:
+        candidate_norms = np.linalg.norm(candidates, axis=1)
+
+    relevance = batch_cosine_similarity(query, candidates, candidate_norms)
+    unit = np.divide(
+        candidates,
+        candidate_norms[:, None],
+        out=np.zeros_like(candidates),
+        where=candidate_norms[:, None] > 0,
+    )
+    redundancy = unit @ unit.T
+
+    selected = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything selected so far
+    max_similarity = redundancy[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+    for _ in range(k - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, redundancy[best], out=max_similarity)
+    return np.array(selected, dtype=np.intp)
@@ -0,0 +1,214 @@
+"""
+Token-aware packing of texts into embedding requests.
+
+The embeddings endpoint limits both each input (8191 tokens for the OpenAI
+embedding models) and the whole request (300k tokens, 2048 inputs). Batching
+by a fixed number of texts either overflows those limits with long chunks
+or wastes requests on short ones. ``plan_batches`` instead fills each
+request greedily up to the token budget, in input order, and deals with
+inputs that are too long on their own according to an ``oversize`` policy:
+
+- ``'truncate'``: keep only the first ``max_tokens_per_input`` tokens
+- ``'split'``: embed consecutive pieces and combine them into one vector,
+  the token-weighted mean of the pieces re-normalized to unit length
+- ``'error'``: raise ValueError
+
+Tokens are counted with tiktoken (a project dependency). If it cannot be
+imported, a warning is issued and every UTF-8 byte is counted as one token:
+byte-level BPE never produces more tokens than bytes, so requests still stay
+within the limits, only packed less tightly (about 4x for English text).
+"""
+
+import warnings
+import numpy as np
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Limits of the OpenAI embeddings endpoint
+MAX_TOKENS_PER_INPUT = 8191
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_INPUTS_PER_REQUEST = 2048
+
+OVERSIZE_POLICIES = ('truncate', 'split', 'error')
+
+# Texts of one request and their total token count
+Batch = Tuple[List[str], int]
+
+
+def _load_encoding(model_name: str) -> Optional[Any]:
+    """The tiktoken encoding of a model, or None if tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCounter:
+    """Counts, truncates and splits texts by the tokens of an embedding model."""
+
+    def __init__(self, model_name: str):
+        """
+        Args:
+            model_name: Embedding model whose tokenizer to use
+        """
+        self.model_name = model_name
+        self.encoding = _load_encoding(model_name)
+        if self.encoding is None:
+            warnings.warn(
+                "tiktoken is not installed; token counts fall back to one token per UTF-8 byte, "
+                "which keeps requests within the limits but packs them less tightly.",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the model's tokenizer rather than an estimate."""
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        """Number of tokens in a text."""
+        if self.encoding is not None:
+            return len(self.encoding.encode_ordinary(text))
+        # Upper bound: every byte-level BPE token covers at least one byte
+        return len(text.encode("utf-8"))
+
+    def count_many(self, texts: Sequence[str]) -> List[int]:
+        """Number of tokens in each of several texts."""
+        if self.encoding is not None:
+            return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(list(texts))]
+        return [self.count(text) for text in texts]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of a text with at most ``max_tokens`` tokens."""
+        if self.encoding is not None:
+            return self.encoding.decode(self.encoding.encode_ordinary(text)[:max_tokens])
+        # A character cut in half at the end is dropped
+        return text.encode("utf-8")[:max_tokens].decode("utf-8", errors="ignore")
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Consecutive pieces of a text with at most ``max_tokens`` tokens each."""
+        if self.encoding is not None:
+            tokens = self.encoding.encode_ordinary(text)
+            return [
+                self.encoding.decode(tokens[start:start + max_tokens])
+                for start in range(0, len(tokens), max_tokens)
+            ]
+        data = text.encode("utf-8")
+        pieces = []
+        start = 0
+        while start < len(data):
+            end = min(start + max_tokens, len(data))
+            # Move the cut back to a character boundary (continuation bytes are 10xxxxxx)
+            while start + 4 < end < len(data) and data[end] & 0xC0 == 0x80:
+                end -= 1
+            pieces.append(data[start:end].decode("utf-8"))
+            start = end
+        return pieces
+
+
+def plan_batches(
+    texts: Sequence[str],
+    counter: TokenCounter,
+    max_tokens_per_input: int = MAX_TOKENS_PER_INPUT,
+    max_tokens_per_request: int = MAX_TOKENS_PER_REQUEST,
+    max_batch_size: int = MAX_INPUTS_PER_REQUEST,
+    oversize: str = 'truncate',
+) -> Tuple[List[Batch], np.ndarray, np.ndarray]:
+    """
+    Pack texts into requests that respect the per-input and per-request limits.
+
+    Args:
+        texts: Texts to embed
+        counter: Token counter of the embedding model
+        max_tokens_per_input: Token limit of a single input
+        max_tokens_per_request: Token limit of a whole request
+        max_batch_size: Most inputs per request
+        oversize: What to do with texts over ``max_tokens_per_input``
+                  ('truncate', 'split' or 'error')
+
+    Returns:
+        Tuple of:
+        - The batches, in order, each with its total token count
+        - Index into ``texts`` of every input sent (the batches, flattened)
+        - Token count of every input sent
+
+    Raises:
+        ValueError: If ``oversize`` is unknown, or is 'error' and a text is too long
+    """
+    if oversize not in OVERSIZE_POLICIES:
+        raise ValueError(f"Unknown oversize policy '{oversize}'. Use one of {OVERSIZE_POLICIES}.")
+    max_tokens_per_input = min(max_tokens_per_input, max_tokens_per_request)
+
+    inputs: List[str] = []
+    owners: List[int] = []
+    counts: List[int] = []
+    for position, (text, count) in enumerate(zip(texts, counter.count_many(texts))):
+        if count <= max_tokens_per_input:
+            pieces, piece_counts = [text], [count]
+        elif oversize == 'error':
+            raise ValueError(
+                f"Text {position} has {count} tokens, over the limit of {max_tokens_per_input}."
+            )
+        elif oversize == 'truncate':
+            pieces = [counter.truncate(text, max_tokens_per_input)]
+            piece_counts = [min(count, max_tokens_per_input)]
+        else:
+            pieces = counter.split(text, max_tokens_per_input)
+            piece_counts = counter.count_many(pieces)
+        inputs.extend(pieces)
+        owners.extend([position] * len(pieces))
+        counts.extend(piece_counts)
+
+    batches: List[Batch] = []
+    batch: List[str] = []
+    batch_tokens = 0
+    for text, count in zip(inputs, counts):
+        if batch and (len(batch) >= max_batch_size or batch_tokens + count > max_tokens_per_request):
+            batches.append((batch, batch_tokens))
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += count
+    if batch:
+        batches.append((batch, batch_tokens))
+    return batches, np.asarray(owners, dtype=np.int64), np.asarray(counts, dtype=np.int64)
+
+
+def combine_pieces(
+    vectors: Sequence[Sequence[float]],
+    owners: np.ndarray,
+    counts: np.ndarray,
+    n_texts: int,
+) -> List[List[float]]:
+    """
+    One vector per text from the vectors of its pieces.
+
+    Texts sent whole keep their vector unchanged; the pieces of a split text
+    are averaged, weighted by their token counts, and re-normalized.
+
+    Args:
+        vectors: Vector of every input sent, in the order of ``plan_batches``
+        owners: Index of the text each input belongs to
+        counts: Token count of each input
+        n_texts: Number of texts planned
+
+    Returns:
+        One vector per text, in order
+    """
+    if len(owners) == n_texts:
+        return list(vectors)
+    matrix = np.asarray(vectors, dtype=np.float64)
+    weights = np.maximum(counts, 1).astype(np.float64)
+    combined = np.zeros((n_texts, matrix.shape[1]))
+    np.add.at(combined, owners, matrix * weights[:, None])
+    norms = np.linalg.norm(combined, axis=1, keepdims=True)
+    combined /= np.where(norms > 0, norms, 1.0)
+    result = combined.tolist()
+    whole = np.bincount(owners, minlength=n_texts) == 1
+    for index, owner in enumerate(owners.tolist()):
+        if whole[owner]:
+            result[owner] = vectors[index]
+    return result
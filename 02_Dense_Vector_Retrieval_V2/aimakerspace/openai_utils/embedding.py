@@ -1,9 +1,23 @@
 from dotenv import load_dotenv
 from openai import AsyncOpenAI, OpenAI
+import numpy as np
 import openai
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple, Union
 import os
 import asyncio
+import threading
+from concurrent.futures import Future
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache
+from aimakerspace.openai_utils.batching import (
+    MAX_TOKENS_PER_INPUT,
+    MAX_TOKENS_PER_REQUEST,
+    OVERSIZE_POLICIES,
+    Batch,
+    TokenCounter,
+    combine_pieces,
+    plan_batches,
+)
+from aimakerspace.openai_utils.scheduler import EmbeddingScheduler
 
 
 class EmbeddingModel:
@@ -11,61 +25,229 @@ class EmbeddingModel:
         self,
         embeddings_model_name: str = "text-embedding-3-small",
         batch_size: int = 1024,
+        dimensions: Optional[int] = None,
+        cache: Union[EmbeddingCache, str, None] = None,
+        scheduler: Optional[EmbeddingScheduler] = None,
+        max_tokens_per_request: int = MAX_TOKENS_PER_REQUEST,
+        max_tokens_per_input: int = MAX_TOKENS_PER_INPUT,
+        oversize: str = 'truncate',
     ):
         load_dotenv()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.async_client = AsyncOpenAI()
-        self.client = OpenAI()
+        # Retries are left to the scheduler, which knows about the shared rate limits
+        self.async_client = AsyncOpenAI(max_retries=0)
+        self.client = OpenAI(max_retries=0)
 
         if self.openai_api_key is None:
             raise ValueError(
                 "OPENAI_API_KEY environment variable is not set. Please set it to your OpenAI API key."
             )
+        if oversize not in OVERSIZE_POLICIES:
+            raise ValueError(f"Unknown oversize policy '{oversize}'. Use one of {OVERSIZE_POLICIES}.")
         self.embeddings_model_name = embeddings_model_name
+        # Requests are packed by token count; batch_size caps the number of texts per request
         self.batch_size = batch_size
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_tokens_per_input = max_tokens_per_input
+        # What to do with texts over max_tokens_per_input: 'truncate', 'split' or 'error'
+        self.oversize = oversize
+        self.token_counter = TokenCounter(embeddings_model_name)
+        # Output size for models that support shortening (None = model default)
+        self.dimensions = dimensions
+        # Optional persistent cache: a path opens (or creates) an EmbeddingCache file
+        self.cache = EmbeddingCache(cache) if isinstance(cache, str) else cache
+        # Concurrency cap, rate limits and retries for every API request
+        self.scheduler = scheduler if scheduler is not None else EmbeddingScheduler()
+        # Single flight: texts being embedded right now (with the owning thread),
+        # shared by every concurrent caller
+        self._in_flight: Dict[str, Tuple[Future, int]] = {}
+        self._in_flight_lock = threading.Lock()
+        self._fetches = set()
+        self.coalesced = 0
 
-    async def async_get_embeddings(
-        self, list_of_text: List[str]
+    def _request_kwargs(self) -> Dict[str, Any]:
+        kwargs = {"model": self.embeddings_model_name}
+        if self.dimensions is not None:
+            kwargs["dimensions"] = self.dimensions
+        return kwargs
+
+    def _lookup(self, list_of_text: List[str]) -> Tuple[List[Any], List[str]]:
+        """Cached vectors (None where missing) and the distinct texts that still need the API."""
+        if self.cache is None:
+            return [None] * len(list_of_text), list(dict.fromkeys(list_of_text))
+        cached = self.cache.get_many(self.embeddings_model_name, self.dimensions, list_of_text)
+        missing = dict.fromkeys(text for text, vector in zip(list_of_text, cached) if vector is None)
+        return cached, list(missing)
+
+    def _plan(self, texts: List[str]) -> Tuple[List[Batch], np.ndarray, np.ndarray]:
+        """Token-packed requests for some texts (see plan_batches)."""
+        return plan_batches(
+            texts,
+            self.token_counter,
+            max_tokens_per_input=self.max_tokens_per_input,
+            max_tokens_per_request=self.max_tokens_per_request,
+            max_batch_size=self.batch_size,
+            oversize=self.oversize,
+        )
+
+    def _claim(self, texts: List[str], blocking: bool = False) -> Tuple[Dict[str, Future], List[Future]]:
+        """
+        Register the texts nobody is embedding yet; join the others.
+
+        A blocking (sync) caller never joins a fetch owned by its own thread:
+        that fetch runs on this thread's event loop, which cannot make
+        progress while the caller blocks. Such texts are fetched again.
+
+        Args:
+            texts: Distinct texts to embed
+            blocking: Whether the caller will block on the futures
+
+        Returns:
+            The futures this caller now owns and must settle (by text), and
+            one future per text, in order
+        """
+        me = threading.get_ident()
+        owned: Dict[str, Future] = {}
+        futures = []
+        with self._in_flight_lock:
+            for text in texts:
+                entry = self._in_flight.get(text)
+                if entry is None:
+                    future = owned[text] = Future()
+                    self._in_flight[text] = (future, me)
+                elif blocking and entry[1] == me:
+                    # Fetched privately; the registered fetch stays in place
+                    future = owned[text] = Future()
+                else:
+                    future = entry[0]
+                    self.coalesced += 1
+                futures.append(future)
+        return owned, futures
+
+    def _store(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Write freshly fetched vectors to the cache, if there is one."""
+        if self.cache is not None:
+            self.cache.put_many(self.embeddings_model_name, self.dimensions, texts, vectors)
+
+    def _settle(
+        self,
+        owned: Dict[str, Future],
+        vectors: Optional[List[List[float]]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Resolve (or fail) the futures of the fetched texts."""
+        with self._in_flight_lock:
+            for text, future in owned.items():
+                if self._in_flight.get(text, (None,))[0] is future:
+                    del self._in_flight[text]
+        for index, future in enumerate(owned.values()):
+            if vectors is not None:
+                future.set_result(vectors[index])
+            elif isinstance(error, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(error)
+
+    def _merge(
+        self,
+        list_of_text: List[str],
+        cached: List[Any],
+        missing: List[str],
+        fresh: List[List[float]],
     ) -> List[List[float]]:
-        batches = [
-            list_of_text[i : i + self.batch_size]
-            for i in range(0, len(list_of_text), self.batch_size)
+        """One vector per input text, in order, from cached and freshly fetched vectors."""
+        fresh_by_text = dict(zip(missing, fresh))
+        return [
+            fresh_by_text[text] if vector is None else vector.tolist()
+            for text, vector in zip(list_of_text, cached)
         ]
 
-        async def process_batch(batch):
-            embedding_response = await self.async_client.embeddings.create(
-                input=batch, model=self.embeddings_model_name
+    async def _afetch(self, texts: List[str]) -> List[List[float]]:
+        batches, owners, counts = self._plan(texts)
+
+        async def process_batch(batch, tokens):
+            embedding_response = await self.scheduler.arun(
+                lambda: self.async_client.embeddings.create(
+                    input=batch, **self._request_kwargs()
+                ),
+                tokens,
             )
             return [embeddings.embedding for embeddings in embedding_response.data]
 
-        # Use asyncio.gather to process all batches concurrently
+        # The scheduler bounds how many of these run at once; gather keeps input order
         results = await asyncio.gather(
-            *[process_batch(batch) for batch in batches]
+            *[process_batch(batch, tokens) for batch, tokens in batches]
         )
 
-        # Flatten the results
-        return [embedding for batch_result in results for embedding in batch_result]
+        # Flatten the results and merge the pieces of split texts
+        vectors = [embedding for batch_result in results for embedding in batch_result]
+        return combine_pieces(vectors, owners, counts, len(texts))
 
-    async def async_get_embedding(self, text: str) -> List[float]:
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+    async def _afetch_owned(self, owned: Dict[str, Future]) -> None:
+        try:
+            vectors = await self._afetch(list(owned))
+            if self.cache is not None:
+                # SQLite calls block, so they run off the event loop
+                await asyncio.to_thread(self._store, list(owned), vectors)
+        except BaseException as error:
+            self._settle(owned, error=error)
+            # Errors reach every caller through the futures; only cancellation propagates here
+            if not isinstance(error, Exception):
+                raise
+            return
+        self._settle(owned, vectors)
 
-        return embedding.data[0].embedding
+    def _fetch(self, texts: List[str]) -> List[List[float]]:
+        batches, owners, counts = self._plan(texts)
+        vectors = []
+        for batch, tokens in batches:
+            embedding_response = self.scheduler.run(
+                lambda: self.client.embeddings.create(
+                    input=batch, **self._request_kwargs()
+                ),
+                tokens,
+            )
+            vectors.extend(embeddings.embedding for embeddings in embedding_response.data)
+        return combine_pieces(vectors, owners, counts, len(texts))
 
-    def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        embedding_response = self.client.embeddings.create(
-            input=list_of_text, model=self.embeddings_model_name
+    async def async_get_embeddings(
+        self, list_of_text: List[str]
+    ) -> List[List[float]]:
+        if self.cache is not None:
+            cached, missing = await asyncio.to_thread(self._lookup, list_of_text)
+        else:
+            cached, missing = self._lookup(list_of_text)
+        owned, futures = self._claim(missing)
+        if owned:
+            # Other callers may be waiting on these texts, so the fetch runs
+            # as its own task and is not cancelled along with this caller
+            fetch = asyncio.ensure_future(self._afetch_owned(owned))
+            self._fetches.add(fetch)
+            fetch.add_done_callback(self._fetches.discard)
+        fresh = await asyncio.shield(
+            asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
         )
+        return self._merge(list_of_text, cached, missing, fresh)
 
-        return [embeddings.embedding for embeddings in embedding_response.data]
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return (await self.async_get_embeddings([text]))[0]
 
-    def get_embedding(self, text: str) -> List[float]:
-        embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+    def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        cached, missing = self._lookup(list_of_text)
+        owned, futures = self._claim(missing, blocking=True)
+        if owned:
+            try:
+                vectors = self._fetch(list(owned))
+                self._store(list(owned), vectors)
+            except BaseException as error:
+                self._settle(owned, error=error)
+                raise
+            self._settle(owned, vectors)
+        fresh = [future.result() for future in futures]
+        return self._merge(list_of_text, cached, missing, fresh)
 
-        return embedding.data[0].embedding
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings([text])[0]
 
 
 if __name__ == "__main__":
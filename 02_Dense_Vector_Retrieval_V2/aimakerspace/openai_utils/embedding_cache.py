@@ -0,0 +1,219 @@
+"""
+Persistent, content-addressed cache of embedding vectors.
+
+Vectors are stored in a local SQLite file keyed by (model name, dimensions,
+sha256 of the text), as raw float32 blobs. Since an embedding is a pure
+function of those three, a cached vector never goes stale: re-embedding an
+unchanged corpus, or answering a repeated query, needs no API call.
+
+The cache is bounded by ``max_entries``; when full, the least recently used
+entries are evicted. Lookups and inserts take whole batches so a rebuild of
+N chunks costs a handful of SQL statements, not N round trips.
+
+The entry count and the access clock that orders LRU eviction live in the
+database itself and are updated in the same transactions as the entries,
+so several processes sharing one file agree on both.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Stay well below SQLite's limit on host parameters per statement
+_SQL_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    dimensions INTEGER NOT NULL,
+    text_hash BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (model, dimensions, text_hash)
+);
+CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def text_hash(text: str) -> bytes:
+    """SHA-256 digest of a text, the content address of its embedding."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed LRU cache of float32 embedding vectors.
+
+    Safe to share between threads; several processes may also open the same
+    file (it uses SQLite's write-ahead log).
+    """
+
+    def __init__(self, path: str = "embedding_cache.sqlite", max_entries: Optional[int] = None):
+        """
+        Args:
+            path: SQLite file to use (created if missing), or ":memory:"
+            max_entries: Evict least recently used vectors beyond this many.
+                         None keeps everything.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE,
+        # which serializes writers across processes
+        self._connection = sqlite3.connect(path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        with self._transaction():
+            # Files written before the counters table existed are counted once
+            self._connection.execute(
+                "INSERT OR IGNORE INTO counters (name, value) SELECT 'entries', COUNT(*) FROM embeddings"
+            )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO counters (name, value) "
+                "SELECT 'clock', COALESCE(MAX(last_used), 0) FROM embeddings"
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the connection lock inside an immediate (write) transaction."""
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def _counter(self, name: str) -> int:
+        return self._connection.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def _add_to_counter(self, name: str, delta: int) -> int:
+        """Add to a shared counter (inside a transaction) and return its new value."""
+        self._connection.execute("UPDATE counters SET value = value + ? WHERE name = ?", (delta, name))
+        return self._counter(name)
+
+    def __len__(self) -> int:
+        """Number of cached vectors (across every process using the file)."""
+        with self._lock:
+            return self._counter('entries')
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of looked-up texts that were found, since this cache was opened."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of this session and the current size."""
+        return {
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'evictions': self.evictions,
+        }
+
+    def get_many(
+        self,
+        model: str,
+        dimensions: Optional[int],
+        texts: Sequence[str],
+    ) -> List[Optional[np.ndarray]]:
+        """
+        Look up the vectors of many texts at once.
+
+        Args:
+            model: Embedding model name
+            dimensions: Requested output dimensions (None for the model default)
+            texts: Texts to look up (duplicates allowed)
+
+        Returns:
+            One float32 vector per text, or None where the text is not cached
+        """
+        hashes = [text_hash(text) for text in texts]
+        distinct = list(dict.fromkeys(hashes))
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(distinct), _SQL_BATCH):
+                chunk = distinct[start:start + _SQL_BATCH]
+                rows = self._connection.execute(
+                    "SELECT text_hash, vector FROM embeddings WHERE model = ? AND dimensions = ? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (model, dimensions or 0, *chunk),
+                ).fetchall()
+                found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        if found:
+            with self._transaction():
+                clock = self._add_to_counter('clock', 1)
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND dimensions = ? AND text_hash = ?",
+                    [(clock, model, dimensions or 0, key) for key in found],
+                )
+        with self._lock:
+            results = [found.get(key) for key in hashes]
+            hits = sum(vector is not None for vector in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(
+        self,
+        model: str,
+        dimensions: Optional[int],
+        texts: Sequence[str],
+        vectors: Sequence[Any],
+    ) -> None:
+        """
+        Store the vectors of many texts at once, evicting LRU entries if over capacity.
+
+        Args:
+            model: Embedding model name
+            dimensions: Requested output dimensions (None for the model default)
+            texts: The embedded texts
+            vectors: One vector per text (lists or arrays; stored as float32)
+        """
+        if len(texts) != len(vectors):
+            raise ValueError(f"Got {len(texts)} texts but {len(vectors)} vectors.")
+        rows = [
+            (model, dimensions or 0, text_hash(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._transaction():
+            clock = self._add_to_counter('clock', 1)
+            cursor = self._connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, dimensions, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [row + (clock,) for row in rows],
+            )
+            count = self._add_to_counter('entries', cursor.rowcount)
+            if self.max_entries is not None and count > self.max_entries:
+                cursor = self._connection.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self._add_to_counter('entries', -cursor.rowcount)
+                self.evictions += cursor.rowcount
+
+    def clear(self) -> None:
+        """Remove every cached vector."""
+        with self._transaction():
+            self._connection.execute("DELETE FROM embeddings")
+            self._connection.execute("UPDATE counters SET value = 0 WHERE name = 'entries'")
+
+    def close(self) -> None:
+        """Close the underlying database file."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,229 @@
+"""
+Rate-limit aware scheduling of embedding API requests.
+
+An ``EmbeddingScheduler`` caps how many requests are in flight at once and
+meters them through two token buckets, one for requests per minute and one
+for tokens per minute, so a large ingest runs at the provider's ceiling
+without crossing it. Requests that still hit a rate limit (or a transient
+server error) are retried with exponential backoff and full jitter, honoring
+the server's ``Retry-After`` hint, and every other request waits out the
+same cool-down instead of piling on more 429s.
+
+The buckets work by reservation: taking capacity never blocks, it returns
+how long the caller must wait before its share is actually available. That
+lets the synchronous and asynchronous code paths share one set of limits.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+import openai
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar('T')
+
+# Errors worth retrying: the request itself was fine, the service was not
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at ``rate_per_minute``.
+
+    The bucket holds at most one minute of capacity. ``reserve`` may drive
+    the level negative; the caller then waits until it would be back at zero.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        """
+        Args:
+            rate_per_minute: Sustained capacity per minute (also the burst size)
+        """
+        if rate_per_minute <= 0:
+            raise ValueError(f"rate_per_minute must be positive, got {rate_per_minute}.")
+        self.capacity = float(rate_per_minute)
+        self._rate = self.capacity / 60.0
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take ``amount`` from the bucket.
+
+        Args:
+            amount: Capacity to take; more than one minute's worth is clamped
+                    so that an oversized request can still go through
+
+        Returns:
+            Seconds to wait before the reserved capacity is available
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= min(float(amount), self.capacity)
+            return max(0.0, -self._level / self._rate)
+
+    def adjust(self, amount: float) -> None:
+        """Give back (positive) or take extra (negative) capacity after the fact."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + amount)
+
+
+class EmbeddingScheduler:
+    """
+    Concurrency cap, request/token rate limits and retries for embedding calls.
+
+    One scheduler may be shared by several EmbeddingModels that draw on the
+    same API key, so that they respect one set of limits together.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        """
+        Args:
+            max_concurrency: Most requests in flight at once
+            requests_per_minute: Request rate limit (None for no limit)
+            tokens_per_minute: Input token rate limit (None for no limit)
+            max_retries: Retries of a failing request before its error is raised
+            base_delay: Backoff ceiling of the first retry in seconds (doubles per retry)
+            max_delay: Largest backoff ceiling in seconds
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}.")
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.retries = 0
+        self._thread_slots = threading.BoundedSemaphore(max_concurrency)
+        # asyncio primitives belong to one event loop, so keep a semaphore per loop
+        self._loop_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._slots_lock = threading.Lock()
+        # Shared cool-down after a rate-limit error, as a time.monotonic() deadline
+        self._paused_until = 0.0
+
+    def _async_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._slots_lock:
+            slots = self._loop_slots.get(loop)
+            if slots is None:
+                slots = self._loop_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+            return slots
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request and ``tokens`` from the buckets; seconds to wait before sending."""
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.request_bucket is not None:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket is not None:
+            delay = max(delay, self.token_bucket.reserve(tokens))
+        return delay
+
+    def _settle(self, tokens: int, response: Any) -> None:
+        """Correct the token bucket by the usage the API reported."""
+        usage = getattr(response, 'usage', None)
+        used = getattr(usage, 'total_tokens', None) or getattr(usage, 'prompt_tokens', None)
+        if self.token_bucket is not None and isinstance(used, int):
+            self.token_bucket.adjust(tokens - used)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter delay before retry ``attempt``; also pauses the other requests on a 429."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if isinstance(error, openai.RateLimitError):
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.retries += 1
+        return delay
+
+    async def arun(self, call: Callable[[], Awaitable[T]], tokens: int) -> T:
+        """
+        Send one request through the limits, retrying transient failures.
+
+        Args:
+            call: Coroutine function issuing the request (called once per attempt)
+            tokens: Estimated input tokens of the request
+
+        Returns:
+            The response of the first successful attempt
+        """
+        slots = self._async_slots()
+        attempt = 0
+        while True:
+            async with slots:
+                delay = self._reserve(tokens)
+                if delay:
+                    await asyncio.sleep(delay)
+                try:
+                    response = await call()
+                except RETRYABLE_ERRORS as error:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, error)
+                else:
+                    self._settle(tokens, response)
+                    return response
+            # Back off without holding a slot, so other requests can drain
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def run(self, call: Callable[[], T], tokens: int) -> T:
+        """Blocking counterpart of ``arun`` for the synchronous client."""
+        attempt = 0
+        while True:
+            with self._thread_slots:
+                delay = self._reserve(tokens)
+                if delay:
+                    time.sleep(delay)
+                try:
+                    response = call()
+                except RETRYABLE_ERRORS as error:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, error)
+                else:
+                    self._settle(tokens, response)
+                    return response
+            time.sleep(delay)
+            attempt += 1
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from the ``Retry-After`` header if present."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get('retry-after-ms'))) / 1000.0
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,97 @@
+"""
+Reader-writer lock for sharing a database between serving threads.
+
+Any number of readers may hold the lock together; a writer holds it alone.
+Waiting writers block new readers, so a steady stream of searches cannot
+starve inserts. Both sides are reentrant per thread, and the writing
+thread may also take the read lock, which lets a writer downgrade to a
+reader without a gap in which another writer could slip in.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class ReadWriteLock:
+    """Writer-preferring, per-thread reentrant reader-writer lock."""
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._local = threading.local()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, 'read_depth', 0)
+
+    def acquire_read(self) -> None:
+        """Block until no writer holds or waits for the lock, then enter as a reader."""
+        me = threading.get_ident()
+        with self._condition:
+            # Nested reads (and reads by the writer) must not wait for queued writers
+            if self._writer != me and not self._read_depth():
+                while self._writer is not None or self._waiting_writers:
+                    self._condition.wait()
+            self._readers += 1
+        self._local.read_depth = self._read_depth() + 1
+
+    def release_read(self) -> None:
+        """Leave as a reader."""
+        with self._condition:
+            self._readers -= 1
+            if self._readers == 0:
+                self._condition.notify_all()
+        self._local.read_depth = self._read_depth() - 1
+
+    def acquire_write(self) -> None:
+        """
+        Block until no reader or other writer holds the lock, then enter as the writer.
+
+        Raises:
+            RuntimeError: If the calling thread holds only the read lock
+                          (upgrading would deadlock against other readers)
+        """
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if self._read_depth():
+                raise RuntimeError("Cannot upgrade a read lock to a write lock.")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        """Leave as the writer."""
+        with self._condition:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock as a reader for the duration of a ``with`` block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock as the writer for the duration of a ``with`` block."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,89 @@
+"""
+Incrementally maintained statistics for monitoring a vector store.
+
+Counters are updated as rows are inserted, overwritten and deleted, so
+reading them costs the same for ten documents as for ten million.
+"""
+
+import math
+import numpy as np
+from typing import Dict, List
+
+
+class LogHistogram:
+    """
+    Counts of non-negative values in logarithmic bins, updated incrementally.
+
+    Bin ``i`` covers ``[2 ** (i / bins_per_octave), 2 ** ((i + 1) / bins_per_octave))``,
+    so the resolution is relative (about 19% wide bins by default) and no
+    range has to be fixed up front. Zeros are counted in a bin of their own.
+    A value is always mapped to the same bin, so removing exactly the values
+    that were added restores the previous counts.
+    """
+
+    def __init__(self, bins_per_octave: int = 4):
+        """
+        Args:
+            bins_per_octave: Number of bins per doubling of the value
+        """
+        self.bins_per_octave = bins_per_octave
+        self.zero_count = 0
+        self._counts: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        """Number of values currently counted."""
+        return self.zero_count + sum(self._counts.values())
+
+    def add(self, values) -> None:
+        """Count one or more values."""
+        self._update(values, 1)
+
+    def remove(self, values) -> None:
+        """Un-count values that were added before."""
+        self._update(values, -1)
+
+    def clear(self) -> None:
+        """Drop every count."""
+        self.zero_count = 0
+        self._counts = {}
+
+    def _update(self, values, sign: int) -> None:
+        if np.ndim(values) == 0:
+            # Per-row updates skip the array machinery, which dominates for one value
+            value = float(values)
+            if value > 0:
+                self._bump(math.floor(math.log2(value) * self.bins_per_octave), sign)
+            else:
+                self.zero_count += sign
+            return
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        positive = values > 0
+        self.zero_count += sign * int(len(values) - positive.sum())
+        bins = np.floor(np.log2(values[positive]) * self.bins_per_octave).astype(np.int64)
+        for index, count in zip(*(array.tolist() for array in np.unique(bins, return_counts=True))):
+            self._bump(index, sign * count)
+
+    def _bump(self, index: int, delta: int) -> None:
+        total = self._counts.get(index, 0) + delta
+        if total:
+            self._counts[index] = total
+        else:
+            del self._counts[index]
+
+    def to_list(self) -> List[Dict[str, float]]:
+        """
+        Non-empty bins in ascending order.
+
+        Returns:
+            List of {'lower', 'upper', 'count'} dicts; the zero bin has lower == upper == 0
+        """
+        bins = [{'lower': 0.0, 'upper': 0.0, 'count': self.zero_count}] if self.zero_count else []
+        for index in sorted(self._counts):
+            bins.append({
+                'lower': float(2 ** (index / self.bins_per_octave)),
+                'upper': float(2 ** ((index + 1) / self.bins_per_octave)),
+                'count': self._counts[index],
+            })
+        return bins
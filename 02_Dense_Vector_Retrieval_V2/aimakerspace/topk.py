@@ -0,0 +1,88 @@
+"""
+Top-k selection helpers for vector search.
+
+Selecting the k best scores does not require sorting all N of them:
+``np.argpartition`` finds the top k in O(N) and only those k are sorted,
+giving O(N + k log k) per query. When scores are produced one at a time
+(custom pairwise metrics), a bounded min-heap keeps memory at O(k).
+"""
+
+import heapq
+import numpy as np
+from typing import Any, List, Tuple
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Return the indices of the k highest scores, best first.
+
+    Works along the last axis, so a (Q, N) score matrix yields a (Q, k)
+    index matrix with an independent top-k per row. Equal scores among the
+    selected k are ordered by lower index first.
+
+    Args:
+        scores: Score array of shape (N,) or (Q, N)
+        k: Number of indices to return (clipped to N)
+
+    Returns:
+        np.ndarray: Indices of shape (k,) or (Q, k)
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.lexsort((candidates, -candidate_scores), axis=-1)
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+class TopKHeap:
+    """
+    Bounded min-heap that keeps the k best ``(score, item)`` pairs of a stream.
+
+    The heap root is the worst retained score, so each push is O(log k) and
+    memory never exceeds k entries regardless of stream length.
+    """
+
+    def __init__(self, k: int):
+        """
+        Args:
+            k: Number of best entries to retain
+        """
+        self.k = k
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._counter = 0
+
+    def push(self, score: float, item: Any) -> None:
+        """
+        Offer an entry; it is kept only if it beats the current worst.
+
+        Args:
+            score: Score of the entry (higher is better)
+            item: Payload returned by ``items``
+        """
+        if self.k <= 0:
+            return
+        # Negated arrival order breaks ties in favour of earlier items
+        entry = (score, -self._counter, item)
+        self._counter += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def items(self) -> List[Tuple[Any, float]]:
+        """
+        Return the retained entries as ``(item, score)`` pairs, best first.
+        """
+        return [(item, score) for score, _, item in sorted(self._heap, reverse=True)]
@@ -0,0 +1,611 @@
+"""
+Contiguous matrix-backed storage for embedding vectors.
+
+All vectors live in one growable float32 matrix so that a query can be scored
+against the whole corpus (or a subset of rows) with a single matrix-vector
+product. Keys and metadata are kept in a side table indexed by integer row id,
+with an inverted metadata index maintained alongside it.
+
+Every row also carries a stable id (an int or string, e.g. a UUID; the key
+itself when none is given). Inserting an existing id overwrites its row in
+place; deleting an id only tombstones its row, and ``compact`` later drops
+tombstoned rows and renumbers the survivors. Rows can also carry a content
+hash of the text and embedding model that produced them, which incremental
+builds use to skip re-embedding unchanged chunks.
+
+A store can be saved to a directory (``vectors.npy`` + ``norms.npy`` + a JSON
+sidecar with keys, ids, metadata, content hashes and tombstones) and loaded back with the vectors
+memory-mapped, so startup does not re-embed anything and several processes
+can share one page-cached copy of the matrix.
+"""
+
+import json
+import os
+import uuid
+import numpy as np
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+from aimakerspace.metadata_index import MetadataIndex
+from aimakerspace.stats import LogHistogram
+
+STORE_FORMAT_VERSION = 2
+# Version 1 stores (no ids, no tombstones) are still readable
+_READABLE_FORMAT_VERSIONS = (1, 2)
+_VECTORS_FILE = "vectors.npy"
+_NORMS_FILE = "norms.npy"
+_SIDECAR_FILE = "store.json"
+
+RowId = Union[int, str]
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb", **kwargs) -> Iterator[IO]:
+    """
+    Open a temporary file next to ``path`` and move it into place on success.
+
+    Readers (including memory maps of the old file) never see a half-written
+    file, and a failed write leaves the previous version intact.
+
+    Args:
+        path: Final file path
+        mode: File mode, "wb" or "w"
+        **kwargs: Passed to ``open`` (e.g. encoding)
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def as_row_id(row_id: Any) -> RowId:
+    """
+    Normalize a row id: UUIDs become strings, NumPy integers plain ints.
+
+    Raises:
+        TypeError: If the id is not an int, str or UUID
+    """
+    if isinstance(row_id, uuid.UUID):
+        return str(row_id)
+    if isinstance(row_id, (int, np.integer)) and not isinstance(row_id, (bool, np.bool_)):
+        return int(row_id)
+    if isinstance(row_id, str):
+        return row_id
+    raise TypeError(f"Row ids must be int, str or UUID, got {type(row_id).__name__}.")
+
+
+class VectorStore:
+    """
+    Growable float32 matrix with an integer row id -> key/metadata side table.
+
+    Rows are appended in insertion order and only move when ``compact`` is
+    called. Each row has a unique id (the key unless given explicitly);
+    re-inserting an existing id overwrites its row in place, so identical
+    texts with different ids are kept apart. Deleted rows are tombstoned:
+    they drop out of ``live_rows`` and the metadata index but keep their
+    slot in the matrix until ``compact``.
+
+    The L2 norm of every row is computed once at insert time and cached, so
+    cosine scoring never recomputes norms of stored vectors. With
+    ``normalize=True`` rows are stored as unit vectors instead, which turns
+    cosine similarity into a plain dot product.
+    """
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        initial_capacity: int = 1024,
+        normalize: bool = False,
+    ):
+        """
+        Initialize an empty store.
+
+        Args:
+            dimension: Vector dimensionality. Inferred from the first insert if None.
+            initial_capacity: Number of rows to allocate up front
+            normalize: If True, L2-normalize vectors on insert
+        """
+        self.dimension = dimension
+        self.normalize = normalize
+        self._capacity = max(1, initial_capacity)
+        self._matrix: Optional[np.ndarray] = None
+        self._norms: Optional[np.ndarray] = None
+        self._size = 0
+        # Bumped whenever vectors change, so derived copies (shards) can detect staleness
+        self.version = 0
+        self.keys: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.ids: List[RowId] = []
+        self.content_hashes: List[Optional[str]] = []
+        # Live rows of each key, oldest first; several ids may share one key
+        self._key_to_rows: Dict[str, List[int]] = {}
+        self._id_to_row: Dict[RowId, int] = {}
+        self._deleted: Set[int] = set()
+        self.metadata_index = MetadataIndex()
+        # Distributions over live rows, kept current on every insert and delete
+        self.norm_histogram = LogHistogram()
+        self.length_histogram = LogHistogram()
+        self._all_rows = np.empty(0, dtype=np.intp)
+        self._live_rows: Optional[np.ndarray] = None
+
+        if dimension is not None:
+            self._matrix = np.empty((self._capacity, dimension), dtype=np.float32)
+            self._norms = np.empty(self._capacity, dtype=np.float32)
+
+    def __len__(self) -> int:
+        """Number of rows in the matrix, tombstoned rows included."""
+        return self._size
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._key_to_rows
+
+    @property
+    def live_count(self) -> int:
+        """Number of rows that have not been deleted."""
+        return self._size - len(self._deleted)
+
+    @property
+    def deleted_count(self) -> int:
+        """Number of tombstoned rows waiting for ``compact``."""
+        return len(self._deleted)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of vectors and norms held for populated rows, tombstoned rows included."""
+        if self._matrix is None:
+            return 0
+        return self._size * (self._matrix.shape[1] + 1) * self._matrix.itemsize
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the populated rows (no copy)."""
+        if self._matrix is None:
+            return np.empty((0, self.dimension or 0), dtype=np.float32)
+        return self._matrix[: self._size]
+
+    @property
+    def all_rows(self) -> np.ndarray:
+        """Sorted ids of every populated row (cached until the store grows)."""
+        if len(self._all_rows) != self._size:
+            self._all_rows = np.arange(self._size, dtype=np.intp)
+        return self._all_rows
+
+    @property
+    def live_rows(self) -> np.ndarray:
+        """
+        Sorted ids of every row that has not been deleted.
+
+        This is ``all_rows`` itself (same object) while there are no tombstones.
+        """
+        if not self._deleted:
+            return self.all_rows
+        if self._live_rows is None:
+            self._live_rows = np.setdiff1d(
+                self.all_rows, np.fromiter(self._deleted, dtype=np.intp), assume_unique=True
+            )
+        return self._live_rows
+
+    @property
+    def mapped_files(self) -> Optional[Tuple[str, str]]:
+        """Paths of the vector and norm files while both are still read-only memory maps."""
+        if (
+            isinstance(self._matrix, np.memmap)
+            and isinstance(self._norms, np.memmap)
+            and not self._matrix.flags.writeable
+        ):
+            return self._matrix.filename, self._norms.filename
+        return None
+
+    @property
+    def norms(self) -> np.ndarray:
+        """Cached L2 norms of the populated rows (1.0 for every non-zero row when normalized)."""
+        if self._norms is None:
+            return np.empty(0, dtype=np.float32)
+        return self._norms[: self._size]
+
+    def _ensure_capacity(self, n_rows: int) -> None:
+        """Grow the backing matrix geometrically so appends stay amortized O(1)."""
+        if self._matrix is not None and not self._matrix.flags.writeable:
+            # Copy-on-write for memory-mapped (read-only) stores
+            self._matrix = np.array(self._matrix, dtype=np.float32)
+            self._norms = np.array(self._norms, dtype=np.float32)
+            self._capacity = len(self._matrix)
+        if self._matrix is None:
+            self._capacity = max(self._capacity, n_rows)
+            self._matrix = np.empty((self._capacity, self.dimension), dtype=np.float32)
+            self._norms = np.empty(self._capacity, dtype=np.float32)
+            return
+        if n_rows <= self._capacity:
+            return
+        while self._capacity < n_rows:
+            self._capacity *= 2
+        grown = np.empty((self._capacity, self.dimension), dtype=np.float32)
+        grown[: self._size] = self._matrix[: self._size]
+        self._matrix = grown
+        grown_norms = np.empty(self._capacity, dtype=np.float32)
+        grown_norms[: self._size] = self._norms[: self._size]
+        self._norms = grown_norms
+
+    def _as_row(self, vector: np.ndarray) -> np.ndarray:
+        row = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if self.dimension is None:
+            self.dimension = row.shape[0]
+        elif row.shape[0] != self.dimension:
+            raise ValueError(
+                f"Vector has dimension {row.shape[0]}, expected {self.dimension}."
+            )
+        return row
+
+    def _as_block(self, vectors) -> np.ndarray:
+        block = np.asarray(vectors, dtype=np.float32)
+        if block.ndim != 2:
+            raise ValueError(f"Expected a 2-D block of vectors, got shape {block.shape}.")
+        if self.dimension is None:
+            self.dimension = block.shape[1]
+        elif block.shape[1] != self.dimension:
+            raise ValueError(
+                f"Vectors have dimension {block.shape[1]}, expected {self.dimension}."
+            )
+        return block
+
+    def _prepare(self, block: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute row norms and, in normalize mode, rescale rows to unit length."""
+        norms = np.linalg.norm(block, axis=-1)
+        if not self.normalize:
+            return block, norms
+        nonzero = norms > 0
+        block = block / np.where(nonzero, norms, 1)[..., None]
+        return block, nonzero.astype(np.float32)
+
+    def _assign_row(
+        self,
+        key: str,
+        metadata: Optional[Dict[str, Any]],
+        row_id: Any = None,
+        content_hash: Optional[str] = None,
+    ) -> int:
+        """
+        Return the row for ``row_id``, appending a new one if needed (capacity must be reserved).
+
+        The caller counts the new key's length; an overwritten key is un-counted here.
+        """
+        metadata = metadata or {}
+        row_id = key if row_id is None else as_row_id(row_id)
+        row = self._id_to_row.get(row_id)
+        if row is None:
+            row = self._size
+            self._size += 1
+            self.keys.append(key)
+            self.ids.append(row_id)
+            self.content_hashes.append(content_hash)
+            self.metadata.append(metadata)
+            self._id_to_row[row_id] = row
+            self._live_rows = None
+        else:
+            self.metadata_index.remove(row, self.metadata[row])
+            self.length_histogram.remove(len(self.keys[row]))
+            self._unlink_key(row)
+            self.keys[row] = key
+            self.content_hashes[row] = content_hash
+            self.metadata[row] = metadata
+        self._key_to_rows.setdefault(key, []).append(row)
+        self.metadata_index.add(row, metadata)
+        return row
+
+    def _unlink_key(self, row: int) -> None:
+        """Drop ``row`` from the rows of its key; the key stays reachable through its other live rows."""
+        key = self.keys[row]
+        rows = self._key_to_rows.get(key)
+        if rows is not None and row in rows:
+            rows.remove(row)
+            if not rows:
+                del self._key_to_rows[key]
+
+    def add(
+        self,
+        key: str,
+        vector: np.ndarray,
+        metadata: Optional[Dict[str, Any]] = None,
+        row_id: Any = None,
+        content_hash: Optional[str] = None,
+    ) -> int:
+        """
+        Insert or overwrite a vector.
+
+        Args:
+            key: The text/key associated with this vector
+            vector: The embedding vector
+            metadata: Optional metadata dict
+            row_id: Stable id (int, str or UUID). Defaults to the key.
+            content_hash: Optional hash of the text and embedding model
+
+        Returns:
+            The row id holding the vector
+        """
+        row_vector, norm = self._prepare(self._as_row(vector)[None, :])
+        self._ensure_capacity(self._size + 1)
+        old_size = self._size
+        row = self._assign_row(key, metadata, row_id, content_hash)
+        self.length_histogram.add(len(key))
+        if row < old_size:
+            self.norm_histogram.remove(self._norms[row])
+        self._matrix[row] = row_vector[0]
+        self._norms[row] = norm[0]
+        self.norm_histogram.add(norm[0])
+        self.version += 1
+        return row
+
+    def add_many(
+        self,
+        keys: List[str],
+        vectors,
+        metadata_list: Optional[List[Optional[Dict[str, Any]]]] = None,
+        row_ids: Optional[Sequence[Any]] = None,
+        content_hashes: Optional[Sequence[Optional[str]]] = None,
+    ) -> np.ndarray:
+        """
+        Insert or overwrite a block of vectors in one pass.
+
+        Norms (and normalization) are computed for the whole block at once
+        and the rows are written with a single array assignment.
+
+        Args:
+            keys: Keys, one per vector
+            vectors: Array-like of shape (len(keys), d)
+            metadata_list: Optional metadata dicts, one per key
+            row_ids: Optional stable ids, one per key. Default to the keys.
+            content_hashes: Optional hashes of text and embedding model, one per key
+
+        Returns:
+            np.ndarray: The row id of each key
+        """
+        if not keys:
+            return np.empty(0, dtype=np.intp)
+        block, norms = self._prepare(self._as_block(vectors))
+        if block.shape[0] != len(keys):
+            raise ValueError(f"Got {len(keys)} keys but {block.shape[0]} vectors.")
+        if row_ids is not None and len(row_ids) != len(keys):
+            raise ValueError(f"Got {len(keys)} keys but {len(row_ids)} ids.")
+
+        self._ensure_capacity(self._size + len(keys))
+        old_size = self._size
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            metadata = metadata_list[i] if metadata_list and i < len(metadata_list) else None
+            rows[i] = self._assign_row(
+                key,
+                metadata,
+                None if row_ids is None else row_ids[i],
+                None if content_hashes is None else content_hashes[i],
+            )
+        # Counts are additive, so a row assigned twice in one block nets out
+        # to its final key; norms are counted once per distinct row
+        self.length_histogram.add([len(key) for key in keys])
+        distinct = np.unique(rows)
+        self.norm_histogram.remove(self._norms[distinct[distinct < old_size]])
+        self._matrix[rows] = block
+        self._norms[rows] = norms
+        self.norm_histogram.add(self._norms[distinct])
+        self.version += 1
+        return rows
+
+    def update_metadata(self, row: int, metadata: Optional[Dict[str, Any]]) -> None:
+        """
+        Replace the metadata of a row without touching its vector.
+
+        Args:
+            row: Row id
+            metadata: The new metadata dict
+        """
+        self.metadata_index.remove(row, self.metadata[row])
+        self.metadata[row] = metadata or {}
+        self.metadata_index.add(row, self.metadata[row])
+
+    def delete(self, row_ids: Sequence[Any]) -> np.ndarray:
+        """
+        Tombstone the rows of some ids; unknown ids are ignored.
+
+        The rows leave ``live_rows``, the metadata index and the key/id
+        lookups immediately; their matrix slots are reclaimed by ``compact``.
+
+        Args:
+            row_ids: Ids to delete
+
+        Returns:
+            np.ndarray: The tombstoned row ids
+        """
+        rows = []
+        for row_id in row_ids:
+            row = self._id_to_row.pop(as_row_id(row_id), None)
+            if row is None:
+                continue
+            self.metadata_index.remove(row, self.metadata[row])
+            self.length_histogram.remove(len(self.keys[row]))
+            self._unlink_key(row)
+            self.metadata[row] = {}
+            self._deleted.add(row)
+            rows.append(row)
+        self._live_rows = None
+        rows = np.array(rows, dtype=np.intp)
+        self.norm_histogram.remove(self.norms[rows])
+        return rows
+
+    def is_deleted(self, row: int) -> bool:
+        """Whether a row has been tombstoned."""
+        return row in self._deleted
+
+    def compact(self) -> np.ndarray:
+        """
+        Drop tombstoned rows and renumber the survivors densely, in order.
+
+        Row ids held elsewhere (search indexes) must be remapped with the
+        returned array: new row ``i`` was old row ``keep[i]``.
+
+        Returns:
+            np.ndarray: Old row id of each surviving row
+        """
+        keep = self.live_rows.copy()
+        if self._matrix is None:
+            return keep
+        self._capacity = max(1, len(keep))
+        matrix = np.empty((self._capacity, self.dimension), dtype=np.float32)
+        matrix[: len(keep)] = self.matrix[keep]
+        norms = np.empty(self._capacity, dtype=np.float32)
+        norms[: len(keep)] = self.norms[keep]
+        self._matrix, self._norms = matrix, norms
+        self._size = len(keep)
+        self.version += 1
+        self.keys = [self.keys[row] for row in keep.tolist()]
+        self.ids = [self.ids[row] for row in keep.tolist()]
+        self.content_hashes = [self.content_hashes[row] for row in keep.tolist()]
+        self.metadata = [self.metadata[row] for row in keep.tolist()]
+        self._deleted = set()
+        self._live_rows = None
+        self._rebuild_lookups()
+        return keep
+
+    def _rebuild_lookups(self) -> None:
+        """Rebuild the key/id lookups, metadata index and histograms from the side table."""
+        self._key_to_rows = {}
+        self._id_to_row = {}
+        self.metadata_index = MetadataIndex()
+        self.length_histogram.clear()
+        lengths = []
+        for row, (key, row_id, metadata) in enumerate(zip(self.keys, self.ids, self.metadata)):
+            if row in self._deleted:
+                continue
+            self._key_to_rows.setdefault(key, []).append(row)
+            self._id_to_row[row_id] = row
+            self.metadata_index.add(row, metadata)
+            lengths.append(len(key))
+        self.length_histogram.add(lengths)
+        self.norm_histogram.clear()
+        self.norm_histogram.add(self.norms[self.live_rows])
+
+    def save(self, path: str) -> None:
+        """
+        Save the store to a directory.
+
+        Every file is written to a temporary name and renamed into place, so
+        saving over the directory this store was memory-mapped from is safe.
+
+        Args:
+            path: Directory to write into (created if missing)
+        """
+        os.makedirs(path, exist_ok=True)
+        with atomic_write(os.path.join(path, _VECTORS_FILE)) as f:
+            np.save(f, np.ascontiguousarray(self.matrix))
+        with atomic_write(os.path.join(path, _NORMS_FILE)) as f:
+            np.save(f, np.ascontiguousarray(self.norms))
+        sidecar = {
+            'format_version': STORE_FORMAT_VERSION,
+            'dimension': self.dimension,
+            'normalize': self.normalize,
+            'keys': self.keys,
+            'ids': self.ids,
+            'content_hashes': self.content_hashes,
+            'metadata': self.metadata,
+            'deleted': sorted(self._deleted),
+        }
+        with atomic_write(os.path.join(path, _SIDECAR_FILE), "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "VectorStore":
+        """
+        Load a store saved with ``save``.
+
+        Args:
+            path: Directory written by ``save``
+            mmap: If True, memory-map the vector matrix read-only instead of
+                  reading it into memory. The first write copies it.
+
+        Returns:
+            VectorStore: The loaded store
+        """
+        with open(os.path.join(path, _SIDECAR_FILE), "r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        if sidecar.get('format_version') not in _READABLE_FORMAT_VERSIONS:
+            raise ValueError(
+                f"Unsupported store format version {sidecar.get('format_version')!r} in {path}."
+            )
+
+        store = cls(normalize=sidecar['normalize'])
+        store.dimension = sidecar['dimension']
+        if sidecar['keys']:
+            mmap_mode = "r" if mmap else None
+            store._matrix = np.load(os.path.join(path, _VECTORS_FILE), mmap_mode=mmap_mode)
+            store._norms = np.load(os.path.join(path, _NORMS_FILE), mmap_mode=mmap_mode)
+            store._size = len(store._matrix)
+            store._capacity = store._size
+        store.keys = sidecar['keys']
+        store.ids = sidecar.get('ids', list(store.keys))
+        store.content_hashes = sidecar.get('content_hashes', [None] * len(store.keys))
+        store.metadata = sidecar['metadata']
+        store._deleted = set(sidecar.get('deleted', []))
+        store._rebuild_lookups()
+        return store
+
+    def row_of(self, key: str) -> Optional[int]:
+        """
+        Return the row id for a key, or None if the key is unknown.
+
+        When several live ids share the key, the most recently written row is returned.
+        """
+        rows = self._key_to_rows.get(key)
+        return rows[-1] if rows else None
+
+    @property
+    def distinct_key_count(self) -> int:
+        """Number of keys with at least one live row."""
+        return len(self._key_to_rows)
+
+    def distinct_keys(self) -> Iterator[str]:
+        """Every key with at least one live row, once each."""
+        return iter(list(self._key_to_rows))
+
+    def row_of_id(self, row_id: Any) -> Optional[int]:
+        """Return the row for a stable id, or None if the id is unknown or deleted."""
+        return self._id_to_row.get(as_row_id(row_id))
+
+    def get_vector(self, key: str) -> Optional[np.ndarray]:
+        """Return the stored vector for a key, or None if the key is unknown."""
+        row = self.row_of(key)
+        return None if row is None else self._matrix[row]
+
+    def get_metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the metadata for a key, or None if the key is unknown."""
+        row = self.row_of(key)
+        return None if row is None else self.metadata[row]
+
+
+class StoreView(Mapping):
+    """
+    Read-only ``key -> value`` mapping over a VectorStore.
+
+    Keeps ``VectorDatabase.vectors`` and ``VectorDatabase.metadata`` usable as
+    dicts without materializing one entry per row.
+    """
+
+    def __init__(self, store: VectorStore, getter):
+        self._store = store
+        self._getter = getter
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._getter(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        # One entry per key, matching __getitem__ (ids sharing a key share an entry)
+        return self._store.distinct_keys()
+
+    def __len__(self) -> int:
+        return self._store.distinct_key_count
@@ -2,13 +2,64 @@
 Enhanced Vector Database with metadata support and multiple distance metrics.
 """
 
+import hashlib
+import json
+import os
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable, Dict, Any, Optional
+from contextlib import contextmanager
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Sequence, Tuple, Callable, Dict, Any, Optional, Union
 from aimakerspace.openai_utils.embedding import EmbeddingModel
 from aimakerspace.distance_metrics import cosine_similarity, AVAILABLE_METRICS
+from aimakerspace.vector_store import RowId, VectorStore, StoreView, as_row_id, atomic_write
+from aimakerspace.filters import FilterPlan, compile_filter, combine_filters
+from aimakerspace.indexes import create_index
+from aimakerspace.mmr import maximal_marginal_relevance
+from aimakerspace.bm25 import BM25Index
+from aimakerspace.fusion import FUSION_METHODS, reciprocal_rank_fusion, weighted_score_fusion
+from aimakerspace.rwlock import ReadWriteLock
+from aimakerspace.checkpoint import SegmentLog
 import asyncio
 
+_INDEX_CONFIG_FILE = "index.json"
+_INDEX_STATE_FILE = "index.npz"
+_BM25_CONFIG_FILE = "bm25.json"
+_BM25_STATE_FILE = "bm25.npz"
+
+SEARCH_MODES = ('dense', 'bm25', 'hybrid')
+
+
+def content_hash(text: str, model_name: str) -> str:
+    """
+    Hash a chunk together with the embedding model that embeds it.
+
+    Args:
+        text: The chunk text
+        model_name: Embedding model name
+
+    Returns:
+        Hex SHA-256 digest; it changes when either the text or the model changes
+    """
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+async def _aiter(stream: Union[AsyncIterable[Any], Iterable[Any]]) -> AsyncIterator[Any]:
+    """Iterate a plain or async iterable asynchronously."""
+    if hasattr(stream, '__aiter__'):
+        async for item in stream:
+            yield item
+    else:
+        for item in stream:
+            yield item
+
+
+def _stream_item(item: Any) -> Tuple[str, Optional[Dict[str, Any]], Optional[RowId]]:
+    """Split a streamed chunk into (text, metadata, id), normalizing the id (see as_row_id)."""
+    if isinstance(item, str):
+        return item, None, None
+    text, metadata, *rest = item
+    row_id = rest[0] if rest else None
+    return text, metadata, None if row_id is None else as_row_id(row_id)
+
 
 class VectorDatabase:
     """
@@ -17,23 +68,119 @@ class VectorDatabase:
     Features:
     - Metadata support for categorization and filtering
     - Multiple distance metrics
-    - Category-based filtering
+    - Category-based filtering backed by an inverted metadata index
     - Batch embedding generation
+    - Contiguous float32 storage scored with one matrix-vector product
+    - Multi-query batched search scored as a single matrix product
+    - On-disk persistence with memory-mapped vectors
+    - Cached vector norms, or pre-normalized vectors for dot-product cosine
+    - Pluggable search index: exact (flat), approximate (IVF, HNSW),
+      scalar-quantized (int8), product-quantized (PQ, IVF-PQ)
+      or exact search sharded across worker processes
+    - Stable ids with upsert, tombstone deletes and explicit compaction
+    - Incremental rebuilds that only embed new or changed chunks
+    - Optional Maximal Marginal Relevance (MMR) re-ranking of results
+    - BM25 keyword search and hybrid BM25 + dense search (RRF or weighted fusion)
+    - Async search and thread-safe concurrent reads alongside writes
+    - Streaming builds with bounded memory and resumable checkpoints
+    
+    All public methods may be called from several threads at once: searches
+    share a reader-writer lock, inserts, deletes and compaction hold it
+    exclusively. The async search methods await the embedding call and run
+    the scoring in a worker thread, so they never block the event loop.
     """
     
-    def __init__(self, embedding_model: EmbeddingModel = None):
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        normalize: bool = False,
+        index: Union[str, Any, None] = None,
+        bm25: Union[bool, BM25Index] = False,
+    ):
         """
         Initialize the vector database.
         
         Args:
             embedding_model: Model to use for generating embeddings.
                            Defaults to EmbeddingModel() if not provided.
+            normalize: If True, store L2-normalized vectors so cosine search is a
+                       plain dot product. Other metrics then also see unit vectors.
+            index: Search index name ('flat', 'ivf', 'hnsw', 'sq', 'pq', 'sharded') or instance, e.g.
+                   IVFIndex(n_lists=1024, nprobe=16). Defaults to exact 'flat' search.
+            bm25: If True (or a configured BM25Index), maintain a BM25 keyword index
+                  from the first insert. Otherwise it is built on the first
+                  'bm25' or 'hybrid' text search and maintained from then on.
         """
-        self.vectors = defaultdict(np.array)
-        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.store = VectorStore(normalize=normalize)
+        self.index = create_index(index)
+        self.bm25: Optional[BM25Index] = None
+        if bm25:
+            self.bm25 = bm25 if isinstance(bm25, BM25Index) else BM25Index()
         self.embedding_model = embedding_model or EmbeddingModel()
+        self._lock = ReadWriteLock()
+        # Set by every write; the next reader brings lazily built index state up to date
+        self._stale = True
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Hold the write lock and mark lazily built index state as stale."""
+        with self._lock.write():
+            self._stale = True
+            yield
+
+    @contextmanager
+    def _reading(self, keywords: bool = False) -> Iterator[None]:
+        """
+        Hold the read lock with all lazily built state up to date.
+        
+        Indexes train, group cells or merge buffered postings on first use.
+        That work is done here under the write lock, which is then downgraded
+        to a read lock, so concurrent searches themselves never mutate anything.
+        
+        Args:
+            keywords: Whether the BM25 index is needed (it is built if missing)
+        """
+        self._lock.acquire_read()
+        if self._stale or (keywords and self.bm25 is None):
+            self._lock.release_read()
+            with self._lock.write():
+                # Another reader may have prepared everything while this one waited
+                if keywords and self.bm25 is None:
+                    self._keyword_index()
+                    self._stale = True
+                if self._stale:
+                    self._prepare()
+                self._lock.acquire_read()
+        try:
+            yield
+        finally:
+            self._lock.release_read()
+
+    def _prepare(self) -> None:
+        """Bring every lazily derived structure up to date (write lock held)."""
+        self.store.live_rows
+        self.index.prepare(self.store)
+        if self.bm25 is not None:
+            self.bm25.prepare(self.store)
+        self._stale = False
 
-    def insert(self, key: str, vector: np.array, metadata: Optional[Dict[str, Any]] = None) -> None:
+    @property
+    def vectors(self) -> StoreView:
+        """Read-only ``key -> vector`` view over the underlying store."""
+        return StoreView(self.store, self.store.get_vector)
+
+    @property
+    def metadata(self) -> StoreView:
+        """Read-only ``key -> metadata`` view over the underlying store."""
+        return StoreView(self.store, self.store.get_metadata)
+
+    def insert(
+        self,
+        key: str,
+        vector: np.array,
+        metadata: Optional[Dict[str, Any]] = None,
+        id: Optional[RowId] = None,
+    ) -> None:
         """
         Insert a vector with optional metadata into the database.
         
@@ -41,16 +188,107 @@ class VectorDatabase:
             key: The text/key associated with this vector
             vector: The embedding vector
             metadata: Optional metadata dict (e.g., {'category': 'Exercise', 'source': 'doc1.txt'})
+            id: Optional stable id (int, str or UUID). Defaults to the key, so
+                inserting the same text twice overwrites it; an existing id is overwritten.
+        """
+        with self._writing():
+            row = self.store.add(key, vector, metadata, id)
+            self._index_rows(np.array([row], dtype=np.intp))
+
+    def insert_many(
+        self,
+        keys: List[str],
+        vectors: np.ndarray,
+        metadata_list: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[RowId]] = None,
+    ) -> None:
+        """
+        Insert a block of vectors with optional metadata in one pass.
+        
+        Args:
+            keys: The text/key of each vector
+            vectors: Array-like of shape (len(keys), d)
+            metadata_list: Optional list of metadata dicts (same length as keys)
+            ids: Optional stable ids (same length as keys). Default to the keys.
+        """
+        with self._writing():
+            rows = self.store.add_many(keys, vectors, metadata_list, ids)
+            self._index_rows(rows)
+
+    def upsert(
+        self,
+        ids: Sequence[RowId],
+        keys: List[str],
+        vectors: np.ndarray,
+        metadata_list: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """
+        Insert new ids and overwrite existing ones in place.
+        
+        Args:
+            ids: Stable ids (int, str or UUID), one per vector
+            keys: The text/key of each vector
+            vectors: Array-like of shape (len(ids), d)
+            metadata_list: Optional list of metadata dicts (same length as ids)
+        """
+        self.insert_many(keys, vectors, metadata_list, ids)
+
+    def delete(self, ids: Sequence[RowId]) -> int:
+        """
+        Delete vectors by id. Unknown ids are ignored.
+        
+        Deleted rows are tombstoned: they disappear from search results,
+        filters and stats at once, but keep their slot in the matrix and the
+        index until ``compact`` is called.
+        
+        Args:
+            ids: Ids to delete (the keys, for vectors inserted without ids)
+        
+        Returns:
+            Number of vectors deleted
+        """
+        with self._writing():
+            return len(self.store.delete(ids))
+
+    def compact(self) -> int:
+        """
+        Reclaim tombstoned rows: rebuild the dense matrix and remap the index.
+        
+        Returns:
+            Number of rows reclaimed
         """
-        self.vectors[key] = vector
-        self.metadata[key] = metadata or {}
+        with self._writing():
+            reclaimed = self.store.deleted_count
+            if reclaimed:
+                keep = self.store.compact()
+                self.index.compact(self.store, keep)
+                if self.bm25 is not None:
+                    self.bm25.compact(self.store, keep)
+            return reclaimed
+
+    def _index_rows(self, rows: np.ndarray) -> None:
+        """Add freshly stored rows to the search index and, if built, the BM25 index."""
+        self.index.add(self.store, rows)
+        if self.bm25 is not None:
+            self.bm25.add(self.store, rows)
+
+    def _keyword_index(self) -> BM25Index:
+        """The BM25 index, built over all live rows on first use."""
+        if self.bm25 is None:
+            self.bm25 = BM25Index()
+            self.bm25.add(self.store, self.store.live_rows)
+        return self.bm25
 
     def search(
         self,
         query_vector: np.array,
         k: int,
-        distance_measure: Callable = cosine_similarity,
-        metadata_filter: Optional[Dict[str, Any]] = None,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        return_ids: bool = False,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
     ) -> List[Tuple[str, float]]:
         """
         Search for the k most similar vectors.
@@ -58,57 +296,165 @@ class VectorDatabase:
         Args:
             query_vector: The query embedding vector
             k: Number of results to return
-            distance_measure: Function to measure similarity/distance
+            distance_measure: Metric function or name from AVAILABLE_METRICS
             metadata_filter: Optional dict to filter results by metadata
-                           e.g., {'category': 'Exercise'} to only return Exercise chunks
+                           e.g., {'category': 'Exercise'} to only return Exercise chunks.
+                           Also accepts operators ($in, $ne, $gt, $or, ...) and
+                           precompiled plans; see aimakerspace.filters.
+            return_ids: If True, return (id, score) instead of (key, score)
+            mmr: If True, re-rank the top ``fetch_k`` hits by Maximal Marginal
+                 Relevance to return k diverse results (see aimakerspace.mmr)
+            fetch_k: Number of hits MMR chooses from
+            lambda_mult: MMR trade-off, 1.0 = relevance only, 0.0 = diversity only
         
         Returns:
-            List of (key, score) tuples, sorted by similarity (highest first)
+            List of (key, score) tuples, sorted by similarity (highest first),
+            or in MMR selection order when ``mmr=True``
         """
-        # Filter by metadata if specified
-        if metadata_filter:
-            filtered_items = [
-                (key, vector) 
-                for key, vector in self.vectors.items()
-                if self._matches_filter(key, metadata_filter)
-            ]
-        else:
-            filtered_items = list(self.vectors.items())
+        query_block = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        return self.search_batch(
+            query_block, k, distance_measure, metadata_filter, return_ids, mmr, fetch_k, lambda_mult
+        )[0]
+
+    def search_batch(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        return_ids: bool = False,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        query_texts: Optional[Sequence[str]] = None,
+        mode: str = 'dense',
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search for the k most similar vectors for many queries at once.
+        
+        All queries are scored against the corpus as one (Q, N) matrix
+        product instead of Q separate passes, with an independent top-k per query.
         
-        # Calculate scores
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in filtered_items
-        ]
+        Args:
+            query_vectors: Query embeddings, shape (Q, d) or a list of vectors.
+                           May be None in 'bm25' mode without MMR.
+            k: Number of results to return per query
+            distance_measure: Metric function or name from AVAILABLE_METRICS
+            metadata_filter: Optional filter applied to every query (see search)
+            return_ids: If True, return (id, score) instead of (key, score)
+            mmr: If True, re-rank the top ``fetch_k`` hits by Maximal Marginal
+                 Relevance to return k diverse results (see aimakerspace.mmr)
+            fetch_k: Number of hits MMR chooses from
+            lambda_mult: MMR trade-off, 1.0 = relevance only, 0.0 = diversity only
+            query_texts: Query texts, one per query; required in 'bm25' and 'hybrid' mode
+            mode: 'dense' (vectors only), 'bm25' (keywords only) or 'hybrid'
+                  (both, fused; scores are then fusion scores)
+            fusion: Hybrid fusion method, 'rrf' (reciprocal rank) or 'weighted'
+                    (min-max normalized scores); see aimakerspace.fusion
+            alpha: Weight of the dense results in hybrid fusion; BM25 gets 1 - alpha
         
-        # Sort by score (descending) and return top k
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        Returns:
+            One list of (key, score) tuples per query, sorted by similarity (highest first)
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}.")
+        if mode != 'dense' and query_texts is None:
+            raise ValueError(f"Search mode {mode!r} requires query_texts.")
+        if mode == 'hybrid' and fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method {fusion!r}; expected one of {FUSION_METHODS}.")
+        queries = None
+        if query_vectors is not None:
+            queries = np.asarray(query_vectors, dtype=np.float32)
+            if queries.ndim == 1:
+                queries = queries.reshape(1, -1)
+        elif mode != 'bm25' or mmr:
+            raise ValueError("query_vectors are required unless mode='bm25' without MMR.")
+        
+        with self._reading(keywords=mode != 'dense'):
+            # Filter by metadata if specified: the compiled plan resolves the
+            # candidate rows from the inverted metadata index. Tombstoned rows
+            # are excluded from the universe, so they never match.
+            rows = None
+            live_rows = self.store.live_rows
+            if metadata_filter:
+                rows = compile_filter(metadata_filter).evaluate(
+                    self.store.metadata_index, self.store.metadata, live_rows
+                )
+            elif self.store.deleted_count:
+                rows = live_rows
+            # Nothing to score: indexes and kernels are never run on an empty candidate set
+            if len(live_rows) == 0 or (rows is not None and len(rows) == 0):
+                n_queries = len(queries) if queries is not None else len(query_texts)
+                return [[] for _ in range(n_queries)]
+        
+            # Hybrid fusion and MMR both choose from a deeper candidate list
+            n_candidates = max(k, fetch_k) if mmr or mode == 'hybrid' else k
+            if mode == 'bm25':
+                results = self.bm25.search(self.store, query_texts, n_candidates, rows)
+            else:
+                # The index scores the candidates and selects the top k without a full sort
+                results = self.index.search(self.store, queries, n_candidates, distance_measure, rows)
+            if mode == 'hybrid':
+                fuse = reciprocal_rank_fusion if fusion == 'rrf' else weighted_score_fusion
+                keyword_results = self.bm25.search(self.store, query_texts, n_candidates, rows)
+                results = [
+                    fuse([dense, keyword], n_candidates if mmr else k, weights=(alpha, 1 - alpha))
+                    for dense, keyword in zip(results, keyword_results)
+                ]
+            if mmr:
+                results = [
+                    self._mmr_rerank(query, result_rows, result_scores, k, lambda_mult)
+                    for query, (result_rows, result_scores) in zip(queries, results)
+                ]
+            keys = self.store.ids if return_ids else self.store.keys
+            return [
+                [(keys[row], float(score)) for row, score in zip(result_rows, result_scores)]
+                for result_rows, result_scores in results
+            ]
+
+    def _mmr_rerank(
+        self,
+        query: np.ndarray,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        k: int,
+        lambda_mult: float,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Pick k of the fetched rows by MMR over their stored vectors; scores are kept."""
+        selected = maximal_marginal_relevance(
+            query, self.store.matrix[rows], k, lambda_mult, self.store.norms[rows]
+        )
+        return rows[selected], scores[selected]
 
-    def _matches_filter(self, key: str, metadata_filter: Dict[str, Any]) -> bool:
+    def _matches_filter(self, key: str, metadata_filter: Union[Dict[str, Any], FilterPlan]) -> bool:
         """
         Check if a document's metadata matches the filter criteria.
         
         Args:
             key: The document key
-            metadata_filter: Dict of metadata key-value pairs to match
+            metadata_filter: Filter dict or compiled plan to match
         
         Returns:
             True if all filter criteria match, False otherwise
         """
-        doc_metadata = self.metadata.get(key, {})
-        return all(
-            doc_metadata.get(filter_key) == filter_value
-            for filter_key, filter_value in metadata_filter.items()
-        )
+        return compile_filter(metadata_filter).matches(self.get_metadata(key))
 
     def search_by_text(
         self,
         query_text: str,
         k: int,
-        distance_measure: Callable = cosine_similarity,
+        distance_measure: Union[str, Callable] = cosine_similarity,
         return_as_text: bool = False,
         category: Optional[str] = None,
-        metadata_filter: Optional[Dict[str, Any]] = None,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        mode: str = 'dense',
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
     ) -> List[Tuple[str, float]]:
         """
         Search using a text query (automatically generates embedding).
@@ -116,31 +462,205 @@ class VectorDatabase:
         Args:
             query_text: The search query text
             k: Number of results to return
-            distance_measure: Function to measure similarity
+            distance_measure: Metric function or name from AVAILABLE_METRICS
             return_as_text: If True, return only the text keys (no scores)
             category: Shorthand for filtering by category (same as metadata_filter={'category': category})
-            metadata_filter: Optional dict to filter by metadata
+            metadata_filter: Optional filter dict or compiled plan (see search)
+            mmr: If True, return k diverse results by MMR (see search)
+            fetch_k: Number of hits MMR (or hybrid fusion) chooses from
+            lambda_mult: MMR trade-off, 1.0 = relevance only, 0.0 = diversity only
+            mode: 'dense', 'bm25' (keywords only, no embedding call) or 'hybrid'
+            fusion: Hybrid fusion method, 'rrf' or 'weighted' (see search_batch)
+            alpha: Weight of the dense results in hybrid fusion; BM25 gets 1 - alpha
         
         Returns:
             List of (text, score) tuples, or list of text if return_as_text=True
         """
-        query_vector = self.embedding_model.get_embedding(query_text)
+        query_vector = None
+        if mode != 'bm25' or mmr:
+            query_vector = self.embedding_model.get_embedding(query_text)
+        
+        results = self.search_batch(
+            None if query_vector is None else [query_vector],
+            k,
+            distance_measure,
+            metadata_filter=self._with_category(metadata_filter, category),
+            mmr=mmr,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            query_texts=[query_text],
+            mode=mode,
+            fusion=fusion,
+            alpha=alpha,
+        )[0]
         
-        # Build metadata filter
-        if category and not metadata_filter:
-            metadata_filter = {'category': category}
-        elif category and metadata_filter:
-            metadata_filter = {**metadata_filter, 'category': category}
+        return [result[0] for result in results] if return_as_text else results
+
+    async def asearch(
+        self,
+        query_vector: np.array,
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        return_ids: bool = False,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+    ) -> List[Tuple[str, float]]:
+        """
+        Search for the k most similar vectors without blocking the event loop.
+        
+        The scoring runs in a worker thread; takes the same arguments as search.
+        
+        Returns:
+            List of (key, score) tuples, sorted by similarity (highest first)
+        """
+        return await asyncio.to_thread(
+            self.search, query_vector, k, distance_measure, metadata_filter, return_ids,
+            mmr, fetch_k, lambda_mult,
+        )
+
+    async def asearch_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        return_as_text: bool = False,
+        category: Optional[str] = None,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        mode: str = 'dense',
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+    ) -> List[Tuple[str, float]]:
+        """
+        Search using a text query without blocking the event loop.
+        
+        Awaits async_get_embedding instead of the blocking get_embedding and
+        runs the scoring in a worker thread; takes the same arguments as
+        search_by_text.
+        
+        Returns:
+            List of (text, score) tuples, or list of text if return_as_text=True
+        """
+        query_vector = None
+        if mode != 'bm25' or mmr:
+            query_vector = await self.embedding_model.async_get_embedding(query_text)
         
-        results = self.search(
-            query_vector, 
-            k, 
+        results = await asyncio.to_thread(
+            self.search_batch,
+            None if query_vector is None else [query_vector],
+            k,
             distance_measure,
-            metadata_filter=metadata_filter
+            metadata_filter=self._with_category(metadata_filter, category),
+            mmr=mmr,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            query_texts=[query_text],
+            mode=mode,
+            fusion=fusion,
+            alpha=alpha,
         )
+        results = results[0]
         
         return [result[0] for result in results] if return_as_text else results
 
+    @staticmethod
+    def _with_category(
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]],
+        category: Optional[str],
+    ) -> Optional[Union[Dict[str, Any], FilterPlan]]:
+        """Add the ``category`` shorthand to a filter dict or compiled plan."""
+        if not category:
+            return metadata_filter
+        if isinstance(metadata_filter, FilterPlan):
+            return combine_filters(metadata_filter, {'category': category})
+        return {**(metadata_filter or {}), 'category': category}
+
+    async def asearch_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        return_as_text: bool = False,
+        category: Optional[str] = None,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        mode: str = 'dense',
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search many text queries at once (async).
+        
+        Embeds every query with a single async_get_embeddings call and scores
+        them together with search_batch in a worker thread.
+        
+        Args:
+            query_texts: The search query texts
+            k: Number of results to return per query
+            distance_measure: Metric function or name from AVAILABLE_METRICS
+            return_as_text: If True, return only the text keys (no scores)
+            category: Shorthand for filtering by category (see search_by_text)
+            metadata_filter: Optional filter dict or compiled plan (see search)
+            mmr: If True, return k diverse results per query by MMR (see search)
+            fetch_k: Number of hits MMR (or hybrid fusion) chooses from
+            lambda_mult: MMR trade-off, 1.0 = relevance only, 0.0 = diversity only
+            mode: 'dense', 'bm25' (keywords only, no embedding call) or 'hybrid'
+            fusion: Hybrid fusion method, 'rrf' or 'weighted' (see search_batch)
+            alpha: Weight of the dense results in hybrid fusion; BM25 gets 1 - alpha
+        
+        Returns:
+            One result list per query, in the same order as query_texts
+        """
+        if not query_texts:
+            return []
+        query_vectors = None
+        if mode != 'bm25' or mmr:
+            query_vectors = await self.embedding_model.async_get_embeddings(list(query_texts))
+        
+        results = await asyncio.to_thread(
+            self.search_batch,
+            query_vectors, k, distance_measure, self._with_category(metadata_filter, category),
+            mmr=mmr, fetch_k=fetch_k, lambda_mult=lambda_mult,
+            query_texts=query_texts, mode=mode, fusion=fusion, alpha=alpha,
+        )
+        if return_as_text:
+            return [[result[0] for result in query_results] for query_results in results]
+        return results
+
+    def search_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: Union[str, Callable] = cosine_similarity,
+        return_as_text: bool = False,
+        category: Optional[str] = None,
+        metadata_filter: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+        mmr: bool = False,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        mode: str = 'dense',
+        fusion: str = 'rrf',
+        alpha: float = 0.5,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Search many text queries at once (sync wrapper around asearch_by_texts).
+        
+        Returns:
+            One result list per query, in the same order as query_texts
+        """
+        return asyncio.run(
+            self.asearch_by_texts(
+                query_texts, k, distance_measure, return_as_text, category, metadata_filter,
+                mmr, fetch_k, lambda_mult, mode, fusion, alpha,
+            )
+        )
+
     def retrieve_from_key(self, key: str) -> Optional[np.array]:
         """
         Retrieve a vector by its key.
@@ -151,7 +671,8 @@ class VectorDatabase:
         Returns:
             The vector if found, None otherwise
         """
-        return self.vectors.get(key, None)
+        with self._lock.read():
+            return self.store.get_vector(key)
     
     def get_metadata(self, key: str) -> Dict[str, Any]:
         """
@@ -163,12 +684,14 @@ class VectorDatabase:
         Returns:
             Metadata dict, or empty dict if not found
         """
-        return self.metadata.get(key, {})
+        with self._lock.read():
+            return self.store.get_metadata(key) or {}
 
     async def abuild_from_list(
         self, 
         list_of_text: List[str],
-        metadata_list: Optional[List[Dict[str, Any]]] = None
+        metadata_list: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[RowId]] = None,
     ) -> "VectorDatabase":
         """
         Build the database from a list of texts (async).
@@ -176,52 +699,422 @@ class VectorDatabase:
         Args:
             list_of_text: List of text documents to embed
             metadata_list: Optional list of metadata dicts (same length as list_of_text)
+            ids: Optional stable ids (same length as list_of_text). Without ids,
+                 identical texts share one entry.
         
         Returns:
             Self (for chaining)
         """
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
         
-        for i, (text, embedding) in enumerate(zip(list_of_text, embeddings)):
-            metadata = metadata_list[i] if metadata_list and i < len(metadata_list) else {}
-            self.insert(text, np.array(embedding), metadata)
+        # Norms / normalization are computed once for the whole block here
+        self._insert_embedded(list_of_text, embeddings, metadata_list, ids)
         
         return self
+
+    @property
+    def _embedding_model_name(self) -> str:
+        return getattr(
+            self.embedding_model, 'embeddings_model_name', type(self.embedding_model).__name__
+        )
+
+    def _insert_embedded(
+        self,
+        texts: List[str],
+        embeddings,
+        metadata_list: Optional[List[Dict[str, Any]]],
+        ids: Optional[Sequence[RowId]],
+    ) -> None:
+        """Insert freshly embedded texts, recording their content hashes."""
+        model_name = self._embedding_model_name
+        with self._writing():
+            rows = self.store.add_many(
+                texts,
+                embeddings,
+                metadata_list,
+                ids,
+                [content_hash(text, model_name) for text in texts],
+            )
+            self._index_rows(rows)
+
+    async def abuild_from_stream(
+        self,
+        stream: Union[AsyncIterable[Any], Iterable[Any]],
+        batch_size: int = 1024,
+        max_pending: int = 4,
+        checkpoint_dir: Optional[str] = None,
+        checkpoint_every: int = 50_000,
+    ) -> "VectorDatabase":
+        """
+        Build the database from a stream of chunks, inserting as batches finish (async).
+        
+        Chunks are grouped into batches of ``batch_size``. Each batch is
+        embedded in its own task and inserted as soon as it and every batch
+        before it are done, so insertion order follows the stream. Once
+        ``max_pending`` batches are queued behind the one being inserted,
+        reading from the stream pauses until the queue drains, so the
+        pipeline holds a bounded number of chunks however long the stream is.
+        
+        With ``checkpoint_dir``, inserted rows are also appended to a log
+        there, which is committed every ``checkpoint_every`` chunks together
+        with the number of stream items it covers (see aimakerspace.checkpoint).
+        Only new rows are written at a checkpoint; the whole database is
+        saved once, at the end. Calling this again with the same directory
+        and the same stream restores the last checkpoint (the snapshot
+        memory-mapped, the logged rows replayed) and skips the items it
+        already holds, so an interrupted build resumes where it stopped.
+        
+        Args:
+            stream: Async or plain iterable of chunks. Each item is a text, a
+                    (text, metadata) pair or a (text, metadata, id) triple.
+            batch_size: Chunks per embedding task and per insert
+            max_pending: Most batches in flight between the stream and the store
+            checkpoint_dir: Optional directory for resumable checkpoints
+            checkpoint_every: Chunks between checkpoints
+        
+        Returns:
+            Self (for chaining)
+        """
+        if batch_size < 1 or max_pending < 1:
+            raise ValueError("batch_size and max_pending must be at least 1.")
+        offset = 0
+        log = None
+        if checkpoint_dir is not None:
+            log = await asyncio.to_thread(SegmentLog, checkpoint_dir)
+            offset = await asyncio.to_thread(self._restore_checkpoint, log)
+        
+        # Each queued entry is a batch and the task embedding it; the bounded
+        # queue is what pushes back on the stream when embedding falls behind
+        pending: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        
+        async def produce() -> None:
+            position = 0
+            batch: List[Tuple[str, Optional[Dict[str, Any]], Optional[RowId]]] = []
+            try:
+                async for item in _aiter(stream):
+                    position += 1
+                    if position <= offset:
+                        continue
+                    batch.append(_stream_item(item))
+                    if len(batch) == batch_size:
+                        await enqueue(batch, position)
+                        batch = []
+                if batch:
+                    await enqueue(batch, position)
+            except asyncio.CancelledError:
+                raise
+            except BaseException:
+                # Let the consumer insert the batches already queued; re-raised by `await producer`
+                await pending.put(None)
+                raise
+            await pending.put(None)
+        
+        async def enqueue(batch, end: int) -> None:
+            task = asyncio.create_task(
+                self.embedding_model.async_get_embeddings([text for text, _, _ in batch])
+            )
+            try:
+                await pending.put((batch, end, task))
+            except BaseException:
+                task.cancel()
+                raise
+        
+        producer = asyncio.create_task(produce())
+        end = checkpointed = offset
+        try:
+            while True:
+                entry = await pending.get()
+                if entry is None:
+                    break
+                batch, end, task = entry
+                embeddings = await task
+                texts, metadata_list, ids = (list(column) for column in zip(*batch))
+                await asyncio.to_thread(self._insert_logged, log, texts, embeddings, metadata_list, ids)
+                if log is not None and end - checkpointed >= checkpoint_every:
+                    await asyncio.to_thread(log.commit, end)
+                    checkpointed = end
+            await producer
+            if log is not None and (end != checkpointed or log.segments):
+                await asyncio.to_thread(self._consolidate_checkpoint, log, end)
+        finally:
+            if log is not None:
+                log.close()
+            producer.cancel()
+            while not pending.empty():
+                entry = pending.get_nowait()
+                if entry is not None:
+                    entry[2].cancel()
+        
+        return self
+
+    def _insert_logged(
+        self,
+        log: Optional[SegmentLog],
+        texts: List[str],
+        embeddings,
+        metadata_list: List[Optional[Dict[str, Any]]],
+        ids: List[Optional[RowId]],
+    ) -> None:
+        """
+        Append a streamed batch to the checkpoint log, if any, then insert it.
+        
+        Logging first means a batch the log cannot record (e.g. metadata
+        that is not JSON serializable) never reaches the store.
+        """
+        if log is not None:
+            log.append(texts, embeddings, metadata_list, ids)
+        self._insert_embedded(
+            texts, embeddings, metadata_list, None if all(row_id is None for row_id in ids) else ids
+        )
+
+    def _consolidate_checkpoint(self, log: SegmentLog, offset: int) -> None:
+        """
+        Replace the logged segments by one snapshot of the whole database.
+        
+        The snapshot is written to a fresh subdirectory before the checkpoint
+        file is switched to it, so an interruption leaves the log usable.
+        """
+        log.commit(offset)
+        snapshot = f"snapshot-{offset}"
+        self.save(os.path.join(log.directory, snapshot))
+        log.set_snapshot(snapshot, offset)
+
+    def _restore_checkpoint(self, log: SegmentLog) -> int:
+        """
+        Bring the database to the state of the last checkpoint; return the stream items it covers.
+        
+        A fresh log starts from the current database: if that is not empty,
+        it is saved once as the base snapshot.
+        """
+        if log.empty:
+            if len(self.store):
+                self._consolidate_checkpoint(log, 0)
+            return 0
+        if log.snapshot is not None:
+            restored = type(self).load(os.path.join(log.directory, log.snapshot), self.embedding_model)
+        else:
+            restored = type(self)(
+                self.embedding_model,
+                normalize=self.store.normalize,
+                index=create_index(self.index.name, self.index.get_params()),
+                bm25=BM25Index(**self.bm25.get_params()) if self.bm25 is not None else False,
+            )
+        with self._writing():
+            self.store = restored.store
+            self.index = restored.index
+            self.bm25 = restored.bm25
+        for texts, vectors, metadata_list, ids in log.read_segments():
+            self._insert_embedded(
+                texts, vectors, metadata_list, None if all(row_id is None for row_id in ids) else ids
+            )
+        return log.offset
+
+    async def aupdate_from_list(
+        self,
+        list_of_text: List[str],
+        metadata_list: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[RowId]] = None,
+        delete_missing: bool = True,
+        scope: Optional[Union[Dict[str, Any], FilterPlan]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Incrementally sync the database with a list of texts (async).
+        
+        Each chunk is hashed together with the embedding model name. Chunks
+        whose id already holds the same hash are not re-embedded (only their
+        metadata is refreshed if it changed); new or changed chunks are
+        embedded in one batch; live chunks that are no longer in the list
+        are deleted. Embedding cost is proportional to churn, not corpus size.
+        
+        Args:
+            list_of_text: The current chunk texts
+            metadata_list: Optional list of metadata dicts (same length as list_of_text)
+            ids: Optional stable ids (same length as list_of_text). Default to the
+                 texts, so an edited chunk becomes one add plus one delete.
+            delete_missing: If True, delete chunks that disappeared from the list
+            scope: Optional filter limiting deletions to matching chunks, e.g.
+                   {'source': 'doc1.txt'} when syncing a single document
+        
+        Returns:
+            Diff summary: 'added', 'updated', 'metadata_updated' and 'deleted'
+            id lists, plus 'unchanged' and 'embedded' counts
+        """
+        if ids is not None and len(ids) != len(list_of_text):
+            raise ValueError(f"Got {len(list_of_text)} texts but {len(ids)} ids.")
+        row_ids = [as_row_id(row_id) for row_id in (list_of_text if ids is None else ids)]
+        
+        model_name = self._embedding_model_name
+        latest = {row_id: i for i, row_id in enumerate(row_ids)}  # last occurrence wins
+        summary = {'added': [], 'updated': [], 'metadata_updated': [], 'deleted': [], 'unchanged': 0}
+        to_embed = []
+        with self._writing():
+            # Ids that may be deleted are fixed before anything is inserted
+            candidates = self.store.live_rows
+            if scope:
+                candidates = compile_filter(scope).evaluate(
+                    self.store.metadata_index, self.store.metadata, candidates
+                )
+            candidate_ids = [self.store.ids[row] for row in candidates.tolist()]
+            
+            for row_id, i in latest.items():
+                text = list_of_text[i]
+                metadata = (metadata_list[i] if metadata_list and i < len(metadata_list) else None) or {}
+                row = self.store.row_of_id(row_id)
+                if row is None:
+                    summary['added'].append(row_id)
+                    to_embed.append(i)
+                elif self.store.content_hashes[row] != content_hash(text, model_name):
+                    summary['updated'].append(row_id)
+                    to_embed.append(i)
+                elif self.store.metadata[row] != metadata:
+                    self.store.update_metadata(row, metadata)
+                    summary['metadata_updated'].append(row_id)
+                else:
+                    summary['unchanged'] += 1
+        
+        # No lock is held while embedding, so searches keep being served
+
+        if to_embed:
+            texts = [list_of_text[i] for i in to_embed]
+            embeddings = await self.embedding_model.async_get_embeddings(texts)
+            self._insert_embedded(
+                texts,
+                embeddings,
+                [metadata_list[i] if metadata_list and i < len(metadata_list) else None for i in to_embed],
+                [row_ids[i] for i in to_embed],
+            )
+        summary['embedded'] = len(to_embed)
+        
+        if delete_missing:
+            with self._writing():
+                stale = [row_id for row_id in candidate_ids if row_id not in latest]
+                summary['deleted'] = [self.store.ids[row] for row in self.store.delete(stale).tolist()]
+        return summary
     
+    def save(self, path: str) -> None:
+        """
+        Save the database to a directory so it can be reloaded without re-embedding.
+        
+        Args:
+            path: Directory to write into (created if missing)
+        """
+        # Lazily built state (e.g. buffered BM25 postings) is merged before saving
+        with self._reading():
+            self.store.save(path)
+            with atomic_write(os.path.join(path, _INDEX_CONFIG_FILE), "w", encoding="utf-8") as f:
+                json.dump({'name': self.index.name, 'params': self.index.get_params()}, f)
+            with atomic_write(os.path.join(path, _INDEX_STATE_FILE)) as f:
+                np.savez(f, **self.index.get_state())
+            bm25_files = [os.path.join(path, name) for name in (_BM25_CONFIG_FILE, _BM25_STATE_FILE)]
+            if self.bm25 is None:
+                # Never leave a keyword index from an earlier save next to new vectors
+                for bm25_file in bm25_files:
+                    if os.path.exists(bm25_file):
+                        os.remove(bm25_file)
+            else:
+                with atomic_write(bm25_files[0], "w", encoding="utf-8") as f:
+                    json.dump({'params': self.bm25.get_params()}, f)
+                with atomic_write(bm25_files[1]) as f:
+                    np.savez(f, **self.bm25.get_state())
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding_model: EmbeddingModel = None,
+        mmap: bool = True,
+    ) -> "VectorDatabase":
+        """
+        Load a database written by ``save``.
+        
+        With ``mmap=True`` the vector matrix is memory-mapped read-only, so
+        startup is near-instant and worker processes loading the same path
+        share one page-cached copy. The first insert copies it into memory.
+        
+        Args:
+            path: Directory written by ``save``
+            embedding_model: Model for text queries. Defaults to EmbeddingModel().
+            mmap: Whether to memory-map the vectors instead of reading them
+        
+        Returns:
+            The loaded VectorDatabase
+        """
+        store = VectorStore.load(path, mmap=mmap)
+        index = None
+        config_path = os.path.join(path, _INDEX_CONFIG_FILE)
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            index = create_index(config['name'], config['params'])
+            with np.load(os.path.join(path, _INDEX_STATE_FILE)) as state:
+                index.set_state(dict(state))
+        bm25 = None
+        bm25_config_path = os.path.join(path, _BM25_CONFIG_FILE)
+        if os.path.exists(bm25_config_path):
+            with open(bm25_config_path, "r", encoding="utf-8") as f:
+                bm25 = BM25Index(**json.load(f)['params'])
+            with np.load(os.path.join(path, _BM25_STATE_FILE)) as state:
+                bm25.set_state(dict(state))
+        vector_db = cls(embedding_model, normalize=store.normalize, index=index, bm25=bm25 or False)
+        vector_db.store = store
+        return vector_db
+
     def get_categories(self) -> List[str]:
         """
         Get all unique categories in the database.
         
+        Read from the running per-value counts of the metadata index, so the
+        cost does not grow with the number of documents.
+        
         Returns:
             List of unique category values
         """
-        categories = set()
-        for meta in self.metadata.values():
-            if 'category' in meta:
-                categories.add(meta['category'])
-        return sorted(list(categories))
+        with self._lock.read():
+            return sorted(self.store.metadata_index.value_counts('category'))
     
-    def get_stats(self) -> Dict[str, Any]:
+    def get_stats(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        histograms: bool = False,
+    ) -> Dict[str, Any]:
         """
         Get statistics about the database.
         
+        Every figure comes from counters that inserts and deletes keep up to
+        date, so polling this is cheap regardless of corpus size.
+        
+        Args:
+            fields: Optional metadata fields to report per-value counts for
+                    (under 'field_counts'); 'category' is always reported
+            histograms: If True, add the vector norm and chunk length (characters)
+                        distributions as lists of {'lower', 'upper', 'count'} bins
+        
         Returns:
             Dict with stats like total documents, categories, etc.
         """
-        stats = {
-            'total_documents': len(self.vectors),
-            'categories': self.get_categories(),
-            'category_counts': {}
-        }
-        
-        # Count documents per category
-        for meta in self.metadata.values():
-            cat = meta.get('category', 'Unknown')
-            stats['category_counts'][cat] = stats['category_counts'].get(cat, 0) + 1
+        with self._lock.read():
+            metadata_index = self.store.metadata_index
+            category_counts = metadata_index.value_counts('category')
+            # Documents without a category are reported as 'Unknown'
+            uncategorized = self.store.live_count - sum(category_counts.values())
+            if uncategorized:
+                category_counts['Unknown'] = category_counts.get('Unknown', 0) + uncategorized
+            stats = {
+                'total_documents': self.store.live_count,
+                'deleted_pending_compaction': self.store.deleted_count,
+                'vector_bytes': self.store.nbytes,
+                'categories': sorted(metadata_index.value_counts('category')),
+                'category_counts': category_counts,
+                'metadata_fields': metadata_index.fields(),
+            }
+            if fields:
+                stats['field_counts'] = {field: metadata_index.value_counts(field) for field in fields}
+            if histograms:
+                stats['norm_histogram'] = self.store.norm_histogram.to_list()
+                stats['length_histogram'] = self.store.length_histogram.to_list()
         
         return stats
 
-
 if __name__ == "__main__":
     # Demo usage
     list_of_text = [
@@ -0,0 +1,65 @@
+"""
+Recall-vs-latency report: HNSW graph index vs. exact (flat) search.
+
+Uses the same synthetic clustered vectors as benchmark_ivf.py (no API key
+needed). The graph is built once; ``ef_search`` is then swept to show the
+recall/latency trade-off.
+
+Usage:
+    uv run python benchmark_hnsw.py
+    uv run python benchmark_hnsw.py --rows 50000 --M 32 --ef-construction 200
+"""
+
+import argparse
+import time
+import numpy as np
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.indexes import FlatIndex, HNSWIndex
+from benchmark_ivf import make_clustered_data, recall_at_k, time_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--M", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--metric", default="cosine", choices=["cosine", "dot"])
+    args = parser.parse_args()
+
+    data = make_clustered_data(args.rows + args.queries, args.dim, n_clusters=200)
+    corpus, queries = data[: args.rows], data[args.rows:]
+
+    store = VectorStore()
+    rows = store.add_many([f"doc-{i}" for i in range(args.rows)], corpus)
+
+    flat = FlatIndex()
+    exact, exact_ms = time_queries(flat, store, queries, args.k, args.metric)
+
+    hnsw = HNSWIndex(M=args.M, ef_construction=args.ef_construction, metric=args.metric)
+    start = time.perf_counter()
+    hnsw.add(store, rows)
+    build_s = time.perf_counter() - start
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k} metric={args.metric}")
+    print(f"HNSW build (M={args.M}, ef_construction={args.ef_construction}): {build_s:.1f}s\n")
+    print(f"{'index':<16} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'QPS':>9}")
+    print("-" * 57)
+    print(
+        f"{'flat (exact)':<16} {1.0:>10.3f} {np.percentile(exact_ms, 50):>9.2f} "
+        f"{np.percentile(exact_ms, 95):>9.2f} {1000 / exact_ms.mean():>9.0f}"
+    )
+    for ef_search in (10, 20, 40, 80, 160):
+        hnsw.ef_search = ef_search
+        approximate, hnsw_ms = time_queries(hnsw, store, queries, args.k, args.metric)
+        label = f"hnsw ef={ef_search}"
+        print(
+            f"{label:<16} {recall_at_k(approximate, exact):>10.3f} {np.percentile(hnsw_ms, 50):>9.2f} "
+            f"{np.percentile(hnsw_ms, 95):>9.2f} {1000 / hnsw_ms.mean():>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
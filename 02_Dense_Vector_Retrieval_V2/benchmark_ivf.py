@@ -0,0 +1,89 @@
+"""
+Recall-vs-latency report: IVF approximate index vs. exact (flat) search.
+
+Uses synthetic clustered vectors (no API key needed) so the same data can be
+searched by both indexes. Recall@k is the fraction of the exact top-k that
+the IVF index also returns.
+
+Usage:
+    uv run python benchmark_ivf.py
+    uv run python benchmark_ivf.py --rows 200000 --dim 768 --n-lists 512
+"""
+
+import argparse
+import time
+import numpy as np
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.indexes import FlatIndex, IVFIndex
+
+
+def make_clustered_data(n_rows: int, dim: int, n_clusters: int, seed: int = 0) -> np.ndarray:
+    """Gaussian mixture on the unit sphere, a rough stand-in for text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    data = centers[rng.integers(0, n_clusters, n_rows)] + 1.5 * rng.normal(size=(n_rows, dim))
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+
+
+def time_queries(index, store, queries, k, metric):
+    """Search one query at a time; return results and per-query latencies (ms)."""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.extend(index.search(store, query[None, :], k, metric))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+def recall_at_k(approximate, exact) -> float:
+    hits = [
+        len(set(approx_rows.tolist()) & set(exact_rows.tolist())) / max(1, len(exact_rows))
+        for (approx_rows, _), (exact_rows, _) in zip(approximate, exact)
+    ]
+    return float(np.mean(hits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=256)
+    parser.add_argument("--metric", default="cosine")
+    args = parser.parse_args()
+
+    data = make_clustered_data(args.rows + args.queries, args.dim, n_clusters=1000)
+    corpus, queries = data[: args.rows], data[args.rows:]
+
+    store = VectorStore()
+    store.add_many([f"doc-{i}" for i in range(args.rows)], corpus)
+
+    flat = FlatIndex()
+    exact, exact_ms = time_queries(flat, store, queries, args.k, args.metric)
+
+    ivf = IVFIndex(n_lists=args.n_lists, metric=args.metric)
+    start = time.perf_counter()
+    ivf.train(store)
+    train_s = time.perf_counter() - start
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k} metric={args.metric}")
+    print(f"IVF training (n_lists={args.n_lists}): {train_s:.1f}s\n")
+    print(f"{'index':<16} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'QPS':>9}")
+    print("-" * 57)
+    print(
+        f"{'flat (exact)':<16} {1.0:>10.3f} {np.percentile(exact_ms, 50):>9.2f} "
+        f"{np.percentile(exact_ms, 95):>9.2f} {1000 / exact_ms.mean():>9.0f}"
+    )
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        ivf.nprobe = nprobe
+        approximate, ivf_ms = time_queries(ivf, store, queries, args.k, args.metric)
+        label = f"ivf nprobe={nprobe}"
+        print(
+            f"{label:<16} {recall_at_k(approximate, exact):>10.3f} {np.percentile(ivf_ms, 50):>9.2f} "
+            f"{np.percentile(ivf_ms, 95):>9.2f} {1000 / ivf_ms.mean():>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
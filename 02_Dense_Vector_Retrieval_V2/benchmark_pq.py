@@ -0,0 +1,71 @@
+"""
+Memory / recall / latency report: product quantization (PQ, IVF-PQ) vs. float32 search.
+
+Uses the same synthetic clustered vectors as benchmark_ivf.py (no API key
+needed). Bytes/vector is the size of one PQ code (``n_subvectors`` bytes)
+against ``4 * dim`` bytes for float32.
+
+Usage:
+    uv run python benchmark_pq.py
+    uv run python benchmark_pq.py --rows 200000 --dim 768 --n-lists 512
+"""
+
+import argparse
+import time
+import numpy as np
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.indexes import FlatIndex, PQIndex
+from benchmark_ivf import make_clustered_data, recall_at_k, time_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-lists", type=int, default=256)
+    parser.add_argument("--metric", default="cosine")
+    args = parser.parse_args()
+
+    data = make_clustered_data(args.rows + args.queries, args.dim, n_clusters=1000)
+    corpus, queries = data[: args.rows], data[args.rows:]
+
+    store = VectorStore()
+    store.add_many([f"doc-{i}" for i in range(args.rows)], corpus)
+
+    exact, exact_ms = time_queries(FlatIndex(), store, queries, args.k, args.metric)
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k} metric={args.metric}\n")
+    print(f"{'index':<42} {'B/vec':>6} {'train s':>8} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'QPS':>7}")
+    print("-" * 87)
+    print(
+        f"{'float32 (exact)':<42} {4 * args.dim:>6} {0:>8.1f} {1.0:>10.3f} "
+        f"{np.percentile(exact_ms, 50):>9.2f} {1000 / exact_ms.mean():>7.0f}"
+    )
+    configs = [
+        ("pq m=32", dict(n_subvectors=32), [{}]),
+        ("pq m=64", dict(n_subvectors=64), [{}, {'rescore': True}]),
+        (f"ivf-pq m=64 lists={args.n_lists}", dict(n_subvectors=64, n_lists=args.n_lists),
+         [{'nprobe': 8}, {'nprobe': 16}, {'nprobe': 16, 'rescore': True}]),
+    ]
+    for label, params, variants in configs:
+        index = PQIndex(metric=args.metric, **params)
+        start = time.perf_counter()
+        index.train(store)
+        train_s = time.perf_counter() - start
+        for variant in variants:
+            for name, value in variant.items():
+                setattr(index, name, value)
+            approximate, index_ms = time_queries(index, store, queries, args.k, args.metric)
+            suffix = "".join(f" {name}={value}" for name, value in variant.items() if name != 'rescore')
+            suffix += " + rescore" if variant.get('rescore') else ""
+            print(
+                f"{label + suffix:<42} {index.n_subvectors:>6} {train_s:>8.1f} "
+                f"{recall_at_k(approximate, exact):>10.3f} {np.percentile(index_ms, 50):>9.2f} "
+                f"{1000 / index_ms.mean():>7.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Memory / recall / latency report: scalar-quantized codes vs. float32 search.
+
+Uses the same synthetic clustered vectors as benchmark_ivf.py (no API key
+needed). The int8 codes are searched with and without the
+exact float32 re-score of the top ``k * rescore_factor`` candidates.
+
+Usage:
+    uv run python benchmark_quantization.py
+    uv run python benchmark_quantization.py --rows 200000 --dim 1536
+"""
+
+import argparse
+import numpy as np
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.indexes import FlatIndex, ScalarQuantizedIndex
+from benchmark_ivf import make_clustered_data, recall_at_k, time_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--metric", default="cosine")
+    args = parser.parse_args()
+
+    data = make_clustered_data(args.rows + args.queries, args.dim, n_clusters=1000)
+    corpus, queries = data[: args.rows], data[args.rows:]
+
+    store = VectorStore()
+    store.add_many([f"doc-{i}" for i in range(args.rows)], corpus)
+
+    exact, exact_ms = time_queries(FlatIndex(), store, queries, args.k, args.metric)
+
+    print(f"rows={args.rows} dim={args.dim} queries={args.queries} k={args.k} metric={args.metric}\n")
+    print(f"{'index':<22} {'MB':>8} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'QPS':>9}")
+    print("-" * 72)
+    print(
+        f"{'float32 (exact)':<22} {store.matrix.nbytes / 2**20:>8.1f} {1.0:>10.3f} "
+        f"{np.percentile(exact_ms, 50):>9.2f} {np.percentile(exact_ms, 95):>9.2f} {1000 / exact_ms.mean():>9.0f}"
+    )
+    for rescore in (False, True):
+        index = ScalarQuantizedIndex("int8", rescore=rescore, rescore_factor=args.rescore_factor)
+        index.train(store)
+        approximate, index_ms = time_queries(index, store, queries, args.k, args.metric)
+        label = f"int8{' + rescore' if rescore else ''}"
+        print(
+            f"{label:<22} {index.codes.nbytes / 2**20:>8.1f} {recall_at_k(approximate, exact):>10.3f} "
+            f"{np.percentile(index_ms, 50):>9.2f} {np.percentile(index_ms, 95):>9.2f} "
+            f"{1000 / index_ms.mean():>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
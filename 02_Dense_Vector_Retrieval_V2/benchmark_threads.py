@@ -0,0 +1,87 @@
+"""
+Latency report: thread-parallel blocked exact search vs. single-threaded.
+
+Random vectors are generated in float32 chunks (no API key needed), so
+large corpora fit in memory. Each corpus size is searched with FlatIndex at
+several ``workers`` settings; results are identical, only latency changes.
+The "vs. 1" columns are latency ratios against the first ``workers`` setting.
+They only measure a parallel speedup if the machine has at least as many
+cores as workers.
+
+Usage:
+    uv run python benchmark_threads.py
+    uv run python benchmark_threads.py --rows 100000 1000000 5000000 --dim 384 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.indexes import FlatIndex
+
+_GENERATE_CHUNK = 100_000
+
+
+def make_store(n_rows: int, dim: int, seed: int = 0) -> VectorStore:
+    rng = np.random.default_rng(seed)
+    store = VectorStore(dimension=dim, initial_capacity=n_rows)
+    for start in range(0, n_rows, _GENERATE_CHUNK):
+        size = min(_GENERATE_CHUNK, n_rows - start)
+        keys = [f"doc-{i}" for i in range(start, start + size)]
+        store.add_many(keys, rng.standard_normal((size, dim), dtype=np.float32))
+    return store
+
+
+def time_search(index, store, queries, k, metric, batch):
+    """Per-call latencies (ms), one query per call or all queries in one batch."""
+    blocks = [queries] if batch else [query[None, :] for query in queries]
+    index.search(store, blocks[0], k, metric)  # warm up the thread pool
+    latencies = []
+    for block in blocks:
+        start = time.perf_counter()
+        index.search(store, block, k, metric)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=16, help="queries per batched call")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--metric", default="cosine")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    print(f"cpus={cpus} dim={args.dim} k={args.k} metric={args.metric}")
+    if cpus < max(args.workers):
+        print(f"warning: only {cpus} CPU core(s) for up to {max(args.workers)} workers; "
+              "the ratios below do not measure a parallel speedup")
+    print()
+    print(f"{'rows':>9} {'workers':>8} {'1-query p50 ms':>15} {'vs. 1':>8} {'batch-' + str(args.batch) + ' ms':>12} {'vs. 1':>8}")
+    print("-" * 66)
+    rng = np.random.default_rng(1)
+    for n_rows in args.rows:
+        store = make_store(n_rows, args.dim)
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        batch = queries[: args.batch]
+        baseline = None
+        for workers in args.workers:
+            index = FlatIndex(workers=workers)
+            single = np.percentile(time_search(index, store, queries, args.k, args.metric, batch=False), 50)
+            batched = time_search(index, store, batch, args.k, args.metric, batch=True)[0]
+            if baseline is None:
+                baseline = (single, batched)
+            print(
+                f"{n_rows:>9} {workers:>8} {single:>15.2f} {baseline[0] / single:>7.2f}x "
+                f"{batched:>12.2f} {baseline[1] / batched:>7.2f}x"
+            )
+        del store
+
+
+if __name__ == "__main__":
+    main()
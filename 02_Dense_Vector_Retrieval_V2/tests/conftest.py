@@ -0,0 +1,93 @@
+"""Shared fixtures: a deterministic offline embedding model and small databases."""
+
+import asyncio
+import hashlib
+import time
+import types
+import numpy as np
+import pytest
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vectordatabase import VectorDatabase
+
+DIMENSION = 16
+
+
+def fake_vector(text: str) -> list:
+    """Deterministic pseudo-random vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32).tolist()
+
+
+class FakeEmbeddingModel:
+    """Offline stand-in for EmbeddingModel that counts its calls."""
+
+    embeddings_model_name = "fake-embedding"
+
+    def __init__(self):
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def get_embeddings(self, list_of_text):
+        self.calls += 1
+        self.texts_embedded += len(list_of_text)
+        return [fake_vector(text) for text in list_of_text]
+
+    def get_embedding(self, text):
+        return self.get_embeddings([text])[0]
+
+    async def async_get_embeddings(self, list_of_text):
+        return self.get_embeddings(list_of_text)
+
+    async def async_get_embedding(self, text):
+        return self.get_embedding(text)
+
+
+@pytest.fixture
+def embedding_model():
+    return FakeEmbeddingModel()
+
+
+def make_db(n: int = 200, index=None, embedding_model=None, **kwargs) -> VectorDatabase:
+    """A database of ``n`` chunks with 'category' and 'year' metadata."""
+    vector_db = VectorDatabase(embedding_model=embedding_model or FakeEmbeddingModel(), index=index, **kwargs)
+    texts = [f"chunk {i} about topic {i % 7}" for i in range(n)]
+    metadata = [{'category': ('A', 'B', 'C')[i % 3], 'year': 2000 + i % 20} for i in range(n)]
+    vector_db.insert_many(texts, [fake_vector(text) for text in texts], metadata)
+    return vector_db
+
+
+def response(texts):
+    """Embeddings response whose vectors encode the length of each text."""
+    return types.SimpleNamespace(
+        data=[types.SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in texts],
+        usage=None,
+    )
+
+
+class FakeEmbeddings:
+    """Records every request; the async endpoint answers after a short delay."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.requests = []
+
+    async def acreate(self, input, model, **kwargs):
+        self.requests.append(list(input))
+        await asyncio.sleep(self.delay)
+        return response(input)
+
+    def create(self, input, model, **kwargs):
+        self.requests.append(list(input))
+        time.sleep(self.delay)
+        return response(input)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    embedding_model = EmbeddingModel()
+    embeddings = FakeEmbeddings()
+    embedding_model.async_client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=embeddings.acreate))
+    embedding_model.client = types.SimpleNamespace(embeddings=types.SimpleNamespace(create=embeddings.create))
+    embedding_model.fake = embeddings
+    return embedding_model
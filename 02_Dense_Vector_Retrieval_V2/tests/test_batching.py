@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from aimakerspace.openai_utils import batching
+from aimakerspace.openai_utils.batching import TokenCounter, combine_pieces, plan_batches
+
+
+@pytest.fixture
+def byte_counter(monkeypatch):
+    """Counter without tiktoken: one token per UTF-8 byte."""
+    monkeypatch.setattr(batching, "_load_encoding", lambda model_name: None)
+    with pytest.warns(RuntimeWarning, match="tiktoken"):
+        return TokenCounter("text-embedding-3-small")
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["0123456789abcdef" * 2000, "日本語のテキスト" * 2000, "🙂" * 5000],
+    ids=["hex", "cjk", "emoji"],
+)
+def test_fallback_never_undercounts(byte_counter, text):
+    assert byte_counter.count(text) >= len(text)
+    truncated = byte_counter.truncate(text, 8191)
+    assert len(truncated.encode("utf-8")) <= 8191 and text.startswith(truncated)
+    pieces = byte_counter.split(text, 8191)
+    assert "".join(pieces) == text
+    assert all(byte_counter.count(piece) <= 8191 for piece in pieces)
+
+
+def test_pack_by_tokens_and_cap_inputs(byte_counter):
+    texts = ["a" * 30, "b" * 60, "c" * 150, "d" * 3, "e" * 9, "f", "g", "h"]
+    batches, owners, counts = plan_batches(
+        texts, byte_counter, max_tokens_per_input=100, max_tokens_per_request=100, max_batch_size=4
+    )
+    assert [len(batch) for batch, _ in batches] == [2, 1, 4, 1]
+    assert all(tokens <= 100 for _, tokens in batches)
+    assert batches[1][0][0] == "c" * 100
+    assert owners.tolist() == list(range(8))
+
+    with pytest.raises(ValueError):
+        plan_batches(texts, byte_counter, max_tokens_per_input=100, oversize='error')
+
+
+def test_split_pieces_are_recombined(byte_counter):
+    batches, owners, counts = plan_batches(["x" * 250, "y"], byte_counter, max_tokens_per_input=100, oversize='split')
+    assert owners.tolist() == [0, 0, 0, 1] and counts.tolist() == [100, 100, 50, 1]
+    vectors = [[1.0, 0.0], [1.0, 0.0], [0.0, 1.0], [0.3, 0.4]]
+    combined = combine_pieces(vectors, owners, counts, 2)
+    np.testing.assert_allclose(combined[0], np.array([200, 50]) / np.hypot(200, 50))
+    assert combined[1] == [0.3, 0.4]
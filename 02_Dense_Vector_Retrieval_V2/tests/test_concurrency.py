@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+import pytest
+from aimakerspace.indexes import IVFIndex
+from aimakerspace.rwlock import ReadWriteLock
+from conftest import fake_vector, make_db
+
+TIMEOUT = 10
+
+
+class Worker(threading.Thread):
+    """Daemon thread that keeps the exception its target raised."""
+
+    def __init__(self, target, *args):
+        super().__init__(daemon=True)
+        self.target, self.args, self.error = target, args, None
+
+    def run(self):
+        try:
+            self.target(*self.args)
+        except BaseException as error:
+            self.error = error
+
+
+def start(target, *args):
+    thread = Worker(target, *args)
+    thread.start()
+    return thread
+
+
+def wait_for_writer(lock):
+    """Wait until a writer thread is queued on the lock."""
+    deadline = time.monotonic() + TIMEOUT
+    while not lock._waiting_writers:
+        assert time.monotonic() < deadline, "writer never queued"
+        time.sleep(0.001)
+
+
+def join_all(threads):
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), "threads deadlocked"
+    for thread in threads:
+        if thread.error is not None:
+            raise thread.error
+
+
+def test_readers_hold_the_lock_together():
+    lock = ReadWriteLock()
+    # Every reader waits inside the lock for all the others, so this only
+    # completes if they hold it at the same time
+    barrier = threading.Barrier(4, timeout=TIMEOUT)
+
+    def read():
+        with lock.read():
+            barrier.wait()
+
+    join_all([start(read) for _ in range(4)])
+
+
+def test_writer_excludes_readers():
+    lock = ReadWriteLock()
+    entered = threading.Event()
+
+    def read():
+        with lock.read():
+            entered.set()
+
+    with lock.write():
+        reader = start(read)
+        assert not entered.wait(0.2)
+    assert entered.wait(TIMEOUT)
+    join_all([reader])
+
+
+def test_waiting_writer_blocks_new_readers():
+    lock = ReadWriteLock()
+    events = []
+
+    def write():
+        with lock.write():
+            events.append('writer')
+
+    def read():
+        with lock.read():
+            events.append('reader')
+
+    lock.acquire_read()
+    writer = start(write)
+    wait_for_writer(lock)
+    reader = start(read)
+    time.sleep(0.1)
+    assert not events
+    lock.release_read()
+    join_all([writer, reader])
+    assert events == ['writer', 'reader']
+
+
+def test_downgrade_leaves_no_gap_for_another_writer():
+    lock = ReadWriteLock()
+    events = []
+
+    def write():
+        with lock.write():
+            events.append('other writer')
+
+    lock.acquire_write()
+    lock.acquire_read()
+    lock.release_write()
+    writer = start(write)
+    wait_for_writer(lock)
+    assert not events
+    events.append('downgraded reader')
+    lock.release_read()
+    join_all([writer])
+    assert events == ['downgraded reader', 'other writer']
+
+
+def test_read_lock_cannot_be_upgraded():
+    lock = ReadWriteLock()
+    with lock.read():
+        with pytest.raises(RuntimeError):
+            lock.acquire_write()
+    # The failed upgrade leaves the lock usable
+    with lock.write():
+        with lock.read():
+            pass
+
+
+def test_stale_database_is_prepared_once_for_concurrent_readers():
+    vector_db = make_db(300, index=IVFIndex(n_lists=8, nprobe=8))
+    prepare = vector_db.index.prepare
+    calls = []
+
+    def counting_prepare(store):
+        calls.append(threading.get_ident())
+        prepare(store)
+
+    lock = vector_db._lock
+    acquire_write = lock.acquire_write
+    stale_readers = threading.Barrier(6, timeout=TIMEOUT)
+
+    def acquire_write_together():
+        # Every reader has found the database stale before the first one prepares it
+        stale_readers.wait()
+        acquire_write()
+
+    vector_db.index.prepare = counting_prepare
+    lock.acquire_write = acquire_write_together
+    query = fake_vector("chunk 5 about topic 5")
+    results = []
+
+    join_all([start(lambda: results.append(vector_db.search(query, k=5))) for _ in range(6)])
+    assert len(calls) == 1
+    assert len(results) == 6 and all(result == results[0] for result in results)
+
+
+def test_concurrent_reads_and_writes_do_not_deadlock():
+    vector_db = make_db(100)
+
+    def search(i):
+        for j in range(20):
+            query = fake_vector(f"query {i} {j}")
+            vector_db.search(query, k=5, mmr=j % 2 == 0)
+            vector_db.search_by_text(f"topic {j % 7}", k=5, mode=('dense', 'bm25', 'hybrid')[j % 3])
+
+    def write(i):
+        for j in range(10):
+            texts = [f"writer {i} batch {j} item {n}" for n in range(5)]
+            vector_db.insert_many(texts, [fake_vector(text) for text in texts], ids=texts)
+            assert vector_db.delete(texts[:2]) == 2
+            if j % 5 == 4:
+                vector_db.compact()
+
+    join_all([start(search, i) for i in range(4)] + [start(write, i) for i in range(2)])
+    assert vector_db.get_stats()['total_documents'] == 100 + 2 * 10 * 3
+
+
+def test_async_searches_run_concurrently():
+    vector_db = make_db(100)
+    search = vector_db.index.search
+    barrier = threading.Barrier(4, timeout=TIMEOUT)
+
+    def waiting_search(*args):
+        # Only returns once all four searches are inside the read lock together
+        barrier.wait()
+        return search(*args)
+
+    vector_db.index.search = waiting_search
+    queries = [fake_vector(f"query {i}") for i in range(4)]
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(*(vector_db.asearch(query, k=3) for query in queries)), TIMEOUT
+        )
+
+    results = asyncio.run(main())
+    vector_db.index.search = search
+    assert results == [vector_db.search(query, k=3) for query in queries]
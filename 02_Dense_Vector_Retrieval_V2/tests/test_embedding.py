@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+
+def test_async_callers_share_one_request(model):
+    async def main():
+        return await asyncio.gather(
+            *[model.async_get_embedding("faq") for _ in range(10)],
+            model.async_get_embeddings(["faq", "ab", "ab", "xyz"]),
+        )
+
+    results = asyncio.run(main())
+    assert results[:10] == [[3.0, 1.0]] * 10
+    assert results[10] == [[3.0, 1.0], [2.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert sorted(map(sorted, model.fake.requests)) == [["ab", "xyz"], ["faq"]]
+    assert model.coalesced == 10
+    assert model._in_flight == {}
+
+
+def test_sync_threads_share_one_request(model):
+    results = [None] * 4
+
+    def worker(i):
+        results[i] = model.get_embedding("sync text")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [[9.0, 1.0]] * 4
+    assert model.fake.requests == [["sync text"]]
+
+
+def test_sync_call_on_loop_thread_does_not_deadlock(model):
+    async def main():
+        pending = asyncio.ensure_future(model.async_get_embedding("hot"))
+        await asyncio.sleep(0.01)
+        # Blocks the loop that owns the in-flight request for "hot"
+        vector = model.get_embedding("hot")
+        return vector, await pending
+
+    vector, pending_vector = asyncio.run(asyncio.wait_for(main(), timeout=5))
+    assert vector == pending_vector == [3.0, 1.0]
+    assert model._in_flight == {}
+
+
+def test_cancelled_owner_does_not_fail_waiters(model):
+    async def main():
+        owner = asyncio.ensure_future(model.async_get_embedding("shared"))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(model.async_get_embedding("shared"))
+        await asyncio.sleep(0)
+        owner.cancel()
+        return await waiter
+
+    assert asyncio.run(main()) == [6.0, 1.0]
+    assert model.fake.requests == [["shared"]]
@@ -0,0 +1,41 @@
+import asyncio
+import numpy as np
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache
+
+
+def vectors(n, offset=0):
+    return [[float(offset + i), 1.0] for i in range(n)]
+
+
+def test_size_and_lru_are_shared_between_handles(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = EmbeddingCache(path, max_entries=4)
+    second = EmbeddingCache(path, max_entries=4)
+
+    first.put_many("m", None, ["a", "b"], vectors(2))
+    second.put_many("m", None, ["c", "d"], vectors(2, 2))
+    assert len(first) == len(second) == 4
+
+    # A lookup through one handle makes "a" recent for the other as well
+    first.get_many("m", None, ["a"])
+    second.put_many("m", None, ["e"], vectors(1, 4))
+    assert len(first) == len(second) == 4
+    found = first.get_many("m", None, ["a", "b", "c", "d", "e"])
+    assert [vector is not None for vector in found] == [True, False, True, True, True]
+    np.testing.assert_array_equal(found[0], [0.0, 1.0])
+
+    second.clear()
+    assert len(first) == 0
+    first.close()
+    second.close()
+
+
+def test_async_embeddings_use_the_cache(model, tmp_path):
+    model.cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+
+    first = asyncio.run(model.async_get_embeddings(["alpha", "beta"]))
+    second = asyncio.run(model.async_get_embeddings(["beta", "alpha", "gamma"]))
+
+    assert second == [first[1], first[0], [5.0, 1.0]]
+    assert model.fake.requests == [["alpha", "beta"], ["gamma"]]
+    assert len(model.cache) == 3
@@ -0,0 +1,67 @@
+import pytest
+from conftest import fake_vector, make_db
+
+N = 120
+
+
+def category(i):
+    return ('A', 'B', 'C')[i % 3]
+
+
+def year(i):
+    return 2000 + i % 20
+
+
+# Filter expression and the rows (by make_db position) it should match
+FILTERS = {
+    'equality': ({'category': 'A'}, lambda i: category(i) == 'A'),
+    'eq': ({'category': {'$eq': 'B'}}, lambda i: category(i) == 'B'),
+    'ne': ({'category': {'$ne': 'A'}}, lambda i: category(i) != 'A'),
+    'in': ({'category': {'$in': ['A', 'C']}}, lambda i: category(i) in ('A', 'C')),
+    'nin': ({'year': {'$nin': [2000, 2001]}}, lambda i: year(i) not in (2000, 2001)),
+    'range': ({'year': {'$gte': 2005, '$lt': 2010}}, lambda i: 2005 <= year(i) < 2010),
+    'open range': ({'year': {'$gt': 2015}}, lambda i: year(i) > 2015),
+    'and': (
+        {'category': 'C', 'year': {'$lte': 2003}},
+        lambda i: category(i) == 'C' and year(i) <= 2003,
+    ),
+    'or': (
+        {'$or': [{'category': 'A'}, {'year': {'$in': [2001, 2002]}}]},
+        lambda i: category(i) == 'A' or year(i) in (2001, 2002),
+    ),
+    'nested': (
+        {'$and': [{'$or': [{'category': 'B'}, {'category': 'C'}]}, {'year': {'$ne': 2004}}]},
+        lambda i: category(i) in ('B', 'C') and year(i) != 2004,
+    ),
+    'no match': ({'category': {'$in': []}}, lambda i: False),
+}
+
+
+@pytest.mark.parametrize('name', list(FILTERS))
+def test_filter_matches_exactly_the_expected_rows(name):
+    metadata_filter, predicate = FILTERS[name]
+    vector_db = make_db(N)
+    results = vector_db.search(fake_vector("query"), k=N, metadata_filter=metadata_filter)
+    expected = {f"chunk {i} about topic {i % 7}" for i in range(N) if predicate(i)}
+    assert {key for key, _ in results} == expected
+
+
+def test_filter_skips_deleted_rows():
+    vector_db = make_db(N)
+    deleted = [f"chunk {i} about topic {i % 7}" for i in range(0, N, 3)]
+    vector_db.delete(deleted)
+    results = vector_db.search(fake_vector("query"), k=N, metadata_filter={'category': {'$in': ['A', 'B']}})
+    # Rows 0, 3, 6, ... were the whole of category 'A'
+    assert {key for key, _ in results} == {
+        f"chunk {i} about topic {i % 7}" for i in range(N) if category(i) == 'B'
+    }
+
+
+@pytest.mark.parametrize('metadata_filter', [
+    {'year': {'$gt': 2000, '$gte': 2001}},
+    {'year': {'$between': [2000, 2005]}},
+    {'$not': {'category': 'A'}},
+])
+def test_invalid_filters_raise(metadata_filter):
+    with pytest.raises(ValueError):
+        make_db(10).search(fake_vector("query"), k=3, metadata_filter=metadata_filter)
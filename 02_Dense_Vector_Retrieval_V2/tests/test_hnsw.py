@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+import pytest
+from aimakerspace.indexes import HNSWIndex
+from conftest import fake_vector, make_db
+
+K = 10
+
+
+def queries(n=20):
+    return [fake_vector(f"query {i}") for i in range(n)]
+
+
+def recall(vector_db, reference, query_list, **kwargs):
+    found = 0
+    for query in query_list:
+        expected = {key for key, _ in reference.search(query, k=K, **kwargs)}
+        found += len(expected & {key for key, _ in vector_db.search(query, k=K, **kwargs)})
+    return found / (K * len(query_list))
+
+
+@pytest.fixture(scope='module')
+def databases():
+    return make_db(1000, index=HNSWIndex(M=8, ef_construction=64, ef_search=64)), make_db(1000)
+
+
+def test_recall_against_flat(databases):
+    graph, flat = databases
+    assert recall(graph, flat, queries()) >= 0.95
+
+
+def test_filtered_search_returns_only_matching_rows(databases):
+    graph, flat = databases
+    metadata_filter = {'category': {'$in': ['A', 'B']}}
+    for query in queries(5):
+        results = graph.search(query, k=K, metadata_filter=metadata_filter)
+        assert len(results) == K
+        assert all(graph.get_metadata(key)['category'] in ('A', 'B') for key, _ in results)
+    assert recall(graph, flat, queries(), metadata_filter=metadata_filter) >= 0.9
+
+
+def test_concurrent_searches_match_serial(databases):
+    graph, _ = databases
+    query_list = queries()
+    expected = [graph.search(query, k=K) for query in query_list]
+    results = {}
+
+    def worker(thread):
+        results[thread] = [graph.search(query, k=K) for query in query_list]
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(result == expected for result in results.values())
+
+
+def test_incremental_inserts_are_searchable():
+    vector_db = make_db(300, index=HNSWIndex(M=8, ef_construction=64))
+    reference = make_db(300)
+    texts = [f"late chunk {i}" for i in range(300)]
+    for database in (vector_db, reference):
+        database.insert_many(texts, [fake_vector(text) for text in texts])
+    for text in texts[::30]:
+        assert vector_db.search(fake_vector(text), k=1)[0][0] == text
+    assert recall(vector_db, reference, queries()) >= 0.9
+
+
+def test_search_after_delete_and_compact():
+    vector_db = make_db(600, index=HNSWIndex(M=8, ef_construction=64))
+    reference = make_db(600)
+    deleted = [f"chunk {i} about topic {i % 7}" for i in range(0, 600, 2)]
+    vector_db.delete(deleted)
+    reference.delete(deleted)
+    for query in queries(5):
+        assert not {key for key, _ in vector_db.search(query, k=K)} & set(deleted)
+    assert recall(vector_db, reference, queries()) >= 0.9
+
+    vector_db.compact()
+    reference.compact()
+    assert len(vector_db.index) == 300
+    assert recall(vector_db, reference, queries()) >= 0.9
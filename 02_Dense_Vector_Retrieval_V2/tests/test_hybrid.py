@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+from aimakerspace.bm25 import BM25Index
+from aimakerspace.fusion import RRF_K, reciprocal_rank_fusion, weighted_score_fusion
+from aimakerspace.vector_store import VectorStore
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import FakeEmbeddingModel, fake_vector
+
+QUERY = "error code E1234"
+LEXICAL = "Error code E1234 means the disk is full."
+DECOY = "Troubleshooting storage problems on servers."
+FILLER = [
+    "Status code 200 means the request succeeded.",
+    "Restart the service after changing its configuration.",
+    "The release notes list every change since last year.",
+    "Back up the database before upgrading.",
+]
+
+
+def bm25_reference(corpus, query, k1=1.5, b=0.75):
+    """Okapi BM25 with the Lucene idf, written out term by term."""
+    docs = [text.lower().replace(".", "").split() for text in corpus]
+    avg_length = sum(map(len, docs)) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in query.lower().split():
+            df = sum(term in other for other in docs)
+            tf = doc.count(term)
+            idf = np.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_length))
+        scores.append(score)
+    return np.array(scores)
+
+
+def test_bm25_scores_match_the_okapi_formula():
+    corpus = [LEXICAL, DECOY, *FILLER, "code code code review"]
+    store = VectorStore()
+    store.add_many(corpus, np.zeros((len(corpus), 4), dtype=np.float32))
+    bm25 = BM25Index()
+    bm25.add(store, np.arange(len(corpus)))
+
+    np.testing.assert_allclose(bm25.score(QUERY, len(corpus)), bm25_reference(corpus, QUERY), rtol=1e-5)
+
+    (rows, scores), = bm25.search(store, [QUERY], k=10)
+    # Only rows sharing a term are returned; the rare terms outweigh repeating "code"
+    assert rows.tolist() == [0, 6, 2]
+    assert np.all(np.diff(scores) <= 0)
+
+
+@pytest.fixture
+def vector_db():
+    """A corpus where the dense ranking puts a decoy above the exact keyword match."""
+    query = np.array(fake_vector(QUERY))
+    texts = [DECOY, LEXICAL, *FILLER]
+    vectors = [
+        query + 0.01 * np.array(fake_vector(DECOY)),
+        0.8 * query + 0.2 * np.array(fake_vector(LEXICAL)),
+        *(fake_vector(text) for text in FILLER),
+    ]
+    vector_db = VectorDatabase(embedding_model=FakeEmbeddingModel())
+    vector_db.insert_many(texts, vectors)
+    return vector_db
+
+
+def test_keyword_match_wins_hybrid_search(vector_db):
+    dense = vector_db.search_by_text(QUERY, k=6, return_as_text=True)
+    keyword = vector_db.search_by_text(QUERY, k=6, mode='bm25', return_as_text=True)
+    assert dense[:2] == [DECOY, LEXICAL]
+    assert keyword == [LEXICAL, FILLER[0]]
+
+    for fusion in ('rrf', 'weighted'):
+        hybrid = vector_db.search_by_text(QUERY, k=3, mode='hybrid', fusion=fusion, return_as_text=True)
+        assert hybrid[0] == LEXICAL
+    # With all the weight on the dense results, fusion gives back the dense order
+    assert vector_db.search_by_text(QUERY, k=3, mode='hybrid', alpha=1.0, return_as_text=True) == dense[:3]
+
+
+def test_hybrid_rrf_scores_combine_both_rankings(vector_db):
+    dense = [key for key, _ in vector_db.search_by_text(QUERY, k=6)]
+    keyword = [key for key, _ in vector_db.search_by_text(QUERY, k=6, mode='bm25')]
+    alpha = 0.7
+    expected = {
+        key: alpha / (RRF_K + dense.index(key) + 1)
+        + ((1 - alpha) / (RRF_K + keyword.index(key) + 1) if key in keyword else 0.0)
+        for key in dense
+    }
+
+    hybrid = vector_db.search_by_text(QUERY, k=6, mode='hybrid', alpha=alpha)
+    assert [key for key, _ in hybrid] == sorted(expected, key=expected.get, reverse=True)
+    for key, score in hybrid:
+        assert score == pytest.approx(expected[key], rel=1e-5)
+
+
+def test_reciprocal_rank_fusion():
+    dense = (np.array([3, 1, 2]), np.array([0.9, 0.8, 0.1]))
+    keyword = (np.array([2, 4]), np.array([12.0, 3.0]))
+    rows, scores = reciprocal_rank_fusion([dense, keyword], k=4)
+    # Row 2 is last by dense but first by keyword: 1/63 + 1/61 beats a single 1/61
+    assert rows.tolist() == [2, 3, 1, 4]
+    np.testing.assert_allclose(scores, [1 / 63 + 1 / 61, 1 / 61, 1 / 62, 1 / 62], rtol=1e-6)
+
+    rows, _ = reciprocal_rank_fusion([dense, keyword], k=2, weights=(1.0, 0.0))
+    assert rows.tolist() == [3, 1]
+    with pytest.raises(ValueError):
+        reciprocal_rank_fusion([dense, keyword], k=2, weights=(1.0,))
+
+
+def test_weighted_score_fusion():
+    dense = (np.array([3, 2, 1]), np.array([0.9, 0.5, 0.1]))
+    keyword = (np.array([2, 4, 1]), np.array([12.0, 3.0, 0.0]))
+    rows, scores = weighted_score_fusion([dense, keyword], k=4)
+    # Min-max normalized: dense 3 -> 1.0, 2 -> 0.5, 1 -> 0.0; keyword 2 -> 1.0, 4 -> 0.25, 1 -> 0.0
+    assert rows.tolist() == [2, 3, 4, 1]
+    np.testing.assert_allclose(scores, [1.5, 1.0, 0.25, 0.0], rtol=1e-6)
+
+    rows, scores = weighted_score_fusion([dense, keyword], k=2, weights=(0.8, 0.2))
+    assert rows.tolist() == [3, 2]
+    np.testing.assert_allclose(scores, [0.8, 0.6], rtol=1e-6)
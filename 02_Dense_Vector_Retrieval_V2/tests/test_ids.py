@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import FakeEmbeddingModel, fake_vector
+
+
+@pytest.fixture
+def vector_db():
+    return VectorDatabase(embedding_model=FakeEmbeddingModel())
+
+
+def test_delete_one_of_two_ids_sharing_a_key(vector_db):
+    vector_db.insert("x", np.ones(4), {'n': 1}, id=1)
+    vector_db.insert("x", np.full(4, 2.0), {'n': 2}, id=2)
+    vector_db.insert("y", np.zeros(4), {'n': 3}, id=3)
+    assert sorted(vector_db.vectors) == ["x", "y"]
+    assert len(vector_db.vectors) == 2
+    assert vector_db.get_metadata("x") == {'n': 2}
+
+    vector_db.delete([2])
+    np.testing.assert_array_equal(vector_db.vectors["x"], np.ones(4))
+    np.testing.assert_array_equal(vector_db.retrieve_from_key("x"), np.ones(4))
+    assert vector_db.get_metadata("x") == {'n': 1}
+    assert sorted(vector_db.vectors) == ["x", "y"]
+
+    vector_db.compact()
+    assert vector_db.get_metadata("x") == {'n': 1}
+    assert list(vector_db.metadata) == ["x", "y"]
+    assert len(vector_db.store) == 2
+
+    vector_db.delete([1])
+    assert "x" not in vector_db.vectors
+    assert vector_db.retrieve_from_key("x") is None
+    assert list(vector_db.vectors) == ["y"]
+
+
+def test_upsert_changes_key_and_compaction_renumbers(vector_db):
+    texts = [f"text {i}" for i in range(10)]
+    vector_db.insert_many(texts, [fake_vector(text) for text in texts], ids=list(range(10)))
+    vector_db.upsert([3], ["renamed"], [fake_vector("renamed")])
+    vector_db.delete([0, 5, 99])
+    assert vector_db.store.deleted_count == 2
+    assert "text 3" not in vector_db.vectors
+    assert vector_db.compact() == 2
+
+    assert len(vector_db.store) == 8
+    assert vector_db.store.row_of_id(3) == vector_db.store.row_of("renamed")
+    results = vector_db.search(fake_vector("text 7"), k=1, return_ids=True)
+    assert results[0][0] == 7
+    assert vector_db.search(fake_vector("text 5"), k=8, return_ids=True)[0][0] != 5
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import FakeEmbeddingModel
+
+QUERY = np.array([1.0, 0.0, 0.0, 0.0], dtype=np.float32)
+
+
+@pytest.fixture
+def vector_db():
+    vector_db = VectorDatabase(embedding_model=FakeEmbeddingModel())
+    vector_db.insert_many(
+        ["best", "best copy", "other angle", "off topic"],
+        [
+            [1.0, 0.1, 0.0, 0.0],
+            [1.0, 0.1, 0.001, 0.0],  # near-duplicate of "best"
+            [1.0, 0.0, 0.5, 0.0],    # less relevant, but says something else
+            [0.0, 0.0, 0.0, 1.0],
+        ],
+    )
+    return vector_db
+
+
+def keys(results):
+    return [key for key, _ in results]
+
+
+def test_mmr_demotes_near_duplicates(vector_db):
+    assert keys(vector_db.search(QUERY, k=2)) == ["best", "best copy"]
+    assert keys(vector_db.search(QUERY, k=2, mmr=True, lambda_mult=0.5)) == ["best", "other angle"]
+    # A copy adds nothing new, so it ranks below even the off-topic result
+    assert keys(vector_db.search(QUERY, k=4, mmr=True, lambda_mult=0.5))[-1] == "best copy"
+
+
+def test_mmr_with_lambda_one_ranks_by_relevance(vector_db):
+    expected = vector_db.search(QUERY, k=4)
+    results = vector_db.search(QUERY, k=4, mmr=True, lambda_mult=1.0)
+    assert keys(results) == keys(expected) == ["best", "best copy", "other angle", "off topic"]
+    np.testing.assert_allclose([score for _, score in results], [score for _, score in expected], rtol=1e-6)
+
+
+def test_mmr_only_chooses_from_fetch_k(vector_db):
+    assert keys(vector_db.search(QUERY, k=2, mmr=True, fetch_k=2, lambda_mult=0.0)) == ["best", "best copy"]
+
+
+def test_mmr_rejects_invalid_lambda(vector_db):
+    with pytest.raises(ValueError):
+        vector_db.search(QUERY, k=2, mmr=True, lambda_mult=1.5)
@@ -0,0 +1,64 @@
+import os
+import numpy as np
+import pytest
+from aimakerspace.indexes import IVFIndex, PQIndex, ScalarQuantizedIndex
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import FakeEmbeddingModel, fake_vector, make_db
+
+
+def test_save_over_memory_mapped_source(tmp_path):
+    path = str(tmp_path / "db")
+    make_db(500).save(path)
+
+    loaded = VectorDatabase.load(path, FakeEmbeddingModel(), mmap=True)
+    assert loaded.store.mapped_files is not None
+    expected = loaded.search(fake_vector("query"), k=5)
+    loaded.save(path)
+
+    reloaded = VectorDatabase.load(path, FakeEmbeddingModel(), mmap=True)
+    assert len(reloaded.store) == 500
+    np.testing.assert_array_equal(reloaded.store.matrix, loaded.store.matrix)
+    assert reloaded.search(fake_vector("query"), k=5) == expected
+    # No temporary files are left behind
+    assert not [name for name in os.listdir(path) if name.endswith(".tmp")]
+
+
+INDEXES = {
+    'flat': lambda: 'flat',
+    'ivf': lambda: IVFIndex(n_lists=8, nprobe=2),
+    'hnsw': lambda: 'hnsw',
+    'sq': lambda: ScalarQuantizedIndex('int8', rescore=False),
+    'pq': lambda: PQIndex(n_subvectors=4, n_centroids=16),
+    'ivfpq': lambda: PQIndex(n_subvectors=4, n_centroids=16, n_lists=8, nprobe=2),
+    'sharded': lambda: 'sharded',
+}
+
+
+@pytest.mark.parametrize('mmap', [True, False], ids=['mmap', 'in-memory'])
+@pytest.mark.parametrize('name', list(INDEXES))
+def test_save_load_preserves_search(tmp_path, name, mmap):
+    vector_db = make_db(300, index=INDEXES[name]())
+    queries = [fake_vector(f"query {i}") for i in range(5)]
+    # The first search trains the approximate indexes
+    expected = vector_db.search_batch(queries, k=5)
+    expected_filtered = vector_db.search_batch(queries, k=5, metadata_filter={'category': {'$ne': 'A'}})
+    expected_bm25 = vector_db.search_by_text("chunk topic 3", k=5, mode='bm25')
+    path = str(tmp_path / "db")
+    vector_db.save(path)
+
+    loaded = VectorDatabase.load(path, FakeEmbeddingModel(), mmap=mmap)
+    assert loaded.index.name == vector_db.index.name
+    assert loaded.index.get_params() == vector_db.index.get_params()
+    state, loaded_state = vector_db.index.get_state(), loaded.index.get_state()
+    # Everything but the exact indexes has trained or built state to restore
+    assert bool(state) == (name not in ('flat', 'sharded'))
+    assert state.keys() == loaded_state.keys()
+    for key, value in state.items():
+        np.testing.assert_array_equal(loaded_state[key], value)
+    assert loaded.search_batch(queries, k=5) == expected
+    assert loaded.search_batch(queries, k=5, metadata_filter={'category': {'$ne': 'A'}}) == expected_filtered
+    assert loaded.search_by_text("chunk topic 3", k=5, mode='bm25') == expected_bm25
+    assert loaded.get_stats() == vector_db.get_stats()
+    for index in (vector_db.index, loaded.index):
+        if hasattr(index, 'close'):
+            index.close()
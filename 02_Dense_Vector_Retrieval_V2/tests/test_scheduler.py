@@ -0,0 +1,184 @@
+import asyncio
+import types
+import openai
+import pytest
+from conftest import response
+from aimakerspace.openai_utils import scheduler as scheduler_module
+from aimakerspace.openai_utils.scheduler import EmbeddingScheduler, TokenBucket
+
+
+def api_error(error_type, status_code, **headers):
+    """An openai status error carrying a minimal HTTP response."""
+    response = types.SimpleNamespace(request=None, status_code=status_code, headers=headers)
+    return error_type("failed", response=response, body=None)
+
+
+class FlakyCall:
+    """Raises the given errors on its first calls, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def _attempt(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return types.SimpleNamespace(usage=types.SimpleNamespace(prompt_tokens=10, total_tokens=10))
+
+    def __call__(self):
+        return self._attempt()
+
+    async def acall(self):
+        return self._attempt()
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping just moves the clock forward."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the scheduler's sleeps on a fake clock instead of waiting them out."""
+    clock = FakeClock()
+
+    async def fake_asleep(delay):
+        clock.sleep(delay)
+
+    monkeypatch.setattr(scheduler_module, "time", clock)
+    monkeypatch.setattr(scheduler_module.asyncio, "sleep", fake_asleep)
+    return clock.sleeps
+
+
+def transient_errors():
+    return (
+        api_error(openai.RateLimitError, 429),
+        api_error(openai.InternalServerError, 500),
+        api_error(openai.InternalServerError, 503),
+    )
+
+
+def test_retries_rate_limits_and_server_errors(sleeps):
+    scheduler = EmbeddingScheduler(base_delay=1.0, max_delay=3.0)
+    call = FlakyCall(*transient_errors())
+    assert scheduler.run(call, tokens=10).usage.total_tokens == 10
+    assert call.calls == 4
+    assert scheduler.retries == 3
+    # Full jitter: each backoff lies below its doubling ceiling, capped at max_delay
+    assert len(sleeps) == 3
+    assert all(0 <= delay <= ceiling for delay, ceiling in zip(sleeps, (1.0, 2.0, 3.0)))
+
+
+def test_async_retries_rate_limits_and_server_errors(sleeps):
+    scheduler = EmbeddingScheduler(base_delay=0.0)
+    call = FlakyCall(*transient_errors())
+    asyncio.run(scheduler.arun(call.acall, tokens=10))
+    assert call.calls == 4
+    assert scheduler.retries == 3
+
+
+def test_gives_up_after_max_retries(sleeps):
+    scheduler = EmbeddingScheduler(max_retries=2, base_delay=0.0)
+    call = FlakyCall(*(api_error(openai.RateLimitError, 429) for _ in range(5)))
+    with pytest.raises(openai.RateLimitError):
+        scheduler.run(call, tokens=10)
+    assert call.calls == 3
+
+    call = FlakyCall(*(api_error(openai.InternalServerError, 502) for _ in range(5)))
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(scheduler.arun(call.acall, tokens=10))
+    assert call.calls == 3
+
+
+def test_client_errors_are_not_retried(sleeps):
+    scheduler = EmbeddingScheduler(base_delay=0.0)
+    call = FlakyCall(api_error(openai.BadRequestError, 400))
+    with pytest.raises(openai.BadRequestError):
+        scheduler.run(call, tokens=10)
+    assert call.calls == 1
+    assert scheduler.retries == 0
+
+
+def test_retry_after_is_honored_and_pauses_other_requests(sleeps):
+    scheduler = EmbeddingScheduler(base_delay=0.0)
+    call = FlakyCall(api_error(openai.RateLimitError, 429, **{"retry-after-ms": "2500"}))
+    scheduler.run(call, tokens=10)
+    assert sleeps == [2.5]
+    assert call.calls == 2
+
+    # A 429 seen by one request makes every other request wait out the same cool-down
+    assert scheduler._backoff(0, api_error(openai.RateLimitError, 429, **{"retry-after": "3"})) == 3.0
+    assert scheduler._reserve(10) == 3.0
+    # A server error only delays the request that failed
+    scheduler = EmbeddingScheduler(base_delay=0.0)
+    assert scheduler._backoff(0, api_error(openai.InternalServerError, 503, **{"retry-after": "4"})) == 4.0
+    assert scheduler._reserve(10) == 0.0
+
+
+def test_request_rate_is_limited(sleeps):
+    scheduler = EmbeddingScheduler(requests_per_minute=120)
+    for _ in range(120):
+        scheduler.run(FlakyCall(), tokens=10)
+    # The burst is one minute's worth; then requests are spaced 0.5 s apart
+    assert sleeps == []
+    scheduler.run(FlakyCall(), tokens=10)
+    scheduler.run(FlakyCall(), tokens=10)
+    assert sleeps == [0.5, 0.5]
+
+
+def test_token_rate_is_limited_and_settled_by_reported_usage(sleeps):
+    scheduler = EmbeddingScheduler(tokens_per_minute=600)
+    # Estimated 300 tokens, but the API reports 10: the difference is given back
+    scheduler.run(FlakyCall(), tokens=300)
+    scheduler.run(FlakyCall(), tokens=300)
+    assert sleeps == []
+    assert scheduler.token_bucket.reserve(0) == 0.0
+    scheduler.token_bucket.reserve(580)
+    # 10 tokens per second: the next 100 tokens wait about 10 s
+    assert scheduler.token_bucket.reserve(100) == pytest.approx(10.0)
+
+
+def test_token_bucket():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(3) == pytest.approx(3.0, abs=0.05)
+    # Requests larger than a minute's capacity are clamped, so they still go through
+    bucket.adjust(63)
+    assert bucket.reserve(1000) == pytest.approx(0.0, abs=0.05)
+
+
+def test_embedding_model_retries_through_its_scheduler(model, sleeps):
+    model.scheduler = EmbeddingScheduler(base_delay=0.0)
+    failures = [api_error(openai.RateLimitError, 429), api_error(openai.InternalServerError, 500)]
+
+    def create(input, model, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        return response(input)
+
+    async def acreate(input, model, **kwargs):
+        return create(input, model)
+
+    model.client.embeddings.create = create
+    model.async_client.embeddings.create = acreate
+    assert model.get_embeddings(["ab", "abc"]) == [[2.0, 1.0], [3.0, 1.0]]
+    assert model.scheduler.retries == 2
+
+    failures.extend(api_error(openai.RateLimitError, 429) for _ in range(7))
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(model.async_get_embeddings(["abcd"]))
+    # The first attempt plus max_retries (6) retries
+    assert len(failures) == 0
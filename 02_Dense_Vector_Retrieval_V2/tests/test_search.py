@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from aimakerspace.indexes import FlatIndex, IVFIndex, PQIndex, ScalarQuantizedIndex
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import DIMENSION, FakeEmbeddingModel, fake_vector, make_db
+
+INDEXES = ['flat', 'ivf', 'hnsw', 'sq', 'pq', 'sharded']
+
+
+def index_instance(name):
+    return PQIndex(n_lists=8) if name == 'ivfpq' else name
+
+
+@pytest.mark.parametrize('index', INDEXES + ['ivfpq'])
+def test_search_empty_database(index):
+    vector_db = VectorDatabase(embedding_model=FakeEmbeddingModel(), index=index_instance(index))
+    query = fake_vector("query")
+    assert vector_db.search(query, k=3) == []
+    assert vector_db.search(query, k=3, mmr=True) == []
+    assert vector_db.search_batch([query, query], k=3) == [[], []]
+    assert vector_db.search_by_text("query", k=3, mode='hybrid') == []
+    assert vector_db.search_by_text("query", k=3, mode='bm25') == []
+
+
+@pytest.mark.parametrize('index', INDEXES + ['ivfpq'])
+def test_search_without_candidates(index):
+    vector_db = make_db(50, index=index_instance(index))
+    query = fake_vector("query")
+    assert vector_db.search(query, k=3, metadata_filter={'category': 'missing'}) == []
+    vector_db.delete(list(vector_db.store.ids))
+    assert vector_db.search(query, k=3) == []
+    assert vector_db.search(query, k=3, mmr=True) == []
+
+
+def recall(vector_db, reference, queries, k=10):
+    found = 0
+    for query in queries:
+        expected = {key for key, _ in reference.search(query, k=k)}
+        found += len(expected & {key for key, _ in vector_db.search(query, k=k)})
+    return found / (k * len(queries))
+
+
+@pytest.mark.parametrize('make_index, min_recall', [
+    (lambda: ScalarQuantizedIndex('int8', rescore=False), 0.9),
+    (lambda: IVFIndex(n_lists=8, nprobe=2), 0.9),
+    (lambda: PQIndex(n_subvectors=8, n_centroids=16, rescore=True, rescore_factor=10), 0.7),
+    (lambda: PQIndex(n_subvectors=8, n_centroids=16, n_lists=8, nprobe=2, rescore=True, rescore_factor=10), 0.7),
+], ids=['sq', 'ivf', 'pq', 'ivfpq'])
+def test_index_retrains_as_the_store_grows(make_index, min_recall):
+    rng = np.random.default_rng(0)
+    centers = 3 * rng.standard_normal((8, DIMENSION)).astype(np.float32)
+    # Rows arrive cluster by cluster: the first search sees only one of them
+    labels = np.sort(rng.integers(0, len(centers), 2000))
+    vectors = (centers[labels] + rng.standard_normal((len(labels), DIMENSION))).astype(np.float32)
+    keys = [f"row {i}" for i in range(len(vectors))]
+    grown = VectorDatabase(embedding_model=FakeEmbeddingModel(), index=make_index())
+    grown.insert_many(keys[:20], vectors[:20])
+    grown.search(vectors[0], k=1)  # trains on the first 20 rows
+    grown.insert_many(keys[20:], vectors[20:])
+    fresh = VectorDatabase(embedding_model=FakeEmbeddingModel(), index=make_index())
+    fresh.insert_many(keys, vectors)
+    reference = VectorDatabase(embedding_model=FakeEmbeddingModel())
+    reference.insert_many(keys, vectors)
+
+    queries = centers[rng.integers(0, len(centers), 20)] + rng.standard_normal((20, DIMENSION))
+    assert recall(grown, reference, queries) == recall(fresh, reference, queries) >= min_recall
+    assert grown.index._trained_rows == len(vectors)
+
+
+def test_float16_codes_are_rejected():
+    with pytest.raises(ValueError, match="int8"):
+        ScalarQuantizedIndex('float16')
+
+
+@pytest.mark.parametrize('normalize', [False, True])
+@pytest.mark.parametrize('metric', ['cosine', 'dot', 'euclidean', 'manhattan'])
+def test_threaded_flat_search_matches_single_threaded(metric, normalize):
+    threaded = make_db(1000, index=FlatIndex(workers=4, block_rows=64), normalize=normalize)
+    single = make_db(1000, normalize=normalize)
+    queries = [fake_vector(f"query {i}") for i in range(20)]
+    for kwargs in ({}, {'metadata_filter': {'category': {'$ne': 'A'}}}, {'metadata_filter': {'year': 2003}}):
+        for k in (1, 10, 100):
+            expected = single.search_batch(queries, k=k, distance_measure=metric, **kwargs)
+            actual = threaded.search_batch(queries, k=k, distance_measure=metric, **kwargs)
+            for expected_results, actual_results in zip(expected, actual):
+                assert [key for key, _ in actual_results] == [key for key, _ in expected_results]
+                np.testing.assert_allclose(
+                    [score for _, score in actual_results], [score for _, score in expected_results], rtol=1e-5
+                )
@@ -0,0 +1,58 @@
+import os
+import pytest
+from aimakerspace.indexes import ShardedIndex
+from conftest import fake_vector, make_db
+
+K = 5
+
+
+def queries():
+    return [fake_vector(f"query {i}") for i in range(5)]
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    vector_db = make_db(400, index=ShardedIndex(n_workers=2, min_rows_per_shard=50, path=str(tmp_path)))
+    yield vector_db
+    vector_db.index.close()
+
+
+def assert_matches_flat(vector_db, reference):
+    assert vector_db.search_batch(queries(), k=K) == reference.search_batch(queries(), k=K)
+
+
+def test_snapshot_is_patched_after_writes(sharded):
+    reference = make_db(400)
+    assert_matches_flat(sharded, reference)
+    snapshot = sharded.index._snapshot
+
+    texts = [f"new chunk {i}" for i in range(30)]
+    for vector_db in (sharded, reference):
+        vector_db.insert_many(texts, [fake_vector(text) for text in texts])
+        # Overwrite an existing row in place
+        vector_db.upsert(["chunk 5 about topic 5"], ["chunk 5 about topic 5"], [fake_vector("query 0")])
+        vector_db.delete(["chunk 7 about topic 0"])
+    assert_matches_flat(sharded, reference)
+    # Same files, patched in place and extended
+    assert sharded.index._snapshot[:2] == snapshot[:2]
+    assert sharded.index._snapshot[2][0] == 430
+
+    sharded.compact()
+    reference.compact()
+    assert_matches_flat(sharded, reference)
+    # Compaction moves rows: a fresh snapshot replaces the old one
+    assert sharded.index._snapshot[:2] != snapshot[:2]
+    assert not any(os.path.exists(path) for path in snapshot[:2])
+
+
+def test_indexes_sharing_a_path_keep_separate_snapshots(sharded, tmp_path):
+    other = make_db(300, index=ShardedIndex(n_workers=2, min_rows_per_shard=50, path=str(tmp_path)))
+    try:
+        sharded.search(fake_vector("query"), k=K)
+        other.search(fake_vector("query"), k=K)
+        assert sharded.index._snapshot[0] != other.index._snapshot[0]
+        assert_matches_flat(sharded, make_db(400))
+        assert_matches_flat(other, make_db(300))
+    finally:
+        other.index.close()
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,34 @@
+from conftest import DIMENSION, make_db
+
+ROW_BYTES = (DIMENSION + 1) * 4  # float32 vector plus its cached norm
+
+
+def test_counters_follow_delete_and_compact():
+    vector_db = make_db(30)
+    stats = vector_db.get_stats()
+    assert stats['total_documents'] == 30
+    assert stats['deleted_pending_compaction'] == 0
+    assert stats['vector_bytes'] == 30 * ROW_BYTES
+    assert stats['category_counts'] == {'A': 10, 'B': 10, 'C': 10}
+
+    # Rows 0, 3, 6 and 9 are in category 'A'; the last id is unknown and ignored
+    assert vector_db.delete([f"chunk {i} about topic {i % 7}" for i in (0, 3, 6, 9)] + ["missing"]) == 4
+    stats = vector_db.get_stats()
+    assert stats['total_documents'] == 26
+    assert stats['deleted_pending_compaction'] == 4
+    # Tombstoned rows keep their slot until compaction
+    assert stats['vector_bytes'] == 30 * ROW_BYTES
+    assert stats['category_counts'] == {'A': 6, 'B': 10, 'C': 10}
+    assert sum(bucket['count'] for bucket in vector_db.get_stats(histograms=True)['length_histogram']) == 26
+
+    vector_db.compact()
+    stats = vector_db.get_stats()
+    assert stats['total_documents'] == 26
+    assert stats['deleted_pending_compaction'] == 0
+    assert stats['vector_bytes'] == 26 * ROW_BYTES
+    assert stats['category_counts'] == {'A': 6, 'B': 10, 'C': 10}
+
+    # Deleting a whole category drops it from the counts
+    assert vector_db.delete([f"chunk {i} about topic {i % 7}" for i in range(12, 30, 3)]) == 6
+    assert 'A' not in vector_db.get_stats()['category_counts']
+    assert vector_db.get_categories() == ['B', 'C']
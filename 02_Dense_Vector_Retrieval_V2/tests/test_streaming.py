@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import uuid
+import numpy as np
+import pytest
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import FakeEmbeddingModel, fake_vector
+
+
+class FailingModel(FakeEmbeddingModel):
+    """Fails on the n-th embedding call."""
+
+    def __init__(self, fail_at):
+        super().__init__()
+        self.fail_at = fail_at
+
+    async def async_get_embeddings(self, list_of_text):
+        if self.calls + 1 == self.fail_at:
+            self.calls += 1
+            raise RuntimeError("embedding failed")
+        return await super().async_get_embeddings(list_of_text)
+
+
+def chunks(n):
+    for i in range(n):
+        yield f"doc {i}", {'category': 'A' if i % 2 else 'B'}
+
+
+def build(vector_db, n, **kwargs):
+    return asyncio.run(vector_db.abuild_from_stream(chunks(n), batch_size=10, max_pending=2, **kwargs))
+
+
+def test_stream_matches_list_build():
+    streamed = build(VectorDatabase(embedding_model=FakeEmbeddingModel()), 95)
+    texts, metadata = zip(*chunks(95))
+    listed = asyncio.run(
+        VectorDatabase(embedding_model=FakeEmbeddingModel()).abuild_from_list(list(texts), list(metadata))
+    )
+    assert streamed.store.keys == listed.store.keys
+    np.testing.assert_array_equal(streamed.store.matrix, listed.store.matrix)
+
+
+def test_resume_from_checkpoint(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    with pytest.raises(RuntimeError):
+        build(VectorDatabase(embedding_model=FailingModel(fail_at=30)), 1000,
+              checkpoint_dir=checkpoint_dir, checkpoint_every=100)
+    with open(os.path.join(checkpoint_dir, "checkpoint.json")) as f:
+        checkpoint = json.load(f)
+    # Checkpoints append segments; no full snapshot is written mid-build
+    assert checkpoint['offset'] == 200 and checkpoint['snapshot'] is None
+    assert [segment['rows'] for segment in checkpoint['segments']] == [100, 100]
+
+    model = FakeEmbeddingModel()
+    resumed = build(VectorDatabase(embedding_model=model), 1000,
+                    checkpoint_dir=checkpoint_dir, checkpoint_every=100)
+    assert model.texts_embedded == 800
+    assert len(resumed.store) == 1000
+    assert sorted(os.listdir(checkpoint_dir)) == ["checkpoint.json", "snapshot-1000"]
+
+    reference = build(VectorDatabase(embedding_model=FakeEmbeddingModel()), 1000)
+    assert resumed.store.keys == reference.store.keys
+    np.testing.assert_array_equal(resumed.store.matrix, reference.store.matrix)
+    assert resumed.get_stats()['category_counts'] == {'A': 500, 'B': 500}
+
+    # A finished build resumes from its snapshot without embedding anything
+    model = FakeEmbeddingModel()
+    again = build(VectorDatabase(embedding_model=model), 1000, checkpoint_dir=checkpoint_dir)
+    assert model.calls == 0 and len(again.store) == 1000
+    assert again.search(fake_vector("doc 3"), k=1)[0][0] == "doc 3"
+
+
+def test_stream_error_inserts_queued_batches():
+    def broken():
+        yield from ["x", "y", "z"]
+        raise ValueError("stream broke")
+
+    vector_db = VectorDatabase(embedding_model=FakeEmbeddingModel())
+    with pytest.raises(ValueError):
+        asyncio.run(vector_db.abuild_from_stream(broken(), batch_size=2))
+    assert vector_db.store.keys == ["x", "y"]
+
+
+def test_checkpointed_stream_accepts_uuid_and_numpy_ids(tmp_path):
+    ids = [uuid.UUID(int=i) if i % 2 else np.int64(i) for i in range(25)]
+    stream = [(f"doc {i}", {'n': i}, row_id) for i, row_id in enumerate(ids)]
+    vector_db = asyncio.run(VectorDatabase(embedding_model=FakeEmbeddingModel()).abuild_from_stream(
+        stream, batch_size=4, checkpoint_dir=str(tmp_path / "checkpoints"), checkpoint_every=8,
+    ))
+    assert vector_db.store.ids == [str(row_id) if i % 2 else i for i, row_id in enumerate(ids)]
+    assert vector_db.search(fake_vector("doc 3"), k=1, return_ids=True)[0][0] == str(uuid.UUID(int=3))
+
+
+def test_batch_the_log_cannot_record_is_not_inserted(tmp_path):
+    stream = [(f"doc {i}", {'n': i} if i != 6 else {'n': object()}) for i in range(10)]
+    vector_db = VectorDatabase(embedding_model=FakeEmbeddingModel())
+    with pytest.raises(TypeError):
+        asyncio.run(vector_db.abuild_from_stream(stream, batch_size=4, checkpoint_dir=str(tmp_path / "checkpoints")))
+    # The first batch went into the store and the log together; the second into neither
+    assert vector_db.store.keys == [f"doc {i}" for i in range(4)]
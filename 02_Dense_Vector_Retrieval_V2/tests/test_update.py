@@ -0,0 +1,62 @@
+import asyncio
+from aimakerspace.vectordatabase import VectorDatabase
+from conftest import FakeEmbeddingModel, fake_vector
+
+
+def sync(vector_db, texts, metadata=None, **kwargs):
+    return asyncio.run(vector_db.aupdate_from_list(texts, metadata, **kwargs))
+
+
+def test_update_diff_and_embedding_cost():
+    model = FakeEmbeddingModel()
+    vector_db = VectorDatabase(embedding_model=model)
+    ids = ["intro", "sleep", "stress", "diet"]
+    texts = ["Welcome.", "Sleep 8 hours.", "Breathe slowly.", "Eat greens."]
+    summary = sync(vector_db, texts, [{'v': 1}] * 4, ids=ids)
+    assert summary['added'] == ids and summary['embedded'] == 4
+    assert model.texts_embedded == 4
+
+    model.texts_embedded = 0
+    summary = sync(
+        vector_db,
+        ["Welcome.", "Sleep 7-9 hours.", "Breathe slowly.", "Stretch daily."],
+        [{'v': 1}, {'v': 1}, {'v': 2}, {'v': 1}],
+        ids=["intro", "sleep", "stress", "exercise"],
+    )
+    assert summary == {
+        'added': ["exercise"],
+        'updated': ["sleep"],
+        'metadata_updated': ["stress"],
+        'deleted': ["diet"],
+        'unchanged': 1,
+        'embedded': 2,
+    }
+    # Only the new and the edited chunk reached the embedding model
+    assert model.texts_embedded == 2
+    assert vector_db.get_metadata("Breathe slowly.") == {'v': 2}
+    assert vector_db.search(fake_vector("Sleep 7-9 hours."), k=1, return_ids=True)[0][0] == "sleep"
+    assert sorted(vector_db.store.ids[row] for row in vector_db.store.live_rows.tolist()) == [
+        "exercise", "intro", "sleep", "stress",
+    ]
+
+    model.texts_embedded = 0
+    summary = sync(
+        vector_db,
+        ["Welcome.", "Sleep 7-9 hours.", "Breathe slowly.", "Stretch daily."],
+        [{'v': 1}, {'v': 1}, {'v': 2}, {'v': 1}],
+        ids=["intro", "sleep", "stress", "exercise"],
+    )
+    assert summary['unchanged'] == 4 and summary['embedded'] == 0
+    assert model.calls == 2 and model.texts_embedded == 0
+
+
+def test_update_scope_limits_deletions():
+    vector_db = VectorDatabase(embedding_model=FakeEmbeddingModel())
+    sync(vector_db, ["a1", "a2", "b1"], [{'source': 'a'}, {'source': 'a'}, {'source': 'b'}])
+    summary = sync(vector_db, ["a1"], [{'source': 'a'}], scope={'source': 'a'})
+    assert summary['deleted'] == ["a2"] and summary['unchanged'] == 1
+    assert summary['embedded'] == 0
+
+    summary = sync(vector_db, ["c1"], [{'source': 'c'}], delete_missing=False)
+    assert summary['added'] == ["c1"] and summary['deleted'] == []
+    assert len(vector_db.store.live_rows) == 3